@@ -1,11 +1,38 @@
+import click
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from config import Config
+from app.services.cache import Cache
+from app.services.assets import Assets
+from app.services.compression import Compress
+from app.services.lifecycle import Lifecycle
+from app.services.runners import RunnerPool
+from app.services.tenancy import Tenancy
+from app.services.webhooks import WebhookIngestor
+from app.services.events import EventBus
+from app.services.live import StatusStream
+from app.services.audit import AuditTrail
+from app.services.build_cache import BuildCache
+from app.services.logtail import LogTail
+from app.services.admission import AdmissionControl
 import os
 
 db = SQLAlchemy()
 login_manager = LoginManager()
+cache = Cache()
+assets = Assets()
+compress = Compress()
+lifecycle = Lifecycle()
+runners = RunnerPool()
+tenancy = Tenancy()
+webhooks = WebhookIngestor()
+events = EventBus()
+live = StatusStream()
+audit = AuditTrail()
+build_cache = BuildCache()
+log_tail = LogTail()
+admission = AdmissionControl()
 
 def create_app():
     template_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'frontend', 'templates'))
@@ -14,17 +41,58 @@ def create_app():
     app.config.from_object(Config)
     
     db.init_app(app)
+    cache.init_app(app)
+    assets.init_app(app)
+    compress.init_app(app)
+    lifecycle.init_app(app)
+    runners.init_app(app)
+    webhooks.init_app(app)
+    events.init_app(app)
+    admission.init_app(app)
+    live.init_app(app)
+    audit.init_app(app)
+    build_cache.init_app(app)
+    log_tail.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = 'core.login'
     login_manager.login_message = 'Veuillez vous connecter pour accéder à cette page.'
+    tenancy.init_app(app)
     
     # Import and Register Routes
     from app.routes.core import core_bp
+    from app.routes.api import api_bp
+    from app.routes.hooks import hooks_bp
     app.register_blueprint(core_bp)
+    app.register_blueprint(api_bp)
+    app.register_blueprint(hooks_bp)
+    # JSON API answers 401 instead of redirecting to the login page
+    login_manager.blueprint_login_views = {'api': None}
+    
+    # Per-process caches hear about other processes' changes through the outbox
+    if not cache.shared:
+        from app.services.deployments import invalidate_events
+        from app.database.models import invalidate_identities
+        events.subscribe(('deployment', 'project'), invalidate_events)
+        events.subscribe(('user',), invalidate_identities)
+    
+    # Maintenance commands (flask retention ...)
+    from app import cli
+    cli.init_app(app)
     
     # Auto-create tables if they don't exist
     with app.app_context():
-        from app.database.models import Project, Deployment, User
+        from app.database.models import Project, Deployment, User, RetentionPolicy, DeploymentArchive, DeploymentRollup, DurationSketch, DeploymentStage, Runner, Tenant, WebhookEvent, OutboxEvent, AuditEvent
         db.create_all()
         
+        # create_all never ALTERs: a database from an older version must be upgraded first
+        from app.services.schema import missing_columns
+        missing = missing_columns(db.engine)
+        if missing:
+            message = ("Schéma de base obsolète (colonnes manquantes : %s). Lancez `flask db upgrade`."
+                       % ', '.join(f'{column.table.name}.{column.name}' for column in missing))
+            # The flask CLI loads the app too, and `flask db upgrade` has to run
+            if click.get_current_context(silent=True) is None:
+                raise RuntimeError(message)
+            app.logger.warning(message)
+        
     return app
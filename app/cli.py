@@ -0,0 +1,406 @@
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from app import db
+from app.database.models import Project, RetentionPolicy
+from app.services.pipeline import FINAL_STATUSES
+
+retention_cli = AppGroup('retention', help="Rétention et archivage de l'historique des déploiements.")
+rollups_cli = AppGroup('rollups', help="Agrégats horaires/journaliers des déploiements.")
+runners_cli = AppGroup('runners', help="Runners de déploiement et file d'attente.")
+tenants_cli = AppGroup('tenants', help="Clients (locataires) et rattachement des utilisateurs.")
+webhooks_cli = AppGroup('webhooks', help="Webhooks CI (GitLab / GitHub) des projets.")
+build_cache_cli = AppGroup('build-cache', help="Cache de build des étapes du pipeline.")
+admin_cli = AppGroup('admin', help="Opérations de masse sur les projets et déploiements (par lots).")
+export_cli = AppGroup('export', help="Exports de l'historique des déploiements (CSV / NDJSON).")
+db_cli = AppGroup('db', help="Schéma de la base de données.")
+
+
+# --- RETENTION ---
+@retention_cli.command('run')
+@click.option('--batch-size', default=500, show_default=True, help="Lignes archivées par transaction.")
+@click.option('--max-batches', type=int, default=None, help="Arrête après N lots (exécution bornée).")
+@click.option('--dry-run', is_flag=True, help="Compte les lignes expirées sans rien déplacer.")
+def retention_run(batch_size, max_batches, dry_run):
+    """Archive les déploiements expirés selon les politiques."""
+    from app.services.retention import run_retention
+
+    default = (current_app.config.get('RETENTION_DEFAULT_KEEP_LATEST'), current_app.config.get('RETENTION_DEFAULT_KEEP_DAYS'))
+
+    def progress(project_id, stats):
+        click.echo(f"  projet {project_id}: {stats['archived']} lignes archivées ({stats['batches']} lots)")
+
+    stats = run_retention(default, batch_size, max_batches, dry_run, progress)
+    verb = 'à archiver' if dry_run else 'archivées'
+    click.echo(f"{stats['archived']} lignes {verb} sur {stats['projects']} projets.")
+
+
+@retention_cli.command('set-policy')
+@click.option('--project', 'project_id', type=int, help="Politique pour un projet.")
+@click.option('--client', 'client_name', help="Politique pour tous les projets d'un client.")
+@click.option('--keep-latest', type=int, default=None, help="Garder les N derniers déploiements.")
+@click.option('--keep-days', type=int, default=None, help="Garder les déploiements des X derniers jours.")
+def retention_set_policy(project_id, client_name, keep_latest, keep_days):
+    """Crée ou remplace une politique de rétention."""
+    if bool(project_id) == bool(client_name):
+        raise click.UsageError("Indiquez soit --project, soit --client.")
+    if project_id and db.session.get(Project, project_id) is None:
+        raise click.BadParameter(f"Projet {project_id} introuvable", param_hint='--project')
+
+    if project_id:
+        policy = RetentionPolicy.query.filter_by(project_id=project_id).first() or RetentionPolicy(project_id=project_id)
+    else:
+        policy = RetentionPolicy.query.filter_by(client_name=client_name).first() or RetentionPolicy(client_name=client_name)
+    policy.keep_latest = keep_latest
+    policy.keep_days = keep_days
+    db.session.add(policy)
+    db.session.commit()
+    click.echo(f"Politique enregistrée: {policy!r}")
+
+
+@retention_cli.command('list-policies')
+def retention_list_policies():
+    """Affiche les politiques configurées."""
+    for policy in RetentionPolicy.query.order_by(RetentionPolicy.id):
+        click.echo(repr(policy))
+    click.echo(f"Défaut: keep_latest={current_app.config.get('RETENTION_DEFAULT_KEEP_LATEST')} "
+               f"keep_days={current_app.config.get('RETENTION_DEFAULT_KEEP_DAYS')}")
+
+
+# --- ROLLUPS ---
+@rollups_cli.command('backfill')
+@click.option('--batch-size', default=5000, show_default=True, help="Lignes lues par lot.")
+def rollups_backfill(batch_size):
+    """Reconstruit les agrégats et les percentiles de durée à partir de l'historique."""
+    from app.services.rollups import backfill
+
+    def progress(seen):
+        click.echo(f"  {seen} déploiements lus...")
+
+    seen, points = backfill(batch_size, progress)
+    click.echo(f"{seen} déploiements agrégés en {points} points de séries.")
+
+    from app.database.models import Project, Deployment
+    from app.services import sketches
+    from app.services.pipeline import COMPLETED_STATUSES
+    rows = db.session.execute(
+        db.select(Deployment.project_id, Project.tenant_id, Project.stack, Deployment.duration_ms)
+        .join(Project, Project.id == Deployment.project_id)
+        .where(Deployment.status.in_(COMPLETED_STATUSES))
+        .execution_options(yield_per=batch_size)
+    )
+    count = sketches.rebuild(db.session, rows)
+    db.session.commit()
+    click.echo(f"{count} esquisses de percentiles de durée reconstruites.")
+
+
+# --- RUNNERS ---
+@runners_cli.command('run')
+def runners_run():
+    """Lance un processus dédié aux runners (sans serveur web)."""
+    import signal
+    import threading
+    from app import runners, lifecycle
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    runners.start()
+    click.echo(f"Runners démarrés ({runners.free_slots()} emplacements libres). Ctrl+C pour arrêter.")
+    try:
+        stop.wait()
+    except KeyboardInterrupt:
+        pass
+    click.echo("Arrêt: fin des déploiements en cours...")
+    if not lifecycle.drain(timeout=30):
+        click.echo(f"{lifecycle.in_flight} déploiement(s) remis en file.")
+
+
+@runners_cli.command('status')
+def runners_status():
+    """Affiche les runners actifs, leur occupation et la file d'attente."""
+    from app.services import scheduler
+
+    stats = scheduler.runner_stats(current_app.config['RUNNER_TIMEOUT_SECONDS'])
+    for runner in stats['runners']:
+        click.echo(f"  {runner['name']}: {runner['busy']}/{runner['slots']} (battement {runner['last_heartbeat']:%H:%M:%S})")
+    click.echo(f"Occupation: {stats['busy']}/{stats['slots']} ({stats['utilisation']:.0%})")
+    queue = scheduler.queue_stats()
+    click.echo(f"File: {queue['depth']} en attente, plus ancien depuis {queue['oldest_wait_ms']} ms")
+    if queue['wait_ms']:
+        wait = queue['wait_ms']
+        click.echo(f"Attente récente: p50 {wait['p50']} ms, p90 {wait['p90']} ms, max {wait['max']} ms")
+
+
+# --- TENANTS ---
+@tenants_cli.command('list')
+def tenants_list():
+    """Affiche les clients avec leurs projets et déploiements."""
+    from app.database.models import Tenant, Deployment
+
+    rows = db.session.execute(
+        db.select(Tenant.slug, Tenant.name,
+                  db.select(db.func.count(Project.id)).where(Project.tenant_id == Tenant.id).scalar_subquery(),
+                  db.select(db.func.count(Deployment.id)).where(Deployment.tenant_id == Tenant.id).scalar_subquery())
+        .order_by(Tenant.slug)
+    )
+    for slug, name, projects, deployments in rows:
+        click.echo(f"  {slug:<24} {name:<30} {projects:>5} projets {deployments:>9} déploiements")
+
+
+@tenants_cli.command('assign')
+@click.argument('username')
+@click.argument('slug', required=False)
+def tenants_assign(username, slug):
+    """Rattache un utilisateur à un client (sans SLUG: accès à tous les clients)."""
+    from app import cache
+    from app.database.models import Tenant, User
+    from app.services.events import user_event
+
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.BadParameter(f"Utilisateur {username} introuvable", param_hint='USERNAME')
+    tenant = None
+    if slug:
+        tenant = Tenant.query.filter_by(slug=slug).first()
+        if tenant is None:
+            raise click.BadParameter(f"Client {slug} introuvable", param_hint='SLUG')
+    user.tenant_id = tenant.id if tenant else None
+    # Every web worker (and the async tier) caches the identity: the outbox tells them to drop it
+    db.session.execute(user_event(user.id, user.tenant_id))
+    db.session.commit()
+    cache.delete(f'user:{user.id}')
+    click.echo(f"{username} -> {tenant.name if tenant else 'tous les clients'}")
+
+
+# --- WEBHOOKS ---
+@webhooks_cli.command('secret')
+@click.argument('project_id', type=int)
+def webhooks_secret(project_id):
+    """Affiche l'URL et le secret à configurer dans la CI d'un projet."""
+    from app import webhooks
+
+    project = db.session.get(Project, project_id)
+    if project is None:
+        raise click.BadParameter(f"Projet {project_id} introuvable", param_hint='PROJECT_ID')
+    click.echo(f"Projet: {project.name} ({project.client_name})")
+    click.echo(f"URL:    /hooks/{project.id}")
+    click.echo(f"Secret: {webhooks.secret(project.id)}")
+    click.echo("GitLab: champ 'Secret token'. GitHub: 'Secret', type de contenu application/json.")
+
+
+@webhooks_cli.command('stats')
+def webhooks_stats():
+    """Affiche les webhooks reçus et les déploiements qu'ils ont déclenchés."""
+    from app.database.models import WebhookEvent
+
+    rows = db.session.execute(
+        db.select(WebhookEvent.source, WebhookEvent.event, db.func.count(), db.func.count(WebhookEvent.deployment_id),
+                  db.func.max(WebhookEvent.received_at))
+        .group_by(WebhookEvent.source, WebhookEvent.event)
+        .order_by(WebhookEvent.source, WebhookEvent.event)
+    )
+    for source, event, count, deploys, last in rows:
+        click.echo(f"  {source:<7} {event:<24} {count:>8} reçus {deploys:>7} avec déploiement  (dernier {last:%d/%m %H:%M:%S})")
+
+
+# --- BUILD CACHE ---
+@build_cache_cli.command('stats')
+@click.option('--project-id', type=int, default=None, help="Un seul projet (défaut: tous ceux qui ont utilisé le cache)")
+def build_cache_stats(project_id):
+    """Affiche l'occupation du cache et le taux de succès par projet."""
+    from app import build_cache
+    from app.services.build_cache import project_stats
+
+    usage = build_cache.usage()
+    click.echo(f"{usage['directory']}: {usage['entries']} entrées, {usage['bytes'] / 1048576:.1f} / "
+               f"{usage['max_bytes'] / 1048576:.0f} Mo ({'activé' if build_cache.enabled else 'désactivé'})")
+    projects = db.session.execute(db.select(Project.id, Project.name).order_by(Project.id)
+                                  .where(*([Project.id == project_id] if project_id else [])))
+    for id, name in projects:
+        stats = project_stats(db.session, id)
+        if not stats['hits'] + stats['misses']:
+            continue
+        click.echo(f"  {id:>5} {name[:30]:<30} {stats['hits']:>6} succès {stats['misses']:>6} échecs "
+                   f"{stats['hit_rate']:>6.1%}  {stats['saved_ms'] / 1000:9.1f} s économisées")
+
+
+@build_cache_cli.command('clear')
+def build_cache_clear():
+    """Vide le cache: chaque étape sera reconstruite au prochain déploiement."""
+    from app import build_cache
+
+    click.echo(f"{build_cache.clear()} fichiers supprimés de {build_cache.directory}")
+
+
+# --- BULK ADMIN ---
+def _deployment_filter_options(command):
+    for option in reversed((
+        click.option('--project', 'project_ids', type=int, multiple=True, help="Projet (option répétable)."),
+        click.option('--client', help="Nom du client."),
+        click.option('--status', 'statuses', multiple=True, help="Statut actuel (option répétable)."),
+        click.option('--before', type=click.DateTime(), help="Déclenchés avant cette date."),
+        click.option('--after', type=click.DateTime(), help="Déclenchés à partir de cette date."),
+        click.option('--triggered-by', help="Déclenchés par cet utilisateur."),
+    )):
+        command = option(command)
+    return command
+
+
+def _bulk_options(command):
+    command = click.option('--batch-size', default=1000, show_default=True, help="Lignes par transaction.")(command)
+    command = click.option('--dry-run', is_flag=True, help="Compte les lignes concernées sans rien modifier.")(command)
+    return click.option('--yes', is_flag=True, help="Ne demande pas de confirmation.")(command)
+
+
+def _progress(label):
+    import time
+    started = time.perf_counter()
+
+    def report(stats):
+        elapsed = time.perf_counter() - started
+        click.echo(f"  {stats['done']}/{stats['matched']} {label} ({stats['batches']} lots, "
+                   f"{stats['done'] / elapsed if elapsed else 0:.0f}/s)")
+    return report
+
+
+def _run_bulk(action, label, dry_run, yes, run):
+    """Counts first, asks for confirmation, then runs the batched operation with progress output."""
+    matched = run(dry_run=True, progress=None)['matched']
+    if dry_run or not matched:
+        click.echo(f"{matched} {label} {action} (simulation)." if dry_run else f"Aucun {label[:-1]} concerné.")
+        return None
+    if not yes:
+        click.confirm(f"{matched} {label} seront {action}. Continuer ?", abort=True)
+    stats = run(dry_run=False, progress=_progress(label))
+    click.echo(f"{stats['done']} {label} {action} en {stats['batches']} lots.")
+    return stats
+
+
+@admin_cli.command('delete-deployments')
+@_deployment_filter_options
+@_bulk_options
+def admin_delete_deployments(project_ids, client, statuses, before, after, triggered_by, batch_size, dry_run, yes):
+    """Supprime les déploiements filtrés (jamais ceux en file ou en cours)."""
+    from app.services import bulk
+
+    criteria = bulk.deployment_filters(project_ids, client, statuses, before, after, triggered_by)
+    if not criteria and not yes:
+        click.confirm("Aucun filtre: tout l'historique terminé sera supprimé. Continuer ?", abort=True)
+    _run_bulk('supprimés', 'déploiements', dry_run, yes,
+              lambda **kwargs: bulk.delete_deployments(criteria, batch_size, **kwargs))
+
+
+@admin_cli.command('mark-status')
+@click.argument('status', type=click.Choice(FINAL_STATUSES))
+@_deployment_filter_options
+@_bulk_options
+def admin_mark_status(status, project_ids, client, statuses, before, after, triggered_by, batch_size, dry_run, yes):
+    """Passe les déploiements filtrés au statut final STATUS (ex.: Failed pour des Running orphelins)."""
+    from app.services import bulk
+
+    criteria = bulk.deployment_filters(project_ids, client, statuses, before, after, triggered_by)
+    if not criteria:
+        raise click.UsageError("Indiquez au moins un filtre (--status, --project, --before...).")
+    if _run_bulk(f'passés en {status}', 'déploiements', dry_run, yes,
+                 lambda **kwargs: bulk.mark_status(criteria, status, batch_size, **kwargs)):
+        click.echo("Statuts des projets et agrégats: flask admin recompute-counters --rollups")
+
+
+@admin_cli.command('reassign-projects')
+@click.option('--to-client', required=True, help="Client (locataire) de destination, créé au besoin.")
+@click.option('--project', 'project_ids', type=int, multiple=True, help="Projet (option répétable).")
+@click.option('--client', help="Tous les projets de ce client.")
+@_bulk_options
+def admin_reassign_projects(to_client, project_ids, client, batch_size, dry_run, yes):
+    """Rattache des projets, leurs déploiements et leur historique archivé à un autre client."""
+    from app.services import bulk
+
+    if not project_ids and not client:
+        raise click.UsageError("Indiquez --project ou --client.")
+    criteria = bulk.project_filters(project_ids, client)
+    stats = _run_bulk(f'rattachés à {to_client}', 'projets', dry_run, yes,
+                      lambda **kwargs: bulk.reassign_projects(criteria, to_client, batch_size, **kwargs))
+    if stats:
+        click.echo(f"{stats['deployments']} déploiements déplacés. Séries par client: flask admin recompute-counters --rollups")
+
+
+@admin_cli.command('recompute-counters')
+@click.option('--batch-size', default=1000, show_default=True, help="Lignes lues par lot et projets corrigés par transaction.")
+@click.option('--dry-run', is_flag=True, help="Compte les projets à corriger sans rien modifier.")
+@click.option('--rollups', is_flag=True, help="Reconstruit aussi les agrégats horaires/journaliers.")
+def admin_recompute_counters(batch_size, dry_run, rollups):
+    """Recalcule le statut et le dernier déploiement de chaque projet à partir de son historique."""
+    from app.services import bulk
+
+    def progress(stats):
+        click.echo(f"  {stats['done']}/{stats['matched']} projets lus, {stats['changed']} à corriger")
+
+    stats = bulk.recompute_counters(batch_size, dry_run, progress)
+    click.echo(f"{stats['changed']} projets {'à corriger' if dry_run else 'corrigés'} sur {stats['done']} lus.")
+    if rollups and not dry_run:
+        from app.services.rollups import backfill
+
+        seen, points = backfill(batch_size * 5)
+        click.echo(f"{seen} déploiements agrégés en {points} points de séries.")
+
+
+# --- EXPORTS ---
+@export_cli.command('deployments')
+@_deployment_filter_options
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default='csv', show_default=True)
+@click.option('--output', '-o', default='-', help="Fichier de sortie (défaut: sortie standard); .gz active --gzip.")
+@click.option('--gzip', is_flag=True, help="Compresse à la volée (gzip).")
+@click.option('--no-archive', is_flag=True, help="Ignore l'historique archivé par la rétention.")
+@click.option('--batch-size', type=int, default=None, help="Lignes par requête (défaut: EXPORT_BATCH_SIZE).")
+def export_deployments(project_ids, client, statuses, before, after, triggered_by, fmt, output, gzip, no_archive,
+                       batch_size):
+    """Exporte l'historique filtré des déploiements, ligne à ligne, en mémoire constante."""
+    import time
+    from app.services import bulk, export
+
+    filters = dict(project_ids=project_ids, client=client, statuses=statuses, before=before, after=after,
+                   triggered_by=triggered_by)
+    archived = None if no_archive else export.archive_filters(**filters)
+    started = time.perf_counter()
+    totals = {'rows': 0}
+
+    def progress(stats):
+        totals.update(stats)
+        if stats['batches'] % 20 == 0:
+            elapsed = time.perf_counter() - started
+            click.echo(f"  {stats['rows']} lignes ({stats['rows'] / elapsed:.0f}/s)", err=True)
+
+    chunks = export.stream(fmt, bulk.deployment_filters(**filters), archived,
+                           batch_size or current_app.config['EXPORT_BATCH_SIZE'], gzip or output.endswith('.gz'),
+                           progress)
+    written = 0
+    with click.open_file(output, 'wb', atomic=output != '-') as handle:
+        for chunk in chunks:
+            handle.write(chunk)
+            written += len(chunk)
+    elapsed = time.perf_counter() - started
+    click.echo(f"{totals['rows']} déploiements exportés ({written / 1048576:.1f} Mo) en {elapsed:.1f} s.", err=True)
+
+
+# --- SCHEMA ---
+@db_cli.command('upgrade')
+def db_upgrade():
+    """Met à niveau une base créée par une version antérieure (colonnes ajoutées, clients des projets)."""
+    from app.services.schema import upgrade
+
+    added, tenants, durations = upgrade(db.engine)
+    for column in added:
+        click.echo(f"  + {column.table.name}.{column.name}")
+    click.echo(f"{len(added)} colonnes ajoutées, {tenants} noms de client rattachés, {durations} durées recalculées.")
+
+
+def init_app(app):
+    app.cli.add_command(retention_cli)
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(runners_cli)
+    app.cli.add_command(tenants_cli)
+    app.cli.add_command(webhooks_cli)
+    app.cli.add_command(build_cache_cli)
+    app.cli.add_command(admin_cli)
+    app.cli.add_command(export_cli)
+    app.cli.add_command(db_cli)
@@ -1,7 +1,26 @@
-from app import db, login_manager
+from app import db, login_manager, cache
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, make_transient_to_detached
+from app.services.tenancy import TenantScoped, slugify
+import sqlite3
+
+def configure_sqlite(dbapi_connection):
+    cursor = dbapi_connection.cursor()
+    # Lets the database cascade project deletes instead of the ORM loading every deployment
+    cursor.execute('PRAGMA foreign_keys=ON')
+    # Readers no longer block on the runner threads' writes
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.close()
+
+@event.listens_for(Engine, 'connect')
+def _configure_sqlite(dbapi_connection, connection_record):
+    # aiosqlite connections (async API tier) are wrapped: backend/database.py configures them
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        configure_sqlite(dbapi_connection)
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -10,6 +29,7 @@ class User(UserMixin, db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False, index=True)
     email = db.Column(db.String(120), unique=True, nullable=False, index=True)
     password_hash = db.Column(db.String(255), nullable=False)
+    tenant_id = db.Column(db.Integer, db.ForeignKey('tenants.id'), nullable=True)  # None: staff, sees every tenant
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -24,39 +44,299 @@ class User(UserMixin, db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
+def _user_identity(user_id):
+    row = db.session.execute(
+        db.select(User.id, User.username, User.email, User.tenant_id, User.created_at).where(User.id == user_id)
+    ).mappings().first()
+    return dict(row) if row else None
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # The identity is cached (without the password hash) and re-attached, so most
+    # requests resolve current_user without a SELECT
+    identity = cache.get_or_set(f'user:{int(user_id)}', lambda: _user_identity(int(user_id)), timeout=600, tags=('users',))
+    if identity is None:
+        return None
+    user = User(**identity)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
 
-class Project(db.Model):
+def invalidate_identities(events):
+    """Event bus subscriber: drops the cached identity of users changed by any process (e.g. their tenant)."""
+    for item in events:
+        cache.delete(f'user:{item["key"]}')
+
+class Tenant(db.Model):
+    __tablename__ = 'tenants'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    slug = db.Column(db.String(100), unique=True, nullable=False)
+    name = db.Column(db.String(200), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Tenant {self.slug}>'
+
+class Project(TenantScoped, db.Model):
     __tablename__ = 'projects'
+    __table_args__ = (
+        db.Index('ix_projects_tenant_id_id', 'tenant_id', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
+    tenant_id = db.Column(db.Integer, db.ForeignKey('tenants.id'), nullable=False)
     name = db.Column(db.String(200), nullable=False)
-    client_name = db.Column(db.String(200), nullable=False)
+    client_name = db.Column(db.String(200), nullable=False)  # display name of the tenant
     stack = db.Column(db.String(500), nullable=False)
     status = db.Column(db.String(50), default='Running')
     last_deploy = db.Column(db.DateTime, default=datetime.utcnow)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
-    deployments = db.relationship('Deployment', backref='project', lazy=True, cascade='all, delete-orphan')
+    tenant = db.relationship('Tenant')
+    deployments = db.relationship('Deployment', backref='project', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
     
     def __repr__(self):
         return f'<Project {self.name}>'
 
-class Deployment(db.Model):
+class Deployment(TenantScoped, db.Model):
     __tablename__ = 'deployments'
+    __table_args__ = (
+        # Serves per-project listings paginated on id (API keyset cursor)
+        db.Index('ix_deployments_project_id_id', 'project_id', 'id'),
+        # Tenant-wide listings: one client's history never enters another client's index range
+        db.Index('ix_deployments_tenant_id_id', 'tenant_id', 'id'),
+        db.Index('ix_deployments_tenant_id_status', 'tenant_id', 'status'),
+        # Scheduler queue scan (priority order) and running-set counts
+        db.Index('ix_deployments_status_priority_queued_at', 'status', 'priority', 'queued_at'),
+        # At most one queued run per project and stack: duplicate triggers coalesce onto it
+        db.Index('uq_deployments_queued_project_stack', 'project_id', 'stack', unique=True,
+                 sqlite_where=db.text("status = 'Queued'"), postgresql_where=db.text("status = 'Queued'")),
+        db.UniqueConstraint('user_id', 'idempotency_key', name='uq_deployments_idempotency_key'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+    tenant_id = db.Column(db.Integer, db.ForeignKey('tenants.id'), nullable=False)  # copy of the project's
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id', ondelete='CASCADE'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     status = db.Column(db.String(50), nullable=False)
     log_content = db.Column(db.Text, default='')
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     triggered_by = db.Column(db.String(100), default='System')
+    stack = db.Column(db.String(500), nullable=True)  # stack requested for this run
+    queued_at = db.Column(db.DateTime, nullable=True)
+    priority = db.Column(db.Integer, nullable=False, default=1)  # rank in PRIORITIES, lower runs first
+    runner_id = db.Column(db.Integer, db.ForeignKey('runners.id', ondelete='SET NULL'), nullable=True, index=True)
+    idempotency_key = db.Column(db.String(100), nullable=True)  # Idempotency-Key header of the trigger
     started_at = db.Column(db.DateTime, default=datetime.utcnow)
     ended_at = db.Column(db.DateTime, nullable=True)
+    duration_ms = db.Column(db.Integer, nullable=True)
+    
+    tenant = db.relationship('Tenant')
     
     def __repr__(self):
         return f'<Deployment {self.id} - {self.status}>'
+
+class Runner(db.Model):
+    __tablename__ = 'runners'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), unique=True, nullable=False)
+    host = db.Column(db.String(200), nullable=False)
+    pid = db.Column(db.Integer, nullable=False)
+    slots = db.Column(db.Integer, nullable=False, default=1)
+    status = db.Column(db.String(20), nullable=False, default='online')  # 'online' | 'offline'
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_heartbeat = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<Runner {self.name} ({self.slots} slots)>'
+
+class RetentionPolicy(db.Model):
+    __tablename__ = 'retention_policies'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # Exactly one scope: a project, or every project of a client
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id', ondelete='CASCADE'), nullable=True, unique=True)
+    client_name = db.Column(db.String(200), nullable=True, unique=True)
+    keep_latest = db.Column(db.Integer, nullable=True)
+    keep_days = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        scope = f'project {self.project_id}' if self.project_id else f'client {self.client_name}'
+        return f'<RetentionPolicy {scope}: latest={self.keep_latest} days={self.keep_days}>'
+
+class DeploymentArchive(TenantScoped, db.Model):
+    __tablename__ = 'deployment_archive'
+    __table_args__ = (
+        db.Index('ix_deployment_archive_project_ts', 'project_id', 'timestamp'),
+        db.Index('ix_deployment_archive_tenant_id_id', 'tenant_id', 'id'),
+    )
+    
+    # Same id as the original row; no foreign keys so history outlives its project
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    tenant_id = db.Column(db.Integer, nullable=True)
+    project_id = db.Column(db.Integer, nullable=False)
+    client_name = db.Column(db.String(200), nullable=True, index=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(50), nullable=False)
+    triggered_by = db.Column(db.String(100))
+    timestamp = db.Column(db.DateTime)
+    started_at = db.Column(db.DateTime)
+    ended_at = db.Column(db.DateTime, nullable=True)
+    duration_ms = db.Column(db.Integer, nullable=True)
+    log_compressed = db.Column(db.LargeBinary)  # zlib
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<DeploymentArchive {self.id} - {self.status}>'
+
+class DeploymentRollup(db.Model):
+    __tablename__ = 'deployment_rollups'
+    __table_args__ = (
+        # One row per series point; every chart query is a range scan on this index
+        db.UniqueConstraint('scope', 'scope_key', 'granularity', 'bucket', name='uq_deployment_rollups_series'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(20), nullable=False)  # 'project' | 'client'
+    scope_key = db.Column(db.String(200), nullable=False)
+    granularity = db.Column(db.String(10), nullable=False)  # 'hour' | 'day'
+    bucket = db.Column(db.DateTime, nullable=False)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    success = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    stopped = db.Column(db.Integer, nullable=False, default=0)
+    duration_ms_sum = db.Column(db.BigInteger, nullable=False, default=0)
+    duration_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DeploymentRollup {self.scope}:{self.scope_key} {self.granularity} {self.bucket}>'
+
+class DurationSketch(db.Model):
+    __tablename__ = 'duration_sketches'
+    __table_args__ = (
+        db.UniqueConstraint('scope', 'scope_key', name='uq_duration_sketches_scope'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(20), nullable=False)  # 'project' | 'stack' | 'tenant_stack'
+    scope_key = db.Column(db.String(500), nullable=False)
+    data = db.Column(db.Text, nullable=False, default='')  # serialized DDSketch
+    count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<DurationSketch {self.scope}:{self.scope_key} n={self.count}>'
+
+class DeploymentStage(db.Model):
+    __tablename__ = 'deployment_stages'
+    __table_args__ = (
+        db.Index('ix_deployment_stages_deployment_position', 'deployment_id', 'position'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    deployment_id = db.Column(db.Integer, db.ForeignKey('deployments.id', ondelete='CASCADE'), nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(50), nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    ended_at = db.Column(db.DateTime, nullable=True)
+    duration_ms = db.Column(db.Integer, nullable=True)
+    log = db.Column(db.Text, default='')
+    cache = db.Column(db.String(10), nullable=True)  # 'hit' | 'miss' | None (not cacheable / no cache)
+    saved_ms = db.Column(db.Integer, nullable=True)  # run time of the reused output on a hit
+    
+    def __repr__(self):
+        return f'<DeploymentStage {self.deployment_id}:{self.name} - {self.status}>'
+
+class WebhookEvent(db.Model):
+    __tablename__ = 'webhook_events'
+    __table_args__ = (
+        db.Index('ix_webhook_events_project_id_id', 'project_id', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    delivery_id = db.Column(db.String(100), unique=True, nullable=False)  # X-Gitlab-Event-UUID / X-GitHub-Delivery
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id', ondelete='CASCADE'), nullable=False)
+    source = db.Column(db.String(20), nullable=False)  # 'gitlab' | 'github'
+    event = db.Column(db.String(50), nullable=False)
+    ref = db.Column(db.String(200), nullable=True)
+    commit_sha = db.Column(db.String(64), nullable=True)
+    deployment_id = db.Column(db.Integer, db.ForeignKey('deployments.id', ondelete='SET NULL'), nullable=True)
+    received_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<WebhookEvent {self.delivery_id} {self.event}>'
+
+class OutboxEvent(db.Model):
+    """State change written in the same transaction as the change itself, then fanned out by the event bus."""
+    __tablename__ = 'outbox_events'
+    # AUTOINCREMENT: ids never go back after pruning, so dispatcher cursors stay valid
+    __table_args__ = {'sqlite_autoincrement': True}
+    
+    id = db.Column(db.Integer, primary_key=True)
+    topic = db.Column(db.String(30), nullable=False)  # 'deployment' | 'project' | 'user'
+    key = db.Column(db.Integer, nullable=False)  # deployment, project or user id
+    tenant_id = db.Column(db.Integer, nullable=True)
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<OutboxEvent {self.id} {self.topic}:{self.key}>'
+
+class AuditEvent(TenantScoped, db.Model):
+    """Append-only record of a mutating request (written in batches by the audit flusher)."""
+    __tablename__ = 'audit_events'
+    __table_args__ = (
+        db.Index('ix_audit_events_user_id_id', 'user_id', 'id'),
+        db.Index('ix_audit_events_project_id_id', 'project_id', 'id'),
+        db.Index('ix_audit_events_tenant_id_id', 'tenant_id', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    at = db.Column(db.DateTime, nullable=False, index=True)
+    # No foreign keys: the trail outlives deleted users, projects and deployments
+    user_id = db.Column(db.Integer, nullable=True)
+    username = db.Column(db.String(80), nullable=True)
+    tenant_id = db.Column(db.Integer, nullable=True)
+    action = db.Column(db.String(80), nullable=False)  # endpoint, e.g. 'core.trigger_deploy'
+    method = db.Column(db.String(10), nullable=False)
+    path = db.Column(db.String(300), nullable=False)
+    status_code = db.Column(db.Integer, nullable=False)
+    outcome = db.Column(db.String(20), nullable=False)  # 'ok' | 'failed' | 'denied' | 'error'
+    project_id = db.Column(db.Integer, nullable=True)
+    deployment_id = db.Column(db.Integer, nullable=True)
+    ip = db.Column(db.String(45), nullable=True)
+    detail = db.Column(db.Text, nullable=True)  # JSON
+    
+    def __repr__(self):
+        return f'<AuditEvent {self.id} {self.action} {self.username}>'
+
+
+@event.listens_for(AuditEvent, 'before_update')
+@event.listens_for(AuditEvent, 'before_delete')
+def _audit_is_append_only(mapper, connection, target):
+    raise ValueError("audit_events est en ajout seul")
+
+# --- TENANT ASSIGNMENT ---
+@event.listens_for(Session, 'before_flush')
+def _assign_tenants(session, flush_context, instances):
+    # New projects join (or create) the tenant named by client_name; deployments copy their project's
+    tenants = {}
+    with session.no_autoflush:
+        for obj in session.new:
+            if isinstance(obj, Project) and obj.tenant_id is None and obj.tenant is None:
+                slug = slugify(obj.client_name)
+                tenant = tenants.get(slug) or session.scalars(
+                    db.select(Tenant).where(Tenant.slug == slug)).first()
+                obj.tenant = tenants[slug] = tenant or Tenant(slug=slug, name=obj.client_name)
+        for obj in session.new:
+            if isinstance(obj, Deployment) and obj.tenant_id is None and obj.tenant is None:
+                project = obj.project or session.get(Project, obj.project_id, execution_options={'all_tenants': True})
+                if project.tenant_id is not None:
+                    obj.tenant_id = project.tenant_id
+                else:
+                    obj.tenant = project.tenant
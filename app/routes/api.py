@@ -0,0 +1,393 @@
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+from flask_login import login_required
+from app import db, webhooks, events, audit, admission
+from app.database.models import Project, Deployment, User, DeploymentArchive, DeploymentStage, Tenant, AuditEvent
+from app.services.retention import archived_log
+from app.services import rollups, sketches, scheduler, build_cache, export
+from app.services.bulk import deployment_filters
+from app.services.tenancy import current_tenant_id, tenant_scope
+from datetime import datetime
+import base64
+import json
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+# Fields each resource exposes. Listings only ever select the `list` columns,
+# so heavy columns such as log_content never leave the database for a list call.
+RESOURCES = {
+    'projects': {
+        'model': Project,
+        'list': ('id', 'tenant_id', 'name', 'client_name', 'stack', 'status', 'last_deploy', 'created_at'),
+        'detail': ('id', 'tenant_id', 'name', 'client_name', 'stack', 'status', 'last_deploy', 'created_at'),
+    },
+    'deployments': {
+        'model': Deployment,
+        'list': ('id', 'project_id', 'user_id', 'status', 'timestamp', 'triggered_by', 'stack', 'priority', 'queued_at', 'runner_id', 'started_at', 'ended_at', 'duration_ms'),
+        'detail': ('id', 'project_id', 'user_id', 'status', 'timestamp', 'triggered_by', 'stack', 'priority', 'queued_at', 'runner_id', 'started_at', 'ended_at', 'duration_ms', 'log_content'),
+    },
+    'archived_deployments': {
+        'model': DeploymentArchive,
+        'list': ('id', 'project_id', 'client_name', 'user_id', 'status', 'triggered_by', 'timestamp', 'started_at', 'ended_at', 'duration_ms', 'archived_at'),
+        'detail': ('id', 'project_id', 'client_name', 'user_id', 'status', 'triggered_by', 'timestamp', 'started_at', 'ended_at', 'duration_ms', 'archived_at'),
+    },
+    'audit_events': {
+        'model': AuditEvent,
+        'list': ('id', 'at', 'user_id', 'username', 'tenant_id', 'action', 'method', 'path', 'status_code', 'outcome', 'project_id', 'deployment_id', 'ip', 'detail'),
+        'detail': ('id', 'at', 'user_id', 'username', 'tenant_id', 'action', 'method', 'path', 'status_code', 'outcome', 'project_id', 'deployment_id', 'ip', 'detail'),
+    },
+    'users': {
+        'model': User,
+        'list': ('id', 'username', 'email', 'created_at'),
+        'detail': ('id', 'username', 'email', 'created_at'),
+    },
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@api_bp.errorhandler(ApiError)
+def handle_api_error(err):
+    return jsonify({'error': err.message}), err.status
+
+
+# --- HELPERS ---
+def _parse_datetime(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ApiError(f'{name} doit être une date ISO 8601')
+
+
+def _columns(resource, view):
+    spec = RESOURCES[resource]
+    allowed = spec[view]
+    requested = request.args.get('fields')
+    if not requested:
+        names = allowed
+    else:
+        names = [name.strip() for name in requested.split(',') if name.strip()]
+        unknown = [name for name in names if name not in allowed]
+        if unknown:
+            raise ApiError(f'Champs inconnus pour {resource}: {", ".join(unknown)}')
+        # The cursor is built from the id, so it is always selected
+        if 'id' not in names:
+            names = ['id'] + names
+    model = spec['model']
+    return [getattr(model, name) for name in names]
+
+
+def _serialize(row):
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()}
+
+
+def _encode_cursor(last_id):
+    return base64.urlsafe_b64encode(json.dumps({'id': last_id}).encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded))['id'])
+    except (ValueError, KeyError, TypeError):
+        raise ApiError('Curseur invalide')
+
+
+def _limit():
+    try:
+        limit = int(request.args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ApiError('limit doit être un entier')
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def _paginate(resource, *criteria):
+    """Keyset pagination on the primary key, newest first."""
+    model = RESOURCES[resource]['model']
+    limit = _limit()
+    query = db.select(*_columns(resource, 'list')).where(*criteria).order_by(model.id.desc()).limit(limit + 1)
+    cursor = request.args.get('cursor')
+    if cursor:
+        query = query.where(model.id < _decode_cursor(cursor))
+
+    rows = db.session.execute(query).mappings().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return jsonify({
+        'data': [_serialize(row) for row in rows],
+        'next_cursor': _encode_cursor(rows[-1]['id']) if has_more else None,
+    })
+
+
+def _detail(resource, object_id, *criteria):
+    model = RESOURCES[resource]['model']
+    row = db.session.execute(
+        db.select(*_columns(resource, 'detail')).where(model.id == object_id, *criteria)
+    ).mappings().first()
+    if row is None:
+        raise ApiError('Ressource introuvable', 404)
+    return jsonify({'data': _serialize(row)})
+
+
+# --- PROJECTS ---
+@api_bp.route('/projects')
+@login_required
+def list_projects():
+    criteria = []
+    if request.args.get('client'):
+        criteria.append(Project.client_name == request.args['client'])
+    if request.args.get('status'):
+        criteria.append(Project.status == request.args['status'])
+    return _paginate('projects', *criteria)
+
+
+@api_bp.route('/projects/<int:id>')
+@login_required
+def get_project(id):
+    return _detail('projects', id)
+
+
+@api_bp.route('/projects/<int:id>/deployments')
+@login_required
+def list_project_deployments(id):
+    criteria = [Deployment.project_id == id]
+    if request.args.get('status'):
+        criteria.append(Deployment.status == request.args['status'])
+    return _paginate('deployments', *criteria)
+
+
+# --- DEPLOYMENTS ---
+@api_bp.route('/deployments')
+@login_required
+def list_deployments():
+    criteria = []
+    if request.args.get('project_id'):
+        criteria.append(Deployment.project_id == request.args.get('project_id', type=int))
+    if request.args.get('status'):
+        criteria.append(Deployment.status == request.args['status'])
+    return _paginate('deployments', *criteria)
+
+
+@api_bp.route('/deployments/export')
+@login_required
+def export_deployments():
+    # Whole filtered history (archived rows included unless archived=0), streamed batch by batch
+    fmt = request.args.get('format', 'csv')
+    if fmt not in export.FORMATS:
+        raise ApiError(f'format doit être parmi: {", ".join(export.FORMATS)}')
+    filters = {
+        'project_ids': request.args.getlist('project_id', type=int),
+        'client': request.args.get('client'),
+        'statuses': request.args.getlist('status'),
+        'before': _parse_datetime('until'),
+        'after': _parse_datetime('since'),
+        'triggered_by': request.args.get('triggered_by'),
+    }
+    archived = export.archive_filters(**filters) if request.args.get('archived', '1') != '0' else None
+    gzip = request.args.get('gzip') == '1'
+    chunks = export.stream(fmt, deployment_filters(**filters), archived, current_app.config['EXPORT_BATCH_SIZE'], gzip)
+    tenant_id = current_tenant_id()
+
+    def generate():
+        # The tenant scope must hold for every batch, not only while the view runs
+        with tenant_scope(tenant_id):
+            yield from chunks
+
+    filename = f"deployments-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}{'.gz' if gzip else ''}"
+    # gzip=1 downloads a .gz file; otherwise the compression middleware still negotiates Content-Encoding
+    return Response(stream_with_context(generate()), mimetype='application/gzip' if gzip else export.FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"',
+                             'Cache-Control': 'no-store'})
+
+
+@api_bp.route('/deployments/<int:id>')
+@login_required
+def get_deployment(id):
+    return _detail('deployments', id)
+
+
+@api_bp.route('/deployments/<int:id>/stages')
+@login_required
+def list_deployment_stages(id):
+    if db.session.scalar(db.select(Deployment.id).where(Deployment.id == id)) is None:
+        raise ApiError('Ressource introuvable', 404)
+    rows = db.session.execute(
+        db.select(DeploymentStage.name, DeploymentStage.status, DeploymentStage.started_at, DeploymentStage.ended_at,
+                  DeploymentStage.duration_ms, DeploymentStage.log, DeploymentStage.cache, DeploymentStage.saved_ms)
+        .where(DeploymentStage.deployment_id == id).order_by(DeploymentStage.position)
+    ).mappings()
+    return jsonify({'data': [_serialize(row) for row in rows]})
+
+
+# --- ARCHIVED HISTORY (moved out of deployments by the retention engine) ---
+@api_bp.route('/archive/deployments')
+@login_required
+def list_archived_deployments():
+    criteria = []
+    if request.args.get('project_id'):
+        criteria.append(DeploymentArchive.project_id == request.args.get('project_id', type=int))
+    if request.args.get('client'):
+        criteria.append(DeploymentArchive.client_name == request.args['client'])
+    return _paginate('archived_deployments', *criteria)
+
+
+@api_bp.route('/archive/deployments/<int:id>')
+@login_required
+def get_archived_deployment(id):
+    archive = db.session.get(DeploymentArchive, id)
+    if archive is None:
+        raise ApiError('Ressource introuvable', 404)
+    data = {name: getattr(archive, name) for name in RESOURCES['archived_deployments']['detail']}
+    data['log_content'] = archived_log(archive)
+    return jsonify({'data': _serialize(data)})
+
+
+# --- TIME SERIES (pre-aggregated rollups) ---
+def _series(scope, key):
+    granularity = request.args.get('granularity', 'hour')
+    if granularity not in rollups.GRANULARITIES:
+        raise ApiError(f'granularity doit être parmi: {", ".join(rollups.GRANULARITIES)}')
+    return jsonify({'data': rollups.series(scope, key, granularity, _parse_datetime('since'), _parse_datetime('until'))})
+
+
+@api_bp.route('/projects/<int:id>/series')
+@login_required
+def project_series(id):
+    # Rollups are not tenant-scoped: check the project is visible first
+    if db.session.scalar(db.select(Project.id).where(Project.id == id)) is None:
+        raise ApiError('Ressource introuvable', 404)
+    return _series('project', id)
+
+
+@api_bp.route('/clients/<client_name>/series')
+@login_required
+def client_series(client_name):
+    tenant_id = current_tenant_id()
+    if tenant_id is not None and db.session.scalar(db.select(Tenant.name).where(Tenant.id == tenant_id)) != client_name:
+        raise ApiError('Ressource introuvable', 404)
+    return _series('client', client_name)
+
+
+# --- DURATION PERCENTILES ---
+@api_bp.route('/projects/<int:id>/durations')
+@login_required
+def project_durations(id):
+    project = db.session.execute(db.select(Project.stack, Project.tenant_id).where(Project.id == id)).first()
+    if project is None:
+        raise ApiError('Ressource introuvable', 404)
+    return jsonify({'data': {
+        'project': sketches.summary(sketches.load(db.session, 'project', id)),
+        # The stack's durations within the project's tenant, as on the project page
+        'stack': sketches.summary(sketches.load(db.session, *sketches.stack_scope(project.stack, project.tenant_id))),
+    }})
+
+
+@api_bp.route('/projects/<int:id>/build-cache')
+@login_required
+def project_build_cache(id):
+    # Deployment stages are not tenant-scoped: check the project is visible first
+    if db.session.scalar(db.select(Project.id).where(Project.id == id)) is None:
+        raise ApiError('Ressource introuvable', 404)
+    return jsonify({'data': build_cache.project_stats(db.session, id)})
+
+
+@api_bp.route('/stacks/durations')
+@login_required
+def stack_durations():
+    stack = request.args.get('stack')
+    if not stack:
+        raise ApiError('Paramètre stack requis')
+    # Sketches are not tenant-scoped: tenants read their own, staff the all-tenant one
+    scope = sketches.stack_scope(stack, current_tenant_id())
+    return jsonify({'data': sketches.summary(sketches.load(db.session, *scope))})
+
+
+# --- RUNNERS & QUEUE ---
+@api_bp.route('/runners')
+@login_required
+def list_runners():
+    stats = scheduler.runner_stats(current_app.config['RUNNER_TIMEOUT_SECONDS'])
+    stats['runners'] = [_serialize(runner) for runner in stats['runners']]
+    return jsonify({'data': stats})
+
+
+@api_bp.route('/queue')
+@login_required
+def queue_status():
+    return jsonify({'data': scheduler.queue_stats()})
+
+
+@api_bp.route('/webhooks/stats')
+@login_required
+def webhook_stats():
+    # Counters of this worker process since it started
+    return jsonify({'data': webhooks.stats()})
+
+
+@api_bp.route('/admission/stats')
+@login_required
+def admission_stats():
+    # Deploy triggers admitted / turned away (429) by this worker process, per reason
+    return jsonify({'data': admission.stats()})
+
+
+@api_bp.route('/events/stats')
+@login_required
+def event_stats():
+    # Outbox dispatcher of this worker process
+    return jsonify({'data': events.stats()})
+
+
+# --- AUDIT TRAIL ---
+@api_bp.route('/audit')
+@login_required
+def list_audit_events():
+    # Tenant users only see their tenant's events (AuditEvent is tenant scoped)
+    criteria = []
+    for name in ('user_id', 'project_id', 'deployment_id'):
+        if request.args.get(name):
+            criteria.append(getattr(AuditEvent, name) == request.args.get(name, type=int))
+    if request.args.get('action'):
+        criteria.append(AuditEvent.action == request.args['action'])
+    since, until = _parse_datetime('since'), _parse_datetime('until')
+    if since:
+        criteria.append(AuditEvent.at >= since)
+    if until:
+        criteria.append(AuditEvent.at < until)
+    return _paginate('audit_events', *criteria)
+
+
+@api_bp.route('/audit/stats')
+@login_required
+def audit_stats():
+    # Buffer of this worker process
+    return jsonify({'data': audit.stats()})
+
+
+# --- USERS ---
+def _user_criteria():
+    # Users are not tenant-scoped (staff have no tenant): filter them by hand
+    tenant_id = current_tenant_id()
+    return () if tenant_id is None else (User.tenant_id == tenant_id,)
+
+
+@api_bp.route('/users')
+@login_required
+def list_users():
+    return _paginate('users', *_user_criteria())
+
+
+@api_bp.route('/users/<int:id>')
+@login_required
+def get_user(id):
+    return _detail('users', id, *_user_criteria())
@@ -1,9 +1,14 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, session, abort, Response
 from flask_login import login_user, logout_user, login_required, current_user
-from app import db
-from app.database.models import Project, Deployment, User
+from app import db, cache, runners, live, audit, log_tail
+from app.database.models import Project, Deployment, User, Runner, Tenant
+from app.services.pipeline import FINAL_STATUSES, PRIORITIES, DEFAULT_PRIORITY
+from app.services import rollups, sketches, scheduler, deployments as deployment_queue
+from app.services.tenancy import current_tenant_id
+from app.services.events import deployment_event, project_event
+from app.services.logtail import parse_range, log_state_query, tail_response
 from datetime import datetime
-import random
+import time
 
 core_bp = Blueprint('core', __name__)
 
@@ -22,6 +27,7 @@ def login():
             login_user(user)
             return redirect(url_for('core.dashboard'))
         else:
+            audit.annotate(username=username, outcome='failed')
             flash('Nom d\'utilisateur ou mot de passe invalide', 'danger')
     
     return render_template('login.html')
@@ -36,6 +42,8 @@ def register():
         email = request.form.get('email')
         password = request.form.get('password')
         confirm_password = request.form.get('confirm_password')
+        # Refused unless the account gets created below
+        audit.annotate(username=username, outcome='failed')
         
         if User.query.filter_by(username=username).first():
             flash('Le nom d\'utilisateur existe déjà', 'danger')
@@ -55,6 +63,7 @@ def register():
         db.session.commit()
         
         login_user(user)
+        audit.annotate(outcome='ok')
         flash('Compte créé avec succès!', 'success')
         return redirect(url_for('core.dashboard'))
     
@@ -63,6 +72,7 @@ def register():
 @core_bp.route('/logout')
 @login_required
 def logout():
+    audit.annotate(user_id=current_user.id, username=current_user.username)
     logout_user()
     flash('Vous avez été déconnecté avec succès.', 'info')
     return redirect(url_for('core.login'))
@@ -73,84 +83,186 @@ def index():
         return redirect(url_for('core.dashboard'))
     return redirect(url_for('core.login'))
 
+# --- CACHED READS ---
+# Rows are cached as plain dicts (templates read them with the same attribute syntax),
+# and every mutation below invalidates the tags it affects.
+def _project_rows():
+    # Mapped attributes (not table columns) so the tenant scope applies
+    columns = [getattr(Project, c.key) for c in Project.__table__.columns]
+    return [dict(row) for row in db.session.execute(
+        db.select(*columns).order_by(Project.id)
+    ).mappings()]
+
+def _latest_deployment_rows(project_id, limit=10):
+    columns = [getattr(Deployment, c.key) for c in Deployment.__table__.columns if c.key != 'log_content']
+    return [dict(row) for row in db.session.execute(
+        db.select(*columns, Runner.name.label('runner_name'))
+        .outerjoin(Runner, Runner.id == Deployment.runner_id)
+        .where(Deployment.project_id == project_id)
+        .order_by(Deployment.timestamp.desc()).limit(limit)
+    ).mappings()]
+
+def _runner_stats():
+    return scheduler.runner_stats(current_app.config['RUNNER_TIMEOUT_SECONDS'])
+
+def invalidate_project(project_id):
+    cache.invalidate_tags('projects', f'project:{project_id}')
+
 @core_bp.route('/dashboard')
 @login_required
 def dashboard():
-    projects = Project.query.all()
-    return render_template('home.html', projects=projects)
+    tenant_id = current_tenant_id()
+    projects = cache.get_or_set(f'projects:{tenant_id or "all"}', _project_rows, tags=('projects',))
+    # Slot usage moves with every claim: only cached for a few seconds
+    runner_stats = cache.get_or_set('runners:stats', _runner_stats, timeout=5)
+    tenants = cache.get_or_set('tenants:all', _tenant_rows, tags=('tenants',)) if current_user.tenant_id is None else []
+    return render_template('home.html', projects=projects, runner_stats=runner_stats, tenants=tenants, tenant_id=tenant_id)
+
+@core_bp.route('/dashboard/stream')
+@login_required
+def dashboard_stream():
+    # Status deltas pushed by this worker's event bus subscription; no query per browser
+    if live.full:
+        return jsonify({'error': 'Trop de tableaux de bord connectés'}), 503, {'Retry-After': '30'}
+    return Response(live.stream(current_tenant_id()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# --- TENANTS ---
+def _tenant_rows():
+    return [dict(row) for row in db.session.execute(
+        db.select(Tenant.id, Tenant.slug, Tenant.name).order_by(Tenant.name)
+    ).mappings()]
+
+@core_bp.route('/tenant/<slug>')
+@login_required
+def select_tenant(slug):
+    # Staff users browse one client at a time; tenant users are always pinned to theirs
+    if current_user.tenant_id is not None:
+        abort(403)
+    if slug == 'all':
+        session.pop('tenant_id', None)
+    else:
+        tenant = Tenant.query.filter_by(slug=slug).first_or_404()
+        session['tenant_id'] = tenant.id
+    return redirect(url_for('core.dashboard'))
 
 @core_bp.route('/project/<int:id>')
 @login_required
 def project_detail(id):
     project = Project.query.get_or_404(id)
-    deployments = Deployment.query.filter_by(project_id=id).order_by(Deployment.timestamp.desc()).limit(10).all()
-    return render_template('detail.html', project=project, deployments=deployments)
+    deployments = cache.get_or_set(f'project:{id}:deployments', lambda: _latest_deployment_rows(id), tags=(f'project:{id}',))
+    durations = cache.get_or_set(f'project:{id}:durations', lambda: {
+        'project': sketches.summary(sketches.load(db.session, 'project', id)),
+        'stack': sketches.summary(sketches.load(db.session, *sketches.stack_scope(project.stack, project.tenant_id))),
+    }, tags=(f'project:{id}', 'durations'))
+    return render_template('detail.html', project=project, deployments=deployments, durations=durations)
 
 # --- DEPLOYMENT MANAGEMENT ---
 @core_bp.route('/api/deploy/<int:id>', methods=['POST'])
 @login_required
 def trigger_deploy(id):
     project = Project.query.get_or_404(id)
-    stack = request.json.get('stack', project.stack) if request.is_json else request.form.get('stack', project.stack)
-    
-    is_success = random.choice([True, True, True, True, False])
-    status = 'Success' if is_success else 'Failed'
+    audit.annotate(project_id=id)
+    options = request.get_json(silent=True) if request.is_json else request.form
+    if not isinstance(options, dict):
+        return jsonify({'error': 'Corps JSON invalide'}), 400
+    # JSON bodies may carry any type: a list or an object is rejected instead of reaching the lookups below
+    stack = options.get('stack', project.stack)
+    if not isinstance(stack, str):
+        return jsonify({'error': 'Stack invalide'}), 400
+    policy = options.get('coalesce') or current_app.config['DEPLOY_COALESCE_POLICY']
+    if not isinstance(policy, str) or policy not in deployment_queue.COALESCE_POLICIES:
+        return jsonify({'error': f'Politique inconnue: {policy}'}), 400
+    priority = options.get('priority') or DEFAULT_PRIORITY
+    if not isinstance(priority, str) or priority not in PRIORITIES:
+        return jsonify({'error': f'Priorité inconnue: {priority} ({", ".join(PRIORITIES)})'}), 400
     
-    log_text = f'''[INFO] Initializing CI/CD Pipeline for {project.name}...
-[INFO] Stack: {stack}
-[INFO] Fetching origin/master... OK
-[INFO] Building Container... Done (0.4s)
-[INFO] Running Unit Tests... 
-       - test_api.py ... OK
-       - test_db.py ... OK
-[INFO] Pushing artifacts to production...'''
-
-    if is_success:
-        log_text += f'''
-[INFO] Service restarted successfully.
-[RESULT] DEPLOYMENT SUCCESSFUL.'''
-        project.status = 'Running'
-        project.last_deploy = datetime.utcnow()
-    else:
-        log_text += f'''
-[ERROR] Timeout waiting for database connection.
-[FATAL] Rollback initiated.
-[RESULT] DEPLOYMENT FAILED.'''
-        project.status = 'Error'
-
-    new_deploy = Deployment(project_id=id, user_id=current_user.id, status=status, log_content=log_text, triggered_by=current_user.username, started_at=datetime.utcnow())
-    db.session.add(new_deploy)
+    # The pipeline runs on a runner slot; the page polls the deployment until it is final
+    try:
+        new_deploy, outcome = deployment_queue.request_deployment(
+            db.session, project, current_user.id, current_user.username, stack, policy,
+            request.headers.get('Idempotency-Key'), PRIORITIES[priority])
+    except deployment_queue.IdempotencyConflict:
+        return jsonify({'error': 'Clé d\'idempotence déjà utilisée pour un autre projet'}), 422
     db.session.commit()
+    audit.annotate(deployment_id=new_deploy.id, result=outcome, priority=priority)
+    added = outcome in ('queued', 'superseded')
+    if added:
+        runners.notify()
+        invalidate_project(id)
     
-    return jsonify({'status': status, 'logs': log_text, 'deployment_id': new_deploy.id})
+    return jsonify({'status': new_deploy.status, 'deployment_id': new_deploy.id, 'outcome': outcome,
+                    'queue_position': deployment_queue.queue_position(db.session, new_deploy)}), 202 if added else 200
 
 @core_bp.route('/api/deploy/<int:deploy_id>/stop', methods=['POST'])
 @login_required
 def stop_deploy(deploy_id):
     deployment = Deployment.query.get_or_404(deploy_id)
+    audit.annotate(project_id=deployment.project_id, deployment_id=deploy_id)
     
-    if deployment.status in ['Success', 'Failed', 'Stopped']:
+    if deployment.status in FINAL_STATUSES:
         return jsonify({'error': f'Impossible d\'arrêter un déploiement {deployment.status.lower()}'}), 400
     
     deployment.status = 'Stopped'
     deployment.ended_at = datetime.utcnow()
+    deployment.duration_ms = rollups.duration_ms(deployment.started_at, deployment.ended_at)
     deployment.log_content += f'\n[WARN] Deployment stopped by {current_user.username} at {datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")}'
     
     project = deployment.project
     project.status = 'Stopped'
+    rollups.record_deployment(deployment, project.client_name)
+    db.session.execute(deployment_event(deployment.id, project.id, project.tenant_id, 'Stopped', ended_at=deployment.ended_at))
+    db.session.execute(project_event(project.id, project.tenant_id, project.status, project.last_deploy))
     
     db.session.commit()
+    # Interrupts the pipeline right away when it runs in this process; other workers see the status change
+    runners.cancel(deploy_id, f'stopped by {current_user.username}')
+    invalidate_project(project.id)
     
     return jsonify({'status': 'Stopped', 'message': 'Deployment stopped successfully'})
 
+@core_bp.route('/api/deployment/<int:deploy_id>/log')
+@login_required
+def deployment_log(deploy_id):
+    # Incremental tail: ?since=<byte offset> or Range: bytes=N-, plus ?wait=<s> to long-poll for new output
+    byte_range = parse_range(request.headers.get('Range'))
+    first, last = byte_range or (max(request.args.get('since', 0, type=int), 0), None)
+    wait = min(max(request.args.get('wait', 0, type=float), 0), current_app.config['LOG_TAIL_MAX_WAIT_SECONDS'])
+    runner_timeout = current_app.config['RUNNER_TIMEOUT_SECONDS']
+    deadline = time.monotonic() + wait
+    status = None
+    with log_tail.watching(deploy_id):
+        while True:
+            version = log_tail.version(deploy_id)
+            row = db.session.execute(log_state_query(deploy_id)).first()
+            # No connection held while waiting
+            db.session.close()
+            if row is None:
+                return jsonify({'error': 'Ressource introuvable'}), 404
+            code, body, headers = tail_response(row, first, last, byte_range is not None, runner_timeout)
+            changed = body or headers['X-Log-Complete'] == '1' or first > int(headers['X-Log-Size'])
+            remaining = deadline - time.monotonic()
+            if changed or status not in (None, row.status) or remaining <= 0:
+                break
+            if log_tail.full:
+                # Every waiting slot of this worker is taken: the client polls again later instead
+                headers['Retry-After'] = str(current_app.config['LOG_TAIL_RETRY_SECONDS'])
+                break
+            status = row.status
+            log_tail.wait(deploy_id, version, remaining)
+    return Response(body, status=code, headers=headers, mimetype='text/plain')
+
 @core_bp.route('/api/deployment/<int:deploy_id>', methods=['DELETE'])
 @login_required
 def delete_deployment(deploy_id):
     deployment = Deployment.query.get_or_404(deploy_id)
     project_id = deployment.project_id
+    audit.annotate(project_id=project_id, deployment_id=deploy_id)
     
     db.session.delete(deployment)
+    db.session.execute(deployment_event(deploy_id, project_id, deployment.tenant_id, 'Deleted'))
     db.session.commit()
+    invalidate_project(project_id)
     
     return jsonify({'message': 'Deployment deleted successfully', 'project_id': project_id})
 
@@ -169,6 +281,9 @@ def add_mock_project():
             return redirect(url_for('core.add_mock_project'))
         
         tech_stack = ' + '.join(tech_stack_list)
+        if current_user.tenant_id is not None:
+            # Tenant users can only create projects for their own client
+            client_name = db.session.get(Tenant, current_user.tenant_id).name
         
         new_project = Project(
             name=project_name,
@@ -178,7 +293,11 @@ def add_mock_project():
             last_deploy=datetime.utcnow()
         )
         db.session.add(new_project)
+        db.session.flush()
+        db.session.execute(project_event(new_project.id, new_project.tenant_id, new_project.status, new_project.last_deploy))
         db.session.commit()
+        audit.annotate(project_id=new_project.id)
+        cache.invalidate_tags('projects', 'tenants')
         
         flash(f'Projet simulé « {project_name} » créé avec succès!', 'success')
         return redirect(url_for('core.project_detail', id=new_project.id))
@@ -0,0 +1,22 @@
+from flask import Blueprint, request, jsonify
+from app import webhooks
+from app.services.webhooks import InvalidWebhook
+
+hooks_bp = Blueprint('hooks', __name__, url_prefix='/hooks')
+
+
+@hooks_bp.errorhandler(InvalidWebhook)
+def handle_invalid_webhook(err):
+    response = jsonify({'error': err.message})
+    response.status_code = err.status
+    if err.status == 503:
+        response.headers['Retry-After'] = '1'
+    return response
+
+
+# --- CI WEBHOOKS ---
+@hooks_bp.route('/<int:project_id>', methods=['POST'])
+def receive(project_id):
+    # Authenticated by the project's webhook secret, not a session: acknowledged before anything is written
+    delivery_id = webhooks.submit(project_id, request.headers, request.get_data(cache=False))
+    return jsonify({'status': 'accepted', 'delivery': delivery_id}), 202
@@ -0,0 +1,192 @@
+import math
+import os
+import threading
+import time
+
+# Reasons a trigger is turned away, cheapest check first
+REASONS = ('queue', 'in_flight', 'user', 'project')
+MESSAGES = {
+    'queue': "File de déploiement saturée",
+    'in_flight': "Trop de déclenchements en cours de traitement",
+    'user': "Trop de déploiements demandés par cet utilisateur",
+    'project': "Trop de déploiements demandés pour ce projet",
+}
+# Idle buckets are forgotten once there are more than this many
+MAX_BUCKETS = 10000
+
+
+class Rejected(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(MESSAGES[reason])
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def message(self):
+        return f"{MESSAGES[self.reason]}, réessayez dans {self.retry_after} s"
+
+
+def queue_depth_query():
+    """Count of queued deployments (shared by the Flask and async tiers)."""
+    from sqlalchemy import func, select
+    from app.database.models import Deployment
+
+    return (select(func.count()).select_from(Deployment).where(Deployment.status == 'Queued')
+            .execution_options(all_tenants=True))
+
+
+class AdmissionControl:
+    """Admission control for deployment triggers, decided before the request touches the database.
+
+    Everything lives in process memory and is checked under one lock:
+      queue      no trigger is admitted while ADMISSION_MAX_QUEUE_DEPTH deployments wait
+      in_flight  triggers processed at once; the limit (ADMISSION_MAX_IN_FLIGHT) shrinks
+                 as the queue fills, so a backlog slows intake before it refuses it
+      user       token bucket per user: ADMISSION_USER_RATE per second, bursts of ADMISSION_USER_BURST
+      project    token bucket per project, likewise
+    The queue depth is recounted off the request path: by the event bus
+    subscriber after each deployment change (Flask, plus once on a process's
+    first request), or by a periodic probe (async tier). The user comes from the login session cookie, not the user
+    loader, so a rejected trigger costs no query. Limits and counters are
+    per process.
+    """
+
+    # Guarded endpoints and the view argument holding their project id
+    ENDPOINTS = {'core.trigger_deploy': 'id'}
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.queue_depth = 0
+        self._depth_pid = None
+        self._depth_lock = threading.Lock()
+        self._in_flight = 0
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._counters = {'accepted': 0, **{f'rejected_{reason}': 0 for reason in REASONS}}
+        if app is not None:
+            self.init_app(app)
+
+    def configure(self, config):
+        self.enabled = config['ADMISSION_ENABLED']
+        self.max_in_flight = config['ADMISSION_MAX_IN_FLIGHT']
+        self.max_queue_depth = config['ADMISSION_MAX_QUEUE_DEPTH']
+        self.queue_retry_after = config['ADMISSION_QUEUE_RETRY_SECONDS']
+        self.limits = {
+            'user': (config['ADMISSION_USER_RATE'], config['ADMISSION_USER_BURST']),
+            'project': (config['ADMISSION_PROJECT_RATE'], config['ADMISSION_PROJECT_BURST']),
+        }
+
+    def init_app(self, app):
+        app.extensions['admission'] = self
+        self.configure(app.config)
+        if not self.enabled:
+            return
+        # Registered ahead of the tenancy hook, which resolves current_user
+        app.before_request(self.ensure_counted)
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+        app.extensions['events'].subscribe(('deployment',), self.refresh_depth)
+
+    # --- GATES ---
+    def in_flight_limit(self):
+        if not self.max_in_flight:
+            return None
+        if not self.max_queue_depth:
+            return self.max_in_flight
+        free = max(0, self.max_queue_depth - self.queue_depth)
+        return math.ceil(self.max_in_flight * free / self.max_queue_depth)
+
+    def _bucket(self, kind, key, now):
+        """[tokens, updated] of one bucket, refilled up to now; None when that limit is off."""
+        rate, burst = self.limits[kind]
+        if not rate:
+            return None
+        bucket = self._buckets.get((kind, key))
+        if bucket is None:
+            if len(self._buckets) >= MAX_BUCKETS:
+                self._forget_idle(now)
+            bucket = self._buckets[(kind, key)] = [burst, now]
+        else:
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        return bucket
+
+    def _forget_idle(self, now):
+        # A bucket that has refilled completely carries no state
+        for (kind, key), (tokens, updated) in list(self._buckets.items()):
+            rate, burst = self.limits[kind]
+            if tokens + (now - updated) * rate >= burst:
+                del self._buckets[(kind, key)]
+
+    def _reject(self, reason, retry_after):
+        self._counters[f'rejected_{reason}'] += 1
+        raise Rejected(reason, max(1, math.ceil(retry_after)))
+
+    def admit(self, user_id, project_id):
+        """Takes an in-flight slot and a token from both buckets, or raises Rejected. Pair with release()."""
+        now = time.monotonic()
+        with self._lock:
+            if self.max_queue_depth and self.queue_depth >= self.max_queue_depth:
+                self._reject('queue', self.queue_retry_after)
+            limit = self.in_flight_limit()
+            if limit is not None and self._in_flight >= limit:
+                self._reject('in_flight', 1)
+            buckets = [(kind, self._bucket(kind, key, now)) for kind, key in (('user', user_id), ('project', project_id))]
+            for kind, bucket in buckets:
+                if bucket is not None and bucket[0] < 1:
+                    self._reject(kind, (1 - bucket[0]) / self.limits[kind][0])
+            for _, bucket in buckets:
+                if bucket is not None:
+                    bucket[0] -= 1
+            self._in_flight += 1
+            self._counters['accepted'] += 1
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def refresh_depth(self, events=None):
+        """Event bus subscriber: recounts the queue after deployments were queued, claimed or finished."""
+        from app import db
+
+        self.queue_depth = db.session.scalar(queue_depth_query())
+        db.session.rollback()
+
+    def ensure_counted(self):
+        """Counts the queue on a process's first request: a backlog left by a restart sends no event."""
+        if self._depth_pid != os.getpid():
+            with self._depth_lock:
+                if self._depth_pid != os.getpid():
+                    self.refresh_depth()
+                    self._depth_pid = os.getpid()
+
+    # --- FLASK HOOKS ---
+    def _before_request(self):
+        from flask import g, jsonify, request, session
+
+        project_arg = self.ENDPOINTS.get(request.endpoint)
+        user_id = session.get('_user_id')
+        if project_arg is None or user_id is None:
+            # Anonymous triggers get their 401 from login_required
+            return None
+        try:
+            self.admit(int(user_id), request.view_args[project_arg])
+        except Rejected as err:
+            response = jsonify({'error': err.message})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(err.retry_after)
+            return response
+        g.admitted = True
+        return None
+
+    def _teardown_request(self, exc=None):
+        from flask import g
+
+        if g.pop('admitted', False):
+            self.release()
+
+    # --- STATISTICS ---
+    def stats(self):
+        with self._lock:
+            return {**self._counters, 'in_flight': self._in_flight, 'in_flight_limit': self.in_flight_limit(),
+                    'queue_depth': self.queue_depth, 'buckets': len(self._buckets)}
@@ -0,0 +1,75 @@
+import json
+import mimetypes
+import os
+from flask import request, send_from_directory, url_for, abort
+from werkzeug.security import safe_join
+
+# Third-party assets vendored by scripts/build_assets.py. Until the build has run,
+# asset_url() falls back to these CDN URLs so a fresh checkout still renders.
+VENDOR_ASSETS = {
+    'vendor/bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'vendor/bootstrap.bundle.min.js': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+    'vendor/bootstrap-icons.css': 'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.0/font/bootstrap-icons.css',
+    'vendor/fonts/bootstrap-icons.woff2': 'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.0/font/fonts/bootstrap-icons.woff2',
+    'vendor/fonts/bootstrap-icons.woff': 'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.0/font/fonts/bootstrap-icons.woff',
+}
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+# Precompressed variants written next to each fingerprinted file, best first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+class Assets:
+    """Resolves logical asset names to fingerprinted files from the build manifest."""
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        self.dist_dir = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.dist_dir = os.path.join(app.static_folder, DIST_DIR)
+        self.manifest = self._load_manifest()
+        self.static_folder = app.static_folder
+
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.serve)
+        app.add_template_global(self.asset_url, 'asset_url')
+        app.extensions['assets'] = self
+
+    def _load_manifest(self):
+        try:
+            with open(os.path.join(self.dist_dir, MANIFEST), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def asset_url(self, filename):
+        hashed = self.manifest.get(filename)
+        if hashed:
+            return url_for('assets', filename=hashed)
+        if filename in VENDOR_ASSETS and not os.path.isfile(os.path.join(self.static_folder, filename)):
+            return VENDOR_ASSETS[filename]
+        return url_for('static', filename=filename)
+
+    def serve(self, filename):
+        path = safe_join(self.dist_dir, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding = None
+        for name, ext in ENCODINGS:
+            if request.accept_encodings[name] and os.path.isfile(path + ext):
+                encoding, filename = name, filename + ext
+                break
+
+        response = send_from_directory(self.dist_dir, filename, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
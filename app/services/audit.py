@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from flask import g, request
+from flask_login import current_user
+from app.services.tenancy import current_tenant_id
+
+MUTATING_METHODS = frozenset(('POST', 'PUT', 'PATCH', 'DELETE'))
+# GET routes that change state all the same
+AUDITED_GET_ENDPOINTS = frozenset(('core.logout', 'core.select_tenant'))
+# Annotations stored in their own columns; anything else goes to detail
+COLUMNS = ('user_id', 'username', 'tenant_id', 'outcome', 'project_id', 'deployment_id')
+
+
+class AuditTrail:
+    """Who did what: one row per mutating request of the audited blueprints.
+
+    The after_request hook only appends a small dict to an in-memory ring
+    buffer (a few microseconds, no I/O). A background thread moves the buffer
+    to the append-only audit_events table (and AUDIT_LOG_FILE as JSON lines,
+    if set) every AUDIT_FLUSH_SECONDS, or sooner once AUDIT_BATCH_SIZE events
+    are waiting. When the buffer is full the oldest events are dropped and
+    counted rather than slowing requests down.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._buffer = deque()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stats = {'recorded': 0, 'flushed': 0, 'dropped': 0, 'batches': 0, 'errors': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['audit'] = self
+        self._buffer = deque(maxlen=app.config['AUDIT_BUFFER_SIZE'])
+        self._batch_size = app.config['AUDIT_BATCH_SIZE']
+        if app.config['AUDIT_ENABLED']:
+            self._blueprints = frozenset(app.config['AUDIT_BLUEPRINTS'])
+            app.after_request(self._after_request)
+            app.extensions['lifecycle'].on_shutdown(self.stop)
+
+    # --- RECORDING ---
+    @staticmethod
+    def annotate(**fields):
+        """Adds fields (project_id, deployment_id, outcome, ...) to the current request's audit event."""
+        g.audit = {**g.get('audit', {}), **fields}
+
+    def record(self, event):
+        if len(self._buffer) == self._buffer.maxlen:
+            self._stats['dropped'] += 1
+        self._buffer.append(event)
+        self._stats['recorded'] += 1
+        if len(self._buffer) >= self._batch_size and not self._wake.is_set():
+            self._wake.set()
+        if self._pid != os.getpid():
+            self.ensure_started()
+
+    def _after_request(self, response):
+        if request.blueprint not in self._blueprints or (
+                request.method not in MUTATING_METHODS and request.endpoint not in AUDITED_GET_ENDPOINTS):
+            return response
+        event = g.pop('audit', {})
+        if current_user.is_authenticated:
+            event.setdefault('user_id', current_user.id)
+            event.setdefault('username', current_user.username)
+            event.setdefault('tenant_id', current_user.tenant_id or current_tenant_id())
+        status = response.status_code
+        event.setdefault('outcome', 'ok' if status < 400 else 'denied' if status in (401, 403)
+                         else 'error' if status >= 500 else 'failed')
+        event.update(at=datetime.utcnow(), action=request.endpoint or 'unknown', method=request.method,
+                     path=request.path[:300], status_code=status, ip=request.remote_addr)
+        self.record(event)
+        return response
+
+    # --- FLUSHING ---
+    def ensure_started(self):
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._loop, name='audit-flusher', daemon=True)
+                self._thread.start()
+
+    def _take(self):
+        batch = []
+        while len(batch) < self._batch_size:
+            try:
+                batch.append(self._buffer.popleft())
+            except IndexError:
+                break
+        return batch
+
+    @staticmethod
+    def _row(event):
+        row = {key: event.get(key) for key in COLUMNS}
+        row.update({key: event[key] for key in ('at', 'action', 'method', 'path', 'status_code', 'ip')})
+        extra = {key: value for key, value in event.items() if key not in row}
+        row['detail'] = json.dumps(extra, default=str) if extra else None
+        return row
+
+    def _write(self, rows):
+        from app import db
+        from app.database.models import AuditEvent
+
+        db.session.execute(db.insert(AuditEvent), rows)
+        db.session.commit()
+        path = self.app.config.get('AUDIT_LOG_FILE')
+        if path:
+            with open(path, 'a', encoding='utf-8') as log:
+                log.writelines(json.dumps(row, default=str) + '\n' for row in rows)
+
+    def flush(self):
+        """Writes everything buffered so far; returns the number of events written."""
+        from app import db
+
+        written = 0
+        while True:
+            batch = self._take()
+            if not batch:
+                return written
+            try:
+                self._write([self._row(event) for event in batch])
+            except Exception:
+                db.session.rollback()
+                self._stats['errors'] += len(batch)
+                self.app.logger.exception("Lot d'audit de %s événements perdu", len(batch))
+                continue
+            finally:
+                db.session.remove()
+            written += len(batch)
+            self._stats['flushed'] += len(batch)
+            self._stats['batches'] += 1
+
+    def _loop(self):
+        interval = self.app.config['AUDIT_FLUSH_SECONDS']
+        with self.app.app_context():
+            while not self._stopping.is_set():
+                self._wake.wait(interval)
+                self._wake.clear()
+                self.flush()
+
+    def stats(self):
+        return {**self._stats, 'buffered': len(self._buffer)}
+
+    # --- SHUTDOWN ---
+    def stop(self, deadline=None):
+        """Lifecycle hook: writes what is still buffered before the worker exits."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stopping.set()
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+        with self.app.app_context():
+            self.flush()
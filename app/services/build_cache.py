@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from sqlalchemy import case, func, select
+
+# Bump to invalidate every entry when stage semantics change
+CACHE_VERSION = 1
+
+
+class BuildCache:
+    """Content-addressed cache of pipeline stage outputs, on local disk, bounded in size.
+
+    Two directories under BUILD_CACHE_DIR:
+      ac/<action key>  small JSON: stage, duration, log and the artifact digest
+      cas/<digest>     artifact bytes, named by their SHA-256
+
+    The action key hashes everything a stage's output depends on (stage
+    definition, project, stack, source revision and the keys of the stages it
+    needs), so a key is only ever written once with the same content and
+    entries never need invalidating. Hits touch the entry's mtime; once the
+    directory grows past BUILD_CACHE_MAX_BYTES the least recently used files
+    are removed down to 90% of the limit. Every worker process on the host
+    shares the directory: writes go through a temporary file and os.replace.
+    """
+
+    def __init__(self, app=None):
+        self.directory = None
+        self.max_bytes = 0
+        self.enabled = False
+        self.deploy_refs = ()
+        self._size = None
+        self._lock = threading.Lock()
+        self.evictions = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['build_cache'] = self
+        self.enabled = app.config['BUILD_CACHE_ENABLED']
+        self.directory = app.config.get('BUILD_CACHE_DIR') or os.path.join(app.instance_path, 'build-cache')
+        self.max_bytes = app.config['BUILD_CACHE_MAX_BYTES']
+        self.deploy_refs = app.config['WEBHOOK_DEPLOY_REFS']
+
+    # --- KEYS ---
+    def revision(self, session, deployment):
+        """Source revision a deployment builds: the commit of the push that triggered it, else the
+        latest push to a deploy branch. None when the project never received a webhook."""
+        from app.database.models import WebhookEvent
+
+        sha = session.scalar(select(WebhookEvent.commit_sha).where(WebhookEvent.deployment_id == deployment.id)
+                             .order_by(WebhookEvent.id.desc()).limit(1))
+        if sha is None:
+            sha = session.scalar(
+                select(WebhookEvent.commit_sha)
+                .where(WebhookEvent.project_id == deployment.project_id, WebhookEvent.commit_sha.is_not(None),
+                       WebhookEvent.ref.in_(self.deploy_refs))
+                .order_by(WebhookEvent.id.desc()).limit(1))
+        return sha
+
+    @staticmethod
+    def action_key(stage, scope, dependency_keys):
+        material = json.dumps([CACHE_VERSION, stage.name, stage.label, scope, sorted(dependency_keys)])
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def _path(self, kind, key):
+        return os.path.join(self.directory, kind, key[:2], key)
+
+    # --- READ / WRITE ---
+    def get(self, key):
+        path = self._path('ac', key)
+        try:
+            with open(path, encoding='utf-8') as handle:
+                entry = json.load(handle)
+            blob = self._path('cas', entry['digest'])
+            # Recency for LRU eviction; a missing artifact (evicted on its own) is a miss
+            now = time.time()
+            os.utime(blob, (now, now))
+            os.utime(path, (now, now))
+        except (OSError, ValueError, KeyError):
+            return None
+        return entry
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                handle.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        return len(data)
+
+    def put(self, key, entry, artifact):
+        digest = hashlib.sha256(artifact).hexdigest()
+        written = 0
+        blob = self._path('cas', digest)
+        if not os.path.exists(blob):
+            written += self._write(blob, artifact)
+        written += self._write(self._path('ac', key), json.dumps({**entry, 'digest': digest, 'size': len(artifact)}).encode())
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += written
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    # --- EVICTION ---
+    def _files(self):
+        for kind in ('ac', 'cas'):
+            root = os.path.join(self.directory, kind)
+            if not os.path.isdir(root):
+                continue
+            for shard in os.scandir(root):
+                if shard.is_dir():
+                    for entry in os.scandir(shard.path):
+                        if not entry.name.startswith('.tmp-'):
+                            yield entry
+
+    def _scan_size(self):
+        return sum(entry.stat().st_size for entry in self._files())
+
+    def evict(self):
+        """Removes least recently used files until the cache is back under 90% of its limit."""
+        with self._lock:
+            files = []
+            for entry in self._files():
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+            size = sum(item[1] for item in files)
+            target = self.max_bytes * 0.9
+            for _, file_size, path in sorted(files):
+                if size <= target:
+                    break
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+                size -= file_size
+                self.evictions += 1
+            self._size = size
+
+    def clear(self):
+        with self._lock:
+            removed = 0
+            for entry in list(self._files()):
+                try:
+                    os.unlink(entry.path)
+                    removed += 1
+                except OSError:
+                    pass
+            self._size = 0
+        return removed
+
+    def usage(self):
+        entries = 0
+        size = 0
+        for entry in self._files():
+            try:
+                size += entry.stat().st_size
+            except OSError:
+                continue
+            entries += entry.path.startswith(os.path.join(self.directory, 'ac'))
+        return {'directory': self.directory, 'entries': entries, 'bytes': size, 'max_bytes': self.max_bytes,
+                'evictions': self.evictions}
+
+
+# --- STATS ---
+def project_stats(session, project_id):
+    """Hit rate and pipeline time saved by the cache for one project, overall and per stage."""
+    from app.database.models import Deployment, DeploymentStage
+
+    rows = session.execute(
+        select(DeploymentStage.name,
+                  func.sum(case((DeploymentStage.cache == 'hit', 1), else_=0)),
+                  func.sum(case((DeploymentStage.cache == 'miss', 1), else_=0)),
+                  func.coalesce(func.sum(DeploymentStage.saved_ms), 0))
+        .join(Deployment, Deployment.id == DeploymentStage.deployment_id)
+        .where(Deployment.project_id == project_id, DeploymentStage.cache.is_not(None))
+        .group_by(DeploymentStage.name)
+        .order_by(DeploymentStage.name)
+    ).all()
+    by_stage = {name: _rates(hits, misses, saved) for name, hits, misses, saved in rows}
+    total = _rates(sum(row[1] for row in rows), sum(row[2] for row in rows), sum(row[3] for row in rows))
+    return {**total, 'by_stage': by_stage}
+
+
+def _rates(hits, misses, saved_ms):
+    lookups = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': round(hits / lookups, 3) if lookups else None,
+            'saved_ms': int(saved_ms)}
@@ -0,0 +1,229 @@
+from datetime import datetime
+from app import db, cache
+from app.database.models import Project, Deployment, DeploymentArchive, Tenant
+from app.services.events import deployment_event, project_event
+from app.services.pipeline import ACTIVE_STATUSES, FINAL_STATUSES, PROJECT_STATUS
+from app.services.tenancy import slugify
+
+# Project status left by the latest finished deployment
+PROJECT_STATUS_AFTER = {**PROJECT_STATUS, 'Stopped': 'Stopped'}
+
+
+# --- FILTERS ---
+def tenant_subquery(client):
+    """Id of the tenant a client name resolves to (same slug rule as the project's tenant)."""
+    return db.select(Tenant.id).where(Tenant.slug == slugify(client)).scalar_subquery()
+
+
+def deployment_filters(project_ids=(), client=None, statuses=(), before=None, after=None, triggered_by=None):
+    criteria = []
+    if project_ids:
+        criteria.append(Deployment.project_id.in_(project_ids))
+    if client:
+        criteria.append(Deployment.tenant_id == tenant_subquery(client))
+    if statuses:
+        criteria.append(Deployment.status.in_(statuses))
+    if before:
+        criteria.append(Deployment.timestamp < before)
+    if after:
+        criteria.append(Deployment.timestamp >= after)
+    if triggered_by:
+        criteria.append(Deployment.triggered_by == triggered_by)
+    return criteria
+
+
+def project_filters(project_ids=(), client=None):
+    criteria = []
+    if project_ids:
+        criteria.append(Project.id.in_(project_ids))
+    if client:
+        # client_name is only a display name: 'Acme' must match the projects created as 'ACME'
+        criteria.append(Project.tenant_id == tenant_subquery(client))
+    return criteria
+
+
+def count(model, criteria):
+    return db.session.scalar(db.select(db.func.count()).select_from(model).where(*criteria))
+
+
+def keyset(columns, criteria, batch_size):
+    """Yields lists of at most batch_size rows in primary key order, one short query per batch.
+
+    Each batch restarts from the last key seen, so the caller can update or
+    delete the rows and commit between batches: no cursor stays open across
+    a commit, and memory holds one batch whatever the table size.
+    """
+    key = columns[0]
+    last = None
+    while True:
+        query = db.select(*columns).where(*criteria).order_by(key).limit(batch_size)
+        if last is not None:
+            query = query.where(key > last)
+        rows = db.session.execute(query).all()
+        db.session.rollback()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        last = rows[-1][0]
+
+
+def _deployment_events(rows, status):
+    # One event per project and batch (keyed by its newest row): caches and dashboards only need the project
+    latest = {}
+    for deployment_id, project_id, tenant_id in rows:
+        latest[project_id] = (deployment_id, tenant_id)
+    for project_id, (deployment_id, tenant_id) in latest.items():
+        db.session.execute(deployment_event(deployment_id, project_id, tenant_id, status, bulk=True))
+    return latest
+
+
+def _finish_batch(project_ids):
+    db.session.commit()
+    cache.invalidate_tags('projects', *(f'project:{project_id}' for project_id in project_ids))
+
+
+# --- DEPLOYMENTS ---
+def delete_deployments(criteria, batch_size=1000, dry_run=False, progress=None):
+    """Deletes matching deployments (never queued or running ones), batch_size rows per transaction."""
+    criteria = [*criteria, Deployment.status.not_in(ACTIVE_STATUSES)]
+    stats = {'matched': count(Deployment, criteria), 'done': 0, 'batches': 0}
+    if dry_run:
+        return stats
+    columns = (Deployment.id, Deployment.project_id, Deployment.tenant_id)
+    for rows in keyset(columns, criteria, batch_size):
+        ids = [row[0] for row in rows]
+        # deployment_stages go with them (ON DELETE CASCADE), webhook events keep a NULL reference
+        db.session.execute(db.delete(Deployment).where(Deployment.id.in_(ids)).execution_options(synchronize_session=False))
+        _finish_batch(_deployment_events(rows, 'Deleted'))
+        stats['done'] += len(ids)
+        stats['batches'] += 1
+        if progress:
+            progress(stats)
+    return stats
+
+
+def mark_status(criteria, status, batch_size=1000, dry_run=False, progress=None):
+    """Sets a final status on matching deployments, e.g. ones left Running by a lost runner.
+
+    A runner still executing one of them finds the status changed and drops
+    its result, as it does for a stop from the UI.
+    """
+    if status not in FINAL_STATUSES:
+        raise ValueError(f'status must be one of {FINAL_STATUSES}')
+    criteria = [*criteria, Deployment.status != status]
+    stats = {'matched': count(Deployment, criteria), 'done': 0, 'batches': 0}
+    if dry_run:
+        return stats
+    columns = (Deployment.id, Deployment.project_id, Deployment.tenant_id)
+    now = datetime.utcnow()
+    for rows in keyset(columns, criteria, batch_size):
+        ids = [row[0] for row in rows]
+        db.session.execute(
+            db.update(Deployment)
+            .where(Deployment.id.in_(ids), Deployment.status != status)
+            .values(status=status, ended_at=db.func.coalesce(Deployment.ended_at, now))
+            .execution_options(synchronize_session=False)
+        )
+        _finish_batch(_deployment_events(rows, status))
+        stats['done'] += len(ids)
+        stats['batches'] += 1
+        if progress:
+            progress(stats)
+    return stats
+
+
+# --- PROJECTS ---
+def _tenant_for(client):
+    slug = slugify(client)
+    tenant = db.session.scalars(db.select(Tenant).where(Tenant.slug == slug)).first()
+    if tenant is None:
+        tenant = Tenant(slug=slug, name=client)
+        db.session.add(tenant)
+        db.session.commit()
+    return tenant.id
+
+
+def reassign_projects(criteria, client, batch_size=1000, dry_run=False, progress=None):
+    """Moves matching projects, their deployments and archived history to another client (tenant)."""
+    target = tenant_subquery(client)
+    criteria = [*criteria, db.or_(Project.tenant_id != target, target.is_(None))]
+    stats = {'matched': count(Project, criteria), 'done': 0, 'batches': 0, 'deployments': 0}
+    if dry_run:
+        return stats
+    tenant_id = _tenant_for(client)
+    columns = (Project.id, Project.status, Project.last_deploy)
+    for rows in keyset(columns, criteria, batch_size):
+        ids = [row[0] for row in rows]
+        # History first: a project never sits in its new tenant with rows still in the old one
+        for model in (Deployment, DeploymentArchive):
+            for history in keyset((model.id,), [model.project_id.in_(ids), model.tenant_id != tenant_id], batch_size):
+                values = {'tenant_id': tenant_id}
+                if model is DeploymentArchive:
+                    values['client_name'] = client
+                db.session.execute(db.update(model).where(model.id.in_([row[0] for row in history])).values(**values)
+                                   .execution_options(synchronize_session=False))
+                db.session.commit()
+                if model is Deployment:
+                    stats['deployments'] += len(history)
+        db.session.execute(db.update(Project).where(Project.id.in_(ids)).values(tenant_id=tenant_id, client_name=client)
+                           .execution_options(synchronize_session=False))
+        for project_id, status, last_deploy in rows:
+            db.session.execute(project_event(project_id, tenant_id, status, last_deploy))
+        _finish_batch(ids)
+        cache.invalidate_tags('tenants')
+        stats['done'] += len(ids)
+        stats['batches'] += 1
+        if progress:
+            progress(stats)
+    return stats
+
+
+def recompute_counters(batch_size=1000, dry_run=False, progress=None):
+    """Re-derives each project's status and last_deploy from its deployments; only differing rows are written.
+
+    The per-project aggregates are streamed (yield_per) on their own
+    connection while the fixes are committed in batches on the session's.
+    """
+    latest = (db.select(Deployment.project_id, db.func.max(Deployment.id).label('deployment_id'))
+              .where(Deployment.status.in_(FINAL_STATUSES)).group_by(Deployment.project_id).subquery())
+    succeeded = (db.select(Deployment.project_id, db.func.max(Deployment.ended_at).label('ended_at'))
+                 .where(Deployment.status == 'Success').group_by(Deployment.project_id).subquery())
+    query = (
+        db.select(Project.id, Project.tenant_id, Project.status, Project.last_deploy, Deployment.status,
+                  succeeded.c.ended_at)
+        .join(latest, latest.c.project_id == Project.id)
+        .join(Deployment, Deployment.id == latest.c.deployment_id)
+        .outerjoin(succeeded, succeeded.c.project_id == Project.id)
+        .order_by(Project.id)
+    )
+    stats = {'matched': count(Project, []), 'done': 0, 'changed': 0, 'batches': 0}
+    pending = []
+
+    def flush():
+        if not dry_run:
+            db.session.execute(db.update(Project), [{'id': row[0], 'status': row[2], 'last_deploy': row[3]} for row in pending])
+            for project_id, tenant_id, status, last_deploy in pending:
+                db.session.execute(project_event(project_id, tenant_id, status, last_deploy))
+            _finish_batch([row[0] for row in pending])
+        stats['changed'] += len(pending)
+        stats['batches'] += 1
+        pending.clear()
+
+    with db.engine.connect() as reader:
+        rows = reader.execution_options(yield_per=batch_size).execute(query)
+        for project_id, tenant_id, status, last_deploy, deployment_status, success_at in rows:
+            stats['done'] += 1
+            expected = (PROJECT_STATUS_AFTER[deployment_status], success_at or last_deploy)
+            if expected != (status, last_deploy):
+                pending.append((project_id, tenant_id, *expected))
+            if len(pending) >= batch_size:
+                flush()
+            if progress and stats['done'] % batch_size == 0:
+                progress(stats)
+        if pending:
+            flush()
+    if progress:
+        progress(stats)
+    return stats
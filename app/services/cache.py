@@ -0,0 +1,332 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+# --- BACKENDS ---
+class NullBackend:
+    def get(self, key):
+        return _MISSING
+
+    def get_many(self, keys):
+        return [_MISSING] * len(keys)
+
+    def set(self, key, value, timeout):
+        pass
+
+    def add(self, key, value, timeout):
+        return True
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryBackend:
+    """In-process LRU, one instance per worker."""
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key, now):
+        item = self._data.get(key)
+        if item is None:
+            return _MISSING
+        expires, value = item
+        if expires and expires <= now:
+            del self._data[key]
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key, time.monotonic())
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            return [self._get(key, now) for key in keys]
+
+    def _set(self, key, value, timeout):
+        expires = time.monotonic() + timeout if timeout else 0
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._set(key, value, timeout)
+
+    def add(self, key, value, timeout):
+        with self._lock:
+            if self._get(key, time.monotonic()) is not _MISSING:
+                return False
+            self._set(key, value, timeout)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class FileSystemBackend:
+    """Disk cache shared by every worker process on the same host."""
+
+    def __init__(self, directory, max_entries=2048):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return _MISSING
+        if expires and expires <= time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return _MISSING
+        return value
+
+    def get(self, key):
+        return self._read(self._path(key))
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def _payload(self, value, timeout):
+        expires = time.time() + timeout if timeout else 0
+        return pickle.dumps((expires, value), pickle.HIGHEST_PROTOCOL)
+
+    def set(self, key, value, timeout):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self._payload(value, timeout))
+        os.replace(tmp, self._path(key))
+        self._writes += 1
+        if self._writes % 256 == 0:
+            self._prune()
+
+    def add(self, key, value, timeout):
+        path = self._path(key)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+            except FileExistsError:
+                # An expired entry still occupies the slot: drop it and retry once
+                if self._read(path) is not _MISSING:
+                    return False
+                continue
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self._payload(value, timeout))
+            return True
+        return False
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _entries(self):
+        return [e for e in os.scandir(self.directory) if e.is_file() and not e.name.startswith('.tmp')]
+
+    def _prune(self):
+        entries = self._entries()
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def clear(self):
+        for entry in self._entries():
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+class RedisBackend:
+    """Any Redis-protocol server; ``fakeredis://`` gives an in-process stand-in."""
+
+    def __init__(self, url, prefix=''):
+        if url.startswith('fakeredis://'):
+            import fakeredis
+            self.client = fakeredis.FakeStrictRedis()
+        else:
+            import redis
+            self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _load(self, raw):
+        return _MISSING if raw is None else pickle.loads(raw)
+
+    def get(self, key):
+        return self._load(self.client.get(key))
+
+    def get_many(self, keys):
+        if not keys:
+            return []
+        return [self._load(raw) for raw in self.client.mget(keys)]
+
+    def set(self, key, value, timeout):
+        self.client.set(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), px=int(timeout * 1000) if timeout else None)
+
+    def add(self, key, value, timeout):
+        return bool(self.client.set(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), nx=True,
+                                    px=int(timeout * 1000) if timeout else None))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+# --- CACHE API ---
+class Cache:
+    """Application cache with TTLs, tag invalidation and stampede protection.
+
+    Entries remember the version of each tag they were stored under;
+    ``invalidate_tags`` bumps those versions so stale entries miss on the
+    next read without having to enumerate keys.
+    """
+
+    def __init__(self, app=None):
+        self.backend = NullBackend()
+        self.prefix = ''
+        self.default_timeout = 300
+        self.lock_timeout = 5
+        self._locks = [threading.Lock() for _ in range(64)]
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        cache_type = app.config.get('CACHE_TYPE', 'memory')
+        max_entries = app.config.get('CACHE_MAX_ENTRIES', 2048)
+        self.prefix = app.config.get('CACHE_KEY_PREFIX', 'devops:')
+        self.default_timeout = app.config.get('CACHE_DEFAULT_TIMEOUT', 300)
+        self.lock_timeout = app.config.get('CACHE_LOCK_TIMEOUT', 5)
+
+        if cache_type == 'memory':
+            self.backend = MemoryBackend(max_entries)
+        elif cache_type == 'filesystem':
+            directory = app.config.get('CACHE_DIR') or os.path.join(app.instance_path, 'cache')
+            self.backend = FileSystemBackend(directory, max_entries)
+        elif cache_type == 'redis':
+            self.backend = RedisBackend(app.config['CACHE_REDIS_URL'], self.prefix)
+        elif cache_type == 'null':
+            self.backend = NullBackend()
+        else:
+            raise ValueError(f'Unknown CACHE_TYPE: {cache_type}')
+
+        app.extensions['cache'] = self
+
+    @property
+    def shared(self):
+        """Whether every worker process sees the same entries (filesystem, redis)."""
+        return not isinstance(self.backend, (MemoryBackend, NullBackend))
+
+    def _key(self, key):
+        return self.prefix + key
+
+    def _tag_versions(self, tags):
+        if not tags:
+            return {}
+        keys = [self._key('tag:' + tag) for tag in tags]
+        versions = self.backend.get_many(keys)
+        for i, version in enumerate(versions):
+            if version is _MISSING:
+                # A fresh, unique version: entries written under a forgotten one can never match it
+                self.backend.add(keys[i], time.time_ns(), 0)
+                versions[i] = self.backend.get(keys[i])
+        return dict(zip(tags, versions))
+
+    def _lookup(self, key):
+        entry = self.backend.get(self._key(key))
+        if entry is _MISSING:
+            return _MISSING
+        value, tags = entry
+        if tags and self._tag_versions(list(tags)) != tags:
+            return _MISSING
+        return value
+
+    def get(self, key, default=None):
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def _store(self, key, value, timeout, versions):
+        timeout = self.default_timeout if timeout is None else timeout
+        self.backend.set(self._key(key), (value, versions), timeout)
+
+    def set(self, key, value, timeout=None, tags=()):
+        self._store(key, value, timeout, self._tag_versions(list(tags)))
+
+    def delete(self, key):
+        self.backend.delete(self._key(key))
+
+    def invalidate_tags(self, *tags):
+        for tag in tags:
+            self.backend.set(self._key('tag:' + tag), time.time_ns(), 0)
+
+    def clear(self):
+        self.backend.clear()
+
+    def get_or_set(self, key, creator, timeout=None, tags=()):
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+
+        # Only one thread per process, and one process per backend, recomputes a missing key
+        with self._locks[hash(key) % len(self._locks)]:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                return value
+
+            lock_key = self._key('lock:' + key)
+            acquired = self.backend.add(lock_key, os.getpid(), self.lock_timeout)
+            if not acquired:
+                deadline = time.monotonic() + self.lock_timeout
+                while time.monotonic() < deadline:
+                    time.sleep(0.01)
+                    value = self._lookup(key)
+                    if value is not _MISSING:
+                        return value
+            try:
+                # Versions read before computing: an invalidation while creator() runs leaves the entry stale
+                versions = self._tag_versions(list(tags))
+                value = creator()
+                self._store(key, value, timeout, versions)
+            finally:
+                if acquired:
+                    self.backend.delete(lock_key)
+            return value
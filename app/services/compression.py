@@ -0,0 +1,151 @@
+import time
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# --- COMPRESSORS ---
+# Each one exposes compress(chunk), flush() and finish() so buffered and
+# streamed responses share the same code path.
+class GzipCompressor:
+    def __init__(self, level):
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._obj.compress(data)
+
+    def flush(self):
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._obj.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    def __init__(self, level):
+        self._obj = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._obj.process(data)
+
+    def flush(self):
+        return self._obj.flush()
+
+    def finish(self):
+        return self._obj.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, level):
+        self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._obj.compress(data)
+
+    def flush(self):
+        return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._obj.flush()
+
+
+def available_encodings():
+    encodings = {'gzip': GzipCompressor}
+    if brotli is not None:
+        encodings['br'] = BrotliCompressor
+    if zstandard is not None:
+        encodings['zstd'] = ZstdCompressor
+    return encodings
+
+
+# --- MIDDLEWARE ---
+class Compress:
+    """Negotiated response compression (Accept-Encoding) as an after_request hook."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get('COMPRESS_ENABLED', True)
+        self.min_size = config.get('COMPRESS_MIN_SIZE', 500)
+        self.mimetypes = set(config.get('COMPRESS_MIMETYPES', ()))
+        self.levels = config.get('COMPRESS_LEVELS', {'br': 4, 'zstd': 3, 'gzip': 6})
+        supported = available_encodings()
+        # Server preference order, used to break ties between equally weighted client encodings
+        self.compressors = {name: supported[name] for name in config.get('COMPRESS_ALGORITHMS', ('br', 'zstd', 'gzip'))
+                            if name in supported}
+
+        app.after_request(self.after_request)
+        app.extensions['compress'] = self
+
+    def _choose(self):
+        accept = request.accept_encodings
+        best, quality = None, 0
+        for name in self.compressors:
+            q = accept[name]
+            if q > quality:
+                best, quality = name, q
+        return best
+
+    def after_request(self, response):
+        if not self.enabled or response.mimetype not in self.mimetypes:
+            return response
+        if response.mimetype == 'text/event-stream':
+            # SSE must reach the browser event by event, never through a buffer
+            return response
+        response.vary.add('Accept-Encoding')
+        if (request.method == 'HEAD'
+                or response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers
+                or response.direct_passthrough):
+            return response
+
+        encoding = self._choose()
+        if encoding is None:
+            return response
+        compressor = self.compressors[encoding](self.levels.get(encoding, 6))
+
+        if response.is_streamed:
+            response.response = self._stream(response.response, compressor)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            started = time.perf_counter()
+            response.set_data(compressor.compress(data) + compressor.finish())
+            elapsed = (time.perf_counter() - started) * 1000
+            response.headers.add('Server-Timing', f'compress;dur={elapsed:.2f}')
+
+        response.headers['Content-Encoding'] = encoding
+        if response.headers.get('ETag'):
+            # The representation changed, so a strong validator no longer applies
+            etag, weak = response.get_etag()
+            response.set_etag(etag, weak=True)
+        return response
+
+    @staticmethod
+    def _stream(chunks, compressor):
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                data = compressor.compress(chunk) + compressor.flush()
+                if data:
+                    yield data
+            yield compressor.finish()
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
@@ -0,0 +1,251 @@
+from datetime import datetime
+from flask import current_app
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from app import db, cache
+from app.database.models import Deployment, DeploymentStage, Project
+from app.services.pipeline import stage_rows, PROJECT_STATUS, ACTIVE_STATUSES, PRIORITIES, DEFAULT_PRIORITY
+from app.services import rollups, sketches
+from app.services.events import deployment_event, project_event
+from app.services.logtail import log_append
+
+
+COALESCE_POLICIES = ('join', 'supersede')
+
+
+class IdempotencyConflict(Exception):
+    pass
+
+
+def _new_deployment(project, user_id, triggered_by, stack, priority, idempotency_key, queued_at=None):
+    # started_at stays NULL until a runner claims it (a plain None would fall back to the column default)
+    return Deployment(tenant_id=project.tenant_id, project_id=project.id, user_id=user_id, status='Queued', triggered_by=triggered_by,
+                      stack=stack, priority=priority, queued_at=queued_at or datetime.utcnow(), started_at=db.null(),
+                      idempotency_key=idempotency_key, log_content='')
+
+
+def request_deployment(session, project, user_id, triggered_by, stack=None, policy='join', idempotency_key=None,
+                       priority=PRIORITIES[DEFAULT_PRIORITY]):
+    """Queues a deployment unless the same trigger is already queued or running.
+
+    Returns (deployment, outcome) with outcome one of:
+      'replayed'   - the Idempotency-Key was already used: the original deployment
+      'joined'     - an equivalent deployment is queued or running (policy 'join')
+      'superseded' - the queued equivalent was stopped and replaced (policy 'supersede')
+      'queued'     - a new deployment was added to the queue
+
+    Takes the session explicitly so the async API tier can call it via run_sync.
+    The caller commits. A partial unique index allows one queued deployment per
+    project and stack, so two concurrent triggers cannot both queue: the loser
+    gets an IntegrityError and joins the winner on the next attempt.
+    """
+    stack = stack or project.stack
+    for attempt in range(3):
+        if idempotency_key:
+            previous = session.scalars(
+                db.select(Deployment).where(Deployment.user_id == user_id, Deployment.idempotency_key == idempotency_key)
+            ).first()
+            if previous is not None:
+                if previous.project_id != project.id:
+                    raise IdempotencyConflict(idempotency_key)
+                return previous, 'replayed'
+
+        active = session.scalars(
+            db.select(Deployment)
+            .where(Deployment.project_id == project.id, Deployment.stack == stack, Deployment.status.in_(ACTIVE_STATUSES))
+            .order_by(Deployment.id)
+        ).all()
+        queued = [deployment for deployment in active if deployment.status == 'Queued']
+        if active and (policy == 'join' or not queued):
+            # Nothing queued to replace: a running equivalent is joined under either policy
+            joined = (queued or active)[-1]
+            if joined.status == 'Queued' and priority < joined.priority:
+                # A hotfix trigger promotes the queued run it joins
+                joined.priority = priority
+            return joined, 'joined'
+
+        # The replacement keeps the oldest superseded position in the queue
+        deployment = _new_deployment(project, user_id, triggered_by, stack,
+                                     min([priority, *(old.priority for old in queued)]), idempotency_key,
+                                     min((old.queued_at for old in queued), default=None))
+        try:
+            now = datetime.utcnow()
+            for old in queued:
+                old.status = 'Stopped'
+                old.ended_at = now
+            session.flush()
+            session.add(deployment)
+            session.flush()
+        except IntegrityError:
+            session.rollback()
+            continue
+        dialect = session.get_bind().dialect.name
+        session.execute(deployment_event(deployment.id, project.id, project.tenant_id, 'Queued',
+                                         priority=deployment.priority, queued_at=deployment.queued_at))
+        for old in queued:
+            old.log_content = f'[WARN] Remplacé par le déploiement #{deployment.id} ({triggered_by})'
+            for stmt in rollups.rollup_statements(dialect, project.id, project.client_name, 'Stopped', now):
+                session.execute(stmt)
+            session.execute(deployment_event(old.id, project.id, project.tenant_id, 'Stopped', ended_at=now))
+        return deployment, 'superseded' if queued else 'queued'
+    raise RuntimeError(f'Could not queue a deployment for project {project.id}')
+
+
+def queue_position(session, deployment):
+    if deployment.status != 'Queued':
+        return None
+    return session.scalar(
+        db.select(db.func.count()).select_from(Deployment)
+        .where(Deployment.status == 'Queued', Deployment.queued_at <= deployment.queued_at)
+    )
+
+
+def invalidate(project_id, durations=False):
+    cache.invalidate_tags('projects', f'project:{project_id}', *(('durations',) if durations else ()))
+
+
+def invalidate_events(events):
+    """Event bus subscriber: drops this process's cached pages for changes made by any process.
+
+    Writers invalidate right after committing, which only reaches their own
+    memory cache; this covers the other workers and the runner processes.
+    """
+    # A running deployment's log grew: no cached page shows it
+    events = [item for item in events if not item.get('log')]
+    if not events:
+        return
+    tags = {'projects'}
+    for item in events:
+        project_id = item['key'] if item['topic'] == 'project' else item['project_id']
+        tags.add(f'project:{project_id}')
+        if item['status'] in ('Success', 'Failed'):
+            tags.add('durations')
+    cache.invalidate_tags(*tags)
+    # Slot usage moved
+    cache.delete('runners:stats')
+
+
+class LogWriter:
+    """Appends a running deployment's log part by part (the on_log of run_pipeline).
+
+    Each part is its own short transaction with a 'deployment' outbox event, so
+    log readers waiting on the deployment get the new bytes while it runs. Parts
+    that could not be written (the runner no longer owns the deployment, or the
+    database was busy) stay pending: complete() writes them with the result.
+    """
+
+    def __init__(self, deployment_id, runner_id, project_id, tenant_id):
+        self.deployment_id = deployment_id
+        self.runner_id = runner_id
+        self.project_id = project_id
+        self.tenant_id = tenant_id
+        self.pending = []
+
+    def __call__(self, lines):
+        self.pending.extend(line for line in lines if line)
+        if not self.pending:
+            return
+        try:
+            owned = db.session.execute(
+                db.update(Deployment)
+                .where(Deployment.id == self.deployment_id, Deployment.status == 'Running',
+                       Deployment.runner_id == self.runner_id)
+                .values(log_content=log_append('\n'.join(self.pending)))
+                .execution_options(synchronize_session=False)
+            ).rowcount == 1
+            if owned:
+                db.session.execute(deployment_event(self.deployment_id, self.project_id, self.tenant_id, 'Running',
+                                                    log=True))
+                db.session.commit()
+                self.pending = []
+            else:
+                db.session.rollback()
+        except SQLAlchemyError:
+            db.session.rollback()
+            current_app.logger.warning('Journal du déploiement %s différé', self.deployment_id, exc_info=True)
+        finally:
+            # No transaction stays open while the pipeline runs
+            db.session.close()
+
+
+def complete(deployment_id, runner_id, result, log=None):
+    """Records a pipeline result for a deployment this runner still owns.
+
+    The status moves Running -> final with a conditional UPDATE, so a deployment
+    stopped or re-queued meanwhile is left alone. Returns False in that case.
+    With the LogWriter that streamed the run, only its pending lines and the
+    result's summary are appended; otherwise the whole log is.
+    """
+    ended_at = datetime.utcnow()
+    deployment = db.session.get(Deployment, deployment_id)
+    log_text = '\n'.join([*log.pending, *result.summary] if log else [result.log_text])
+    if result.status == 'Stopped':
+        return _record_stopped(deployment, runner_id, result, log_text)
+    duration = rollups.duration_ms(deployment.started_at, ended_at)
+    owned = db.session.execute(
+        db.update(Deployment)
+        .where(Deployment.id == deployment_id, Deployment.status == 'Running', Deployment.runner_id == runner_id)
+        .values(status=result.status, log_content=log_append(log_text), ended_at=ended_at, duration_ms=duration)
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+    if not owned:
+        db.session.rollback()
+        return False
+
+    db.session.refresh(deployment)
+    project = db.session.get(Project, deployment.project_id)
+    project.status = PROJECT_STATUS[result.status]
+    if result.status == 'Success':
+        project.last_deploy = ended_at
+    db.session.execute(db.insert(DeploymentStage), stage_rows(deployment_id, result))
+    rollups.record_deployment(deployment, project.client_name)
+    sketches.record_duration(db.session, project.id, deployment.stack or project.stack, duration, project.tenant_id)
+    db.session.execute(deployment_event(deployment_id, project.id, project.tenant_id, result.status,
+                                        ended_at=ended_at, duration_ms=duration))
+    db.session.execute(project_event(project.id, project.tenant_id, project.status, project.last_deploy))
+    db.session.commit()
+    invalidate(project.id, durations=True)
+    return True
+
+
+def _record_stopped(deployment, runner_id, result, log_text):
+    # The stop request already wrote the status, end time and rollups: keep the partial run's log and stages.
+    # Appended after the stop notice: log readers hold byte offsets, so the log only ever grows
+    stopped = db.session.execute(
+        db.update(Deployment)
+        .where(Deployment.id == deployment.id, Deployment.status == 'Stopped', Deployment.runner_id == runner_id)
+        .values(log_content=log_append(log_text))
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+    if not stopped:
+        # Pre-empted: the deployment is back in the queue and will run again from scratch
+        db.session.rollback()
+        return False
+    db.session.execute(db.insert(DeploymentStage), stage_rows(deployment.id, result))
+    db.session.execute(deployment_event(deployment.id, deployment.project_id, deployment.tenant_id, 'Stopped'))
+    db.session.commit()
+    invalidate(deployment.project_id)
+    return True
+
+
+def abort(deployment_id, runner_id, message):
+    """Marks a deployment Failed when its runner crashed outside the pipeline itself."""
+    ended_at = datetime.utcnow()
+    deployment = db.session.get(Deployment, deployment_id)
+    owned = db.session.execute(
+        db.update(Deployment)
+        .where(Deployment.id == deployment_id, Deployment.status == 'Running', Deployment.runner_id == runner_id)
+        .values(status='Failed', log_content=log_append(f'[FATAL] {message}'), ended_at=ended_at,
+                duration_ms=rollups.duration_ms(deployment.started_at, ended_at))
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+    if not owned:
+        db.session.rollback()
+        return
+    db.session.refresh(deployment)
+    project = db.session.get(Project, deployment.project_id)
+    project.status = 'Error'
+    rollups.record_deployment(deployment, project.client_name)
+    db.session.execute(deployment_event(deployment_id, project.id, project.tenant_id, 'Failed', ended_at=ended_at))
+    db.session.execute(project_event(project.id, project.tenant_id, project.status, project.last_deploy))
+    db.session.commit()
+    invalidate(project.id)
@@ -0,0 +1,233 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+# Set when a transaction that wrote outbox rows commits in this process: the dispatcher runs right away
+_committed = threading.Event()
+
+
+# --- OUTBOX ---
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def event_statement(topic, key, tenant_id=None, **data):
+    """Insert of one outbox row, executed by the caller inside the transaction making the change.
+
+    Returned as a statement (like the rollup upserts) so both the Flask session
+    and the async API tier can run it.
+    """
+    from app.database.models import OutboxEvent
+
+    return insert(OutboxEvent).values(topic=topic, key=key, tenant_id=tenant_id, created_at=datetime.utcnow(),
+                                      payload=json.dumps(data, default=_json_default))
+
+
+def deployment_event(deployment_id, project_id, tenant_id, status, **data):
+    return event_statement('deployment', deployment_id, tenant_id, project_id=project_id, status=status, **data)
+
+
+def project_event(project_id, tenant_id, status, last_deploy=None):
+    return event_statement('project', project_id, tenant_id, status=status, last_deploy=last_deploy)
+
+
+def user_event(user_id, tenant_id):
+    return event_statement('user', user_id, tenant_id)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _track_outbox_writes(execute_state):
+    if execute_state.is_insert and execute_state.statement.table.name == 'outbox_events':
+        execute_state.session.info['outbox'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_dispatcher(session):
+    if session.info.pop('outbox', False):
+        _committed.set()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_outbox_writes(session):
+    session.info.pop('outbox', None)
+
+
+# --- DISPATCH ---
+class EventBus:
+    """Fans outbox rows out to in-process subscribers (cache invalidation, live pushes, stats).
+
+    Each process runs one dispatcher thread that reads the outbox in id order,
+    in batches of OUTBOX_BATCH_SIZE, and hands every subscriber the events of
+    its topics as one list. Commits made in this process wake it at once;
+    other processes' commits are picked up within OUTBOX_POLL_SECONDS.
+    Delivery is at least once: a subscriber that raises gets the same events
+    again on the next round, up to OUTBOX_MAX_ATTEMPTS times. The dispatcher
+    starts at the newest row, so subscribers only see changes made after
+    their process started.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._cursor = 0
+        self._gaps = {}
+        self._stats = {'dispatched': 0, 'batches': 0, 'failures': 0, 'dropped': 0, 'lag_ms': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['events'] = self
+        app.extensions['lifecycle'].on_shutdown(self.stop)
+        if app.config.get('OUTBOX_DISPATCH'):
+            # Like the runners: started in the serving process on its first request
+            app.before_request(self.ensure_started)
+
+    def subscribe(self, topics, fn):
+        """Calls fn(events) with each batch of events whose topic is in topics."""
+        with self._lock:
+            self._subscribers.append({'fn': fn, 'topics': frozenset(topics), 'backlog': [], 'attempts': 0})
+        return fn
+
+    @property
+    def started(self):
+        return self._thread is not None and self._pid == os.getpid()
+
+    def ensure_started(self):
+        if not self.started:
+            with self._lock:
+                if not self.started:
+                    self.start()
+
+    def start(self):
+        from app import db
+        from app.database.models import OutboxEvent
+
+        with self.app.app_context():
+            self._cursor = db.session.scalar(db.select(db.func.max(OutboxEvent.id))) or 0
+            db.session.remove()
+        self._pid = os.getpid()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._loop, name='outbox-dispatcher', daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        _committed.set()
+
+    # --- READING ---
+    def _ready(self, rows):
+        """The rows that can be delivered now, in order.
+
+        Ids are allocated before commit, so on PostgreSQL a lower id may become
+        visible after a higher one. Delivery stops at a gap until it fills or is
+        older than OUTBOX_GAP_SECONDS (a rolled back transaction).
+        """
+        ready = []
+        expected = self._cursor + 1
+        now = time.monotonic()
+        for row in rows:
+            if row.id != expected:
+                first_seen = self._gaps.setdefault(expected, now)
+                if now - first_seen < self.app.config['OUTBOX_GAP_SECONDS']:
+                    break
+            ready.append(row)
+            expected = row.id + 1
+        self._gaps = {gap: seen for gap, seen in self._gaps.items() if gap >= expected}
+        return ready
+
+    def _fetch(self):
+        from app import db
+        from app.database.models import OutboxEvent
+
+        rows = db.session.execute(
+            db.select(OutboxEvent.id, OutboxEvent.topic, OutboxEvent.key, OutboxEvent.tenant_id,
+                      OutboxEvent.payload, OutboxEvent.created_at)
+            .where(OutboxEvent.id > self._cursor)
+            .order_by(OutboxEvent.id)
+            .limit(self.app.config['OUTBOX_BATCH_SIZE'])
+        ).all()
+        db.session.rollback()
+        return [{'id': row.id, 'topic': row.topic, 'key': row.key, 'tenant_id': row.tenant_id,
+                 'created_at': row.created_at, **json.loads(row.payload)} for row in self._ready(rows)]
+
+    def _deliver(self, events):
+        max_attempts = self.app.config['OUTBOX_MAX_ATTEMPTS']
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            batch = subscriber['backlog'] + [item for item in events if item['topic'] in subscriber['topics']]
+            if not batch:
+                continue
+            try:
+                subscriber['fn'](batch)
+            except Exception:
+                subscriber['attempts'] += 1
+                self._stats['failures'] += 1
+                if subscriber['attempts'] < max_attempts:
+                    subscriber['backlog'] = batch
+                    continue
+                self._stats['dropped'] += len(batch)
+                self.app.logger.exception('Abonné %s: %s événements abandonnés', subscriber['fn'].__name__, len(batch))
+            subscriber['backlog'], subscriber['attempts'] = [], 0
+
+    def _prune(self):
+        from app import db
+        from app.database.models import OutboxEvent
+
+        cutoff = datetime.utcnow() - timedelta(seconds=self.app.config['OUTBOX_RETENTION_SECONDS'])
+        db.session.execute(db.delete(OutboxEvent).where(OutboxEvent.created_at < cutoff))
+        db.session.commit()
+
+    def _loop(self):
+        from app import db
+
+        config = self.app.config
+        next_prune = time.monotonic() + config['OUTBOX_PRUNE_SECONDS']
+        with self.app.app_context():
+            while not self._stopping.is_set():
+                _committed.wait(config['OUTBOX_POLL_SECONDS'])
+                _committed.clear()
+                try:
+                    while True:
+                        events = self._fetch()
+                        if events:
+                            self._cursor = events[-1]['id']
+                            self._stats['lag_ms'] = int((datetime.utcnow() - events[-1]['created_at']).total_seconds() * 1000)
+                            self._stats['dispatched'] += len(events)
+                            self._stats['batches'] += 1
+                        # Also retries backlogs of failed subscribers when nothing new arrived
+                        self._deliver(events)
+                        if len(events) < config['OUTBOX_BATCH_SIZE']:
+                            break
+                    if time.monotonic() >= next_prune:
+                        self._prune()
+                        next_prune = time.monotonic() + config['OUTBOX_PRUNE_SECONDS']
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception('Répartiteur des événements')
+                finally:
+                    db.session.remove()
+
+    def stats(self):
+        with self._lock:
+            backlog = sum(len(subscriber['backlog']) for subscriber in self._subscribers)
+            return {**self._stats, 'cursor': self._cursor, 'subscribers': len(self._subscribers), 'backlog': backlog}
+
+    # --- SHUTDOWN ---
+    def stop(self, deadline=None):
+        if not self.started:
+            return
+        self._stopping.set()
+        _committed.set()
+        self._thread.join(timeout=5)
+        self._thread = None
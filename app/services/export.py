@@ -0,0 +1,122 @@
+import csv
+import io
+import json
+from app import db
+from app.database.models import Project, Deployment, DeploymentArchive
+from app.services.bulk import keyset
+from app.services.compression import GzipCompressor
+
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+FIELDS = ('id', 'project_id', 'project', 'client', 'status', 'triggered_by', 'user_id', 'stack', 'timestamp',
+          'started_at', 'ended_at', 'duration_ms', 'archived')
+
+# Logs stay out of exports: they would dominate the size and are served one by one by the API
+LIVE_COLUMNS = (Deployment.id, Deployment.project_id, Deployment.status, Deployment.triggered_by, Deployment.user_id,
+                Deployment.stack, Deployment.timestamp, Deployment.started_at, Deployment.ended_at,
+                Deployment.duration_ms)
+ARCHIVE_COLUMNS = (DeploymentArchive.id, DeploymentArchive.project_id, DeploymentArchive.client_name,
+                   DeploymentArchive.status, DeploymentArchive.triggered_by, DeploymentArchive.user_id,
+                   DeploymentArchive.timestamp, DeploymentArchive.started_at, DeploymentArchive.ended_at,
+                   DeploymentArchive.duration_ms)
+
+
+# --- FILTERS ---
+def archive_filters(project_ids=(), client=None, statuses=(), before=None, after=None, triggered_by=None):
+    """Same filters as bulk.deployment_filters, on the archived history."""
+    criteria = []
+    if project_ids:
+        criteria.append(DeploymentArchive.project_id.in_(project_ids))
+    if client:
+        criteria.append(DeploymentArchive.client_name == client)
+    if statuses:
+        criteria.append(DeploymentArchive.status.in_(statuses))
+    if before:
+        criteria.append(DeploymentArchive.timestamp < before)
+    if after:
+        criteria.append(DeploymentArchive.timestamp >= after)
+    if triggered_by:
+        criteria.append(DeploymentArchive.triggered_by == triggered_by)
+    return criteria
+
+
+# --- ROWS ---
+def history(criteria, archive_criteria=None, batch_size=5000):
+    """Yields lists of FIELDS tuples: the archived history first (the oldest rows), then live deployments.
+
+    Both tables are walked with bulk.keyset, so memory holds one batch and no
+    transaction stays open while the consumer writes a batch out. Project
+    names come from a per-export lookup, filled once per project seen. Dates
+    are already ISO 8601 strings, so rows go to csv/json as they are.
+    """
+    projects = {}
+
+    def lookup(rows):
+        missing = {row[1] for row in rows} - projects.keys()
+        if missing:
+            projects.update(dict.fromkeys(missing, (None, None)))
+            found = db.session.execute(db.select(Project.id, Project.name, Project.client_name)
+                                       .where(Project.id.in_(missing)))
+            projects.update((id, (name, client)) for id, name, client in found)
+            db.session.rollback()
+
+    if archive_criteria is not None:
+        for rows in keyset(ARCHIVE_COLUMNS, archive_criteria, batch_size):
+            lookup(rows)
+            yield [(id, project_id, projects[project_id][0], client, status, triggered_by, user_id, None,
+                    timestamp and timestamp.isoformat(), started_at and started_at.isoformat(),
+                    ended_at and ended_at.isoformat(), duration_ms, True)
+                   for id, project_id, client, status, triggered_by, user_id, timestamp, started_at, ended_at,
+                   duration_ms in rows]
+    for rows in keyset(LIVE_COLUMNS, criteria, batch_size):
+        lookup(rows)
+        yield [(id, project_id, *projects[project_id], status, triggered_by, user_id, stack,
+                timestamp and timestamp.isoformat(), started_at and started_at.isoformat(),
+                ended_at and ended_at.isoformat(), duration_ms, False)
+               for id, project_id, status, triggered_by, user_id, stack, timestamp, started_at, ended_at,
+               duration_ms in rows]
+
+
+# --- ENCODERS ---
+def encode(batches, fmt):
+    """One bytes chunk per batch, after the CSV header line (sent even when no row matches)."""
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        yield (','.join(FIELDS) + '\n').encode('utf-8')
+        for rows in batches:
+            writer.writerows(rows)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    elif fmt == 'ndjson':
+        dumps = json.JSONEncoder(ensure_ascii=False).encode
+        for rows in batches:
+            yield ''.join(dumps(dict(zip(FIELDS, row))) + '\n' for row in rows).encode('utf-8')
+    else:
+        raise ValueError(f'format must be one of {tuple(FORMATS)}')
+
+
+def gzipped(chunks, level=6):
+    """Compresses a chunk stream on the fly into a single .gz member."""
+    compressor = GzipCompressor(level)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def stream(fmt, criteria, archive_criteria=None, batch_size=5000, gzip=False, progress=None):
+    """Bytes chunks of the filtered history in fmt; progress(stats) runs after each batch."""
+    stats = {'rows': 0, 'batches': 0}
+
+    def counted(batches):
+        for rows in batches:
+            yield rows
+            stats['rows'] += len(rows)
+            stats['batches'] += 1
+            if progress:
+                progress(stats)
+
+    chunks = encode(counted(history(criteria, archive_criteria, batch_size)), fmt)
+    return gzipped(chunks) if gzip else chunks
@@ -0,0 +1,54 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ShuttingDown(Exception):
+    pass
+
+
+class Lifecycle:
+    """Tracks in-flight deployments so a worker can drain them before exiting."""
+
+    def __init__(self, app=None):
+        self.accepting = True
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._hooks = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['lifecycle'] = self
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    @contextmanager
+    def deployment(self):
+        with self._cond:
+            if not self.accepting:
+                raise ShuttingDown()
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def on_shutdown(self, fn):
+        """Registers fn(deadline) to run while draining (background services)."""
+        self._hooks.append(fn)
+        return fn
+
+    def drain(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self.accepting = False
+            while self._in_flight and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+        for hook in self._hooks:
+            hook(deadline)
+        return self._in_flight == 0
@@ -0,0 +1,113 @@
+import json
+import queue
+import threading
+
+# Sent instead of deltas when a browser fell too far behind: it reloads the page once
+RESYNC = 'event: resync\ndata: {}\n\n'
+
+
+def _encode(deltas):
+    return f'event: status\ndata: {json.dumps(deltas, separators=(",", ":"))}\n\n'
+
+
+class _Client:
+    __slots__ = ('tenant_id', 'queue', 'lagging')
+
+    def __init__(self, tenant_id, buffer):
+        self.tenant_id = tenant_id
+        self.queue = queue.Queue(maxsize=buffer)
+        self.lagging = False
+
+
+class StatusStream:
+    """Pushes project status deltas to every dashboard open on this worker (Server-Sent Events).
+
+    The worker holds one event bus subscription to the 'project' topic; each
+    batch is reduced to the latest state per project, encoded once per tenant
+    and copied into the connected browsers' queues. Browsers never cause a
+    database query after connecting.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._clients = set()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['live'] = self
+        app.extensions['events'].subscribe(('project',), self.publish)
+        app.extensions['lifecycle'].on_shutdown(self.close)
+
+    @property
+    def clients(self):
+        return len(self._clients)
+
+    @property
+    def full(self):
+        return self.clients >= self.app.config['SSE_MAX_CLIENTS']
+
+    def publish(self, events):
+        """Event bus subscriber: one delta per changed project, latest state wins."""
+        latest = {}
+        for item in events:
+            latest[item['key']] = item
+        if not latest:
+            return
+        deltas = [(item['tenant_id'], {'id': project_id, 'status': item['status'], 'last_deploy': item['last_deploy']})
+                  for project_id, item in latest.items()]
+        messages = {}
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            scope = client.tenant_id
+            if scope not in messages:
+                visible = [delta for tenant_id, delta in deltas if scope is None or tenant_id == scope]
+                messages[scope] = _encode(visible) if visible else None
+            if messages[scope] is not None:
+                self._send(client, messages[scope])
+
+    @staticmethod
+    def _send(client, message):
+        try:
+            client.queue.put_nowait(message)
+        except queue.Full:
+            # A stalled browser must not hold memory or slow the others down
+            client.lagging = True
+
+    def stream(self, tenant_id):
+        """Generator of SSE text for one browser, scoped to tenant_id (None: every tenant)."""
+        config = self.app.config
+        client = _Client(tenant_id, config['SSE_CLIENT_BUFFER'])
+        with self._lock:
+            self._clients.add(client)
+        try:
+            yield f'retry: {config["SSE_RETRY_MS"]}\n\n'
+            while True:
+                try:
+                    message = client.queue.get(timeout=config['SSE_HEARTBEAT_SECONDS'])
+                except queue.Empty:
+                    # Keeps proxies from closing an idle connection and detects gone browsers
+                    yield ': ping\n\n'
+                    continue
+                if message is None:
+                    return
+                if client.lagging:
+                    yield RESYNC
+                    return
+                yield message
+        finally:
+            with self._lock:
+                self._clients.discard(client)
+
+    def close(self, deadline=None):
+        """Lifecycle hook: ends every stream so the worker can exit; browsers reconnect elsewhere."""
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.queue.put_nowait(None)
+            except queue.Full:
+                client.lagging = True
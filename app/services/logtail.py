@@ -0,0 +1,165 @@
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from app.services.pipeline import FINAL_STATUSES
+
+RANGE = re.compile(r'^bytes=(\d+)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    def __init__(self, size):
+        super().__init__(f'offset beyond {size} bytes')
+        self.size = size
+
+
+def parse_range(header):
+    """(first, last or None) of a single 'bytes=N-' or 'bytes=N-M' range; None when absent or unsupported."""
+    match = RANGE.match((header or '').strip())
+    if not match:
+        return None
+    first, last = int(match.group(1)), match.group(2)
+    return first, int(last) if last else None
+
+
+def log_slice(log_content, first, last=None):
+    """Bytes of the UTF-8 log from first to last (inclusive) and the total size; the log only ever grows."""
+    data = (log_content or '').encode('utf-8')
+    if first > len(data):
+        raise RangeNotSatisfiable(len(data))
+    end = len(data) if last is None else min(last + 1, len(data))
+    return data[first:end], len(data)
+
+
+def log_state_query(deployment_id):
+    """Everything a tail response needs, in one query (shared by the Flask and async tiers)."""
+    from sqlalchemy import exists, select
+    from app.database.models import Deployment, DeploymentStage
+
+    has_stages = exists().where(DeploymentStage.deployment_id == Deployment.id)
+    return select(Deployment.status, Deployment.runner_id, Deployment.ended_at, has_stages.label('has_stages'),
+                  Deployment.log_content).where(Deployment.id == deployment_id)
+
+
+def log_append(text):
+    """SET value adding text to log_content on a new line: the log only grows, so readers' offsets stay valid."""
+    from sqlalchemy import case, func
+    from app.database.models import Deployment
+
+    return case((func.coalesce(Deployment.log_content, '') == '', text), else_=Deployment.log_content + '\n' + text)
+
+
+def log_complete(row, runner_timeout):
+    """True once nothing will be appended to the log any more."""
+    if row.status not in FINAL_STATUSES:
+        return False
+    if row.status != 'Stopped' or row.runner_id is None or row.has_stages:
+        return True
+    # Stopped while running: its runner appends the partial log when it notices, unless the runner died
+    return row.ended_at is not None and (datetime.utcnow() - row.ended_at).total_seconds() > runner_timeout
+
+
+def tail_response(row, first, last, ranged, runner_timeout):
+    """(status code, body bytes, headers) for a tail of row's log starting at byte first.
+
+    The new offset and the completion flag travel in headers so the body is
+    only the appended bytes. With a Range header the answer is a 206 (416
+    when there is nothing at or after first yet), otherwise a 200.
+    """
+    complete = log_complete(row, runner_timeout)
+    try:
+        chunk, size = log_slice(row.log_content, first, last)
+    except RangeNotSatisfiable as err:
+        chunk, size = None, err.size
+    headers = {'Accept-Ranges': 'bytes', 'Cache-Control': 'no-store', 'X-Deployment-Status': row.status,
+               'X-Log-Size': str(size), 'X-Log-Complete': '1' if complete else '0'}
+    if chunk is None or (ranged and not chunk):
+        headers.update({'Content-Range': f'bytes */{size}', 'X-Log-Offset': str(size)})
+        return 416, b'', headers
+    headers['X-Log-Offset'] = str(first + len(chunk))
+    if ranged:
+        headers['Content-Range'] = f'bytes {first}-{first + len(chunk) - 1}/{size}'
+        return 206, chunk, headers
+    return 200, chunk, headers
+
+
+class LogTail:
+    """Lets log requests wait for a deployment to change instead of polling the database.
+
+    A deployment's log and status only change through transactions that
+    write a 'deployment' outbox event (claim, each stage's output, stop,
+    completion...). The event bus hands them to this worker, which wakes the
+    requests waiting on those deployments; a request re-reads the row once
+    per wake-up or when its wait runs out. Waiting requests hold a thread under gthread: past
+    LOG_TAIL_MAX_WAITERS the route answers at once with a Retry-After.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._versions = {}
+        self._waiting = {}
+        self._blocked = 0
+        self._changed = threading.Condition()
+        self._closed = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['log_tail'] = self
+        app.extensions['events'].subscribe(('deployment',), self.publish)
+        app.extensions['lifecycle'].on_shutdown(self.close)
+
+    def publish(self, events):
+        """Event bus subscriber: wakes the requests waiting on the deployments that changed."""
+        with self._changed:
+            keys = {item['key'] for item in events if item['key'] in self._waiting}
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+            if keys:
+                self._changed.notify_all()
+
+    @contextmanager
+    def watching(self, deployment_id):
+        """Registers interest in deployment_id: take version() before reading the row, then wait()."""
+        with self._changed:
+            self._waiting[deployment_id] = self._waiting.get(deployment_id, 0) + 1
+        try:
+            yield
+        finally:
+            with self._changed:
+                self._waiting[deployment_id] -= 1
+                if not self._waiting[deployment_id]:
+                    del self._waiting[deployment_id]
+                    self._versions.pop(deployment_id, None)
+
+    def version(self, deployment_id):
+        return self._versions.get(deployment_id, 0)
+
+    @property
+    def full(self):
+        return self._blocked >= self.app.config['LOG_TAIL_MAX_WAITERS']
+
+    def wait(self, deployment_id, version, timeout):
+        """Blocks until deployment_id changed since version, or timeout seconds; True if it changed."""
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            self._blocked += 1
+            try:
+                while not self._closed and self._versions.get(deployment_id, 0) == version:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._changed.wait(remaining)
+                return True
+            finally:
+                self._blocked -= 1
+
+    def close(self, deadline=None):
+        """Lifecycle hook: releases every waiting request so the worker can exit."""
+        with self._changed:
+            self._closed = True
+            for key in self._waiting:
+                self._versions[key] = self._versions.get(key, 0) + 1
+            self._changed.notify_all()
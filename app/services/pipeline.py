@@ -0,0 +1,351 @@
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+
+# Deployment statuses still owned by the scheduler
+ACTIVE_STATUSES = ('Queued', 'Running')
+
+# Deployment statuses that will never change again
+FINAL_STATUSES = ('Success', 'Failed', 'Stopped')
+
+# Only pipelines that ran to completion feed the duration percentiles
+COMPLETED_STATUSES = ('Success', 'Failed')
+
+# Project status after a deployment finishes with the given result
+PROJECT_STATUS = {'Success': 'Running', 'Failed': 'Error'}
+
+# Share of runs that hit a simulated failure (same odds as the original 4-in-5 success)
+FAILURE_RATE = 0.2
+
+# Priority classes, lower rank first. Queued hotfixes may preempt running routine work.
+PRIORITIES = {'hotfix': 0, 'normal': 1, 'routine': 2}
+DEFAULT_PRIORITY = 'normal'
+
+
+# --- STACK TEMPLATES ---
+STACK_FAMILIES = (
+    ('python', ('python', 'django', 'flask', 'fastapi')),
+    ('node', ('react', 'next', 'node', 'vue', 'angular')),
+    ('java', ('spring', 'java', 'kotlin')),
+    ('flutter', ('flutter', 'dart')),
+    ('php', ('php', 'laravel', 'symfony')),
+)
+
+TOOLCHAINS = {
+    'python': 'pip install -r requirements.txt',
+    'node': 'npm ci',
+    'java': 'mvn dependency:resolve',
+    'flutter': 'flutter pub get',
+    'php': 'composer install',
+    'generic': 'make deps',
+}
+
+TEST_SUITES = {
+    'python': ('test_api.py', 'test_db.py', 'test_models.py'),
+    'node': ('unit', 'components', 'e2e-smoke'),
+    'java': ('unit', 'integration'),
+    'flutter': ('widget', 'unit'),
+    'php': ('phpunit', 'feature'),
+    'generic': ('unit',),
+}
+
+
+def stack_matches(stack, keywords):
+    """Whether stack names one of keywords as a whole word: 'JavaScript' is not 'java', 'NodeJS' is 'node'."""
+    lowered = (stack or '').lower()
+    return any(re.search(rf'\b{re.escape(keyword)}(?:js)?\b', lowered) for keyword in keywords)
+
+
+def stack_family(stack):
+    for family, keywords in STACK_FAMILIES:
+        if stack_matches(stack, keywords):
+            return family
+    return 'generic'
+
+
+class Stage:
+    """One node of the pipeline DAG; runs once every stage in ``needs`` succeeded.
+
+    Cacheable stages only depend on their inputs: with a build cache, an
+    unchanged stage is skipped and its stored output (artifact_kb of
+    simulated artifact) reused. Stages with side effects set cacheable=False.
+    """
+
+    def __init__(self, name, label, needs=(), seconds=(0.05, 0.2), failure=None, cacheable=True, artifact_kb=4):
+        self.name = name
+        self.label = label
+        self.needs = tuple(needs)
+        self.seconds = seconds
+        self.failure = failure
+        self.cacheable = cacheable
+        self.artifact_kb = artifact_kb
+
+    def run(self, ctx):
+        # Waiting on the token instead of sleeping lets a stop interrupt the stage at once
+        if ctx.token.wait(ctx.rng_uniform(*self.seconds) * ctx.time_scale):
+            raise PipelineCancelled(ctx.token.reason)
+        if ctx.fail_stage == self.name:
+            raise StageFailed(self.failure or f'{self.label} failed')
+        return [f'[INFO] {self.label}... OK']
+
+
+class StageFailed(Exception):
+    pass
+
+
+class PipelineCancelled(Exception):
+    pass
+
+
+class CancellationToken:
+    """Cooperative stop signal shared by every stage of one pipeline run."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason = None
+
+    def cancel(self, reason='cancelled'):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def wait(self, timeout):
+        """Sleeps up to timeout seconds; returns True as soon as the run is cancelled."""
+        return self._event.wait(timeout)
+
+
+def build_stages(stack):
+    family = stack_family(stack)
+    tests = [Stage(f'test:{suite}', f'Running test suite {suite}', needs=('install',), seconds=(0.1, 0.4),
+                   failure=f'Test suite {suite} failed: 1 assertion error')
+             for suite in TEST_SUITES[family]]
+    return [
+        Stage('fetch', 'Fetching origin/master'),
+        Stage('install', f'Installing dependencies ({TOOLCHAINS[family]})', needs=('fetch',), seconds=(0.1, 0.3),
+              artifact_kb=256),
+        Stage('lint', 'Static analysis', needs=('install',)),
+        *tests,
+        Stage('build', 'Building Container', needs=('install',), seconds=(0.2, 0.5), artifact_kb=512),
+        Stage('push', 'Pushing artifacts to production', needs=('build', 'lint', *[t.name for t in tests]),
+              cacheable=False),
+        Stage('deploy', 'Restarting service', needs=('push',), cacheable=False,
+              failure='Timeout waiting for database connection.'),
+    ]
+
+
+# --- EXECUTOR ---
+class StageResult:
+    def __init__(self, stage, status, started_at=None, ended_at=None, duration_ms=0, log='', cache=None, saved_ms=None):
+        self.name = stage.name
+        self.label = stage.label
+        self.status = status
+        self.started_at = started_at
+        self.ended_at = ended_at
+        self.duration_ms = duration_ms
+        self.log = log
+        # 'hit' (output reused, saved_ms not spent) or 'miss' (ran, output stored); None without a cache
+        self.cache = cache
+        self.saved_ms = saved_ms
+
+    def to_dict(self):
+        return {'name': self.name, 'status': self.status, 'duration_ms': self.duration_ms, 'cache': self.cache}
+
+
+class PipelineResult:
+    def __init__(self, status, stages, log_text, wall_ms, serial_ms, summary=()):
+        self.status = status
+        self.stages = stages
+        self.log_text = log_text
+        self.wall_ms = wall_ms
+        self.serial_ms = serial_ms
+        # Closing lines of log_text, the only ones not handed to on_log
+        self.summary = list(summary)
+
+
+class PipelineContext:
+    def __init__(self, project_name, stack, time_scale=1.0, rng=None, token=None, cache=None, cache_scope=None,
+                 on_log=None):
+        self.project_name = project_name
+        self.stack = stack
+        self.time_scale = time_scale
+        self.token = token or CancellationToken()
+        self.cache = cache
+        self.cache_scope = cache_scope
+        self.on_log = on_log
+        self.lines = []
+        self.keys = {}
+        self._rng = rng or random.Random()
+        self._rng_lock = threading.Lock()
+        self.fail_stage = None
+
+    def rng_uniform(self, low, high):
+        with self._rng_lock:
+            return self._rng.uniform(low, high)
+
+    def log(self, lines):
+        """Adds lines to the run's log, in the order they happen, and hands them to on_log."""
+        self.lines.extend(lines)
+        if self.on_log:
+            self.on_log(lines)
+
+    def choose_failure(self, stages):
+        if self._rng.random() < FAILURE_RATE:
+            self.fail_stage = self._rng.choice([stage.name for stage in stages if stage.failure])
+
+
+def _run_stage(stage, ctx):
+    started_at = datetime.utcnow()
+    started = time.perf_counter()
+    try:
+        lines = stage.run(ctx)
+        status = 'Success'
+    except StageFailed as err:
+        lines = [f'[ERROR] {err}']
+        status = 'Failed'
+    except PipelineCancelled as err:
+        lines = [f'[WARN] {stage.label} interrupted: {err}']
+        status = 'Cancelled'
+    duration_ms = int((time.perf_counter() - started) * 1000)
+    lines[-1] += f' ({duration_ms} ms)'
+    return StageResult(stage, status, started_at, datetime.utcnow(), duration_ms, '\n'.join(lines))
+
+
+# --- BUILD CACHE ---
+def _cached_result(stage, ctx):
+    """Looks the stage up in the build cache; returns a hit result or None (the stage must run)."""
+    ctx.keys[stage.name] = ctx.cache.action_key(stage, ctx.cache_scope, [ctx.keys[need] for need in stage.needs])
+    if not stage.cacheable:
+        return None
+    entry = ctx.cache.get(ctx.keys[stage.name])
+    if entry is None:
+        return None
+    now = datetime.utcnow()
+    return StageResult(stage, 'Success', now, now, 0, f'[CACHE] {stage.label}... hit ({entry["duration_ms"]} ms saved)',
+                       cache='hit', saved_ms=entry['duration_ms'])
+
+
+def _store_result(stage, result, ctx):
+    key = ctx.keys[stage.name]
+    # Stand-in for the stage's real output (dependency tree, image layers...)
+    artifact = (key.encode() * (stage.artifact_kb * 16 + 1))[:stage.artifact_kb * 1024]
+    try:
+        ctx.cache.put(key, {'stage': stage.name, 'duration_ms': result.duration_ms, 'log': result.log}, artifact)
+    except OSError:
+        # A full or read-only disk only costs the next run its cache hit
+        return
+    result.cache = 'miss'
+
+
+def execute(stages, ctx, executor):
+    """Runs stages as soon as their dependencies succeed; after a failure nothing new starts."""
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        missing = [need for need in stage.needs if need not in by_name]
+        if missing:
+            raise ValueError(f'Stage {stage.name} depends on unknown stages: {missing}')
+
+    results = {}
+    pending = list(stages)
+    running = {}
+    failed = False
+    while pending or running:
+        progressed = False
+        for stage in list(pending):
+            deps = [results.get(need) for need in stage.needs]
+            if any(dep is None for dep in deps):
+                continue
+            pending.remove(stage)
+            progressed = True
+            if failed or ctx.token.cancelled or any(dep.status != 'Success' for dep in deps):
+                results[stage.name] = StageResult(stage, 'Skipped')
+                continue
+            hit = _cached_result(stage, ctx) if ctx.cache else None
+            if hit is not None:
+                results[stage.name] = hit
+                ctx.log([hit.log])
+            else:
+                running[executor.submit(_run_stage, stage, ctx)] = stage
+        if not running:
+            if pending and not progressed:
+                raise ValueError('Pipeline has a dependency cycle')
+            continue
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            stage = running.pop(future)
+            result = future.result()
+            results[stage.name] = result
+            failed = failed or result.status != 'Success'
+            if ctx.cache and stage.cacheable and result.status == 'Success':
+                _store_result(stage, result, ctx)
+            ctx.log([result.log])
+    return [results[stage.name] for stage in stages]
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(workers=8):
+    """Stage worker pool shared by every pipeline of this process."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pipeline-stage')
+        return _executor
+
+
+def run_pipeline(project_name, stack, time_scale=1.0, workers=8, rng=None, token=None, cache=None, cache_scope=None,
+                 on_log=None):
+    """Runs the stack's pipeline; with a build cache, stages whose inputs (cache_scope) are unchanged are skipped.
+
+    on_log(lines) receives the log as it is written: the opening lines, then each
+    stage's output as the stage finishes. The closing summary is only in the result.
+    """
+    ctx = PipelineContext(project_name, stack, time_scale, rng, token, cache, cache_scope, on_log)
+    stages = build_stages(stack)
+    ctx.choose_failure(stages)
+    ctx.log([f'[INFO] Initializing CI/CD Pipeline for {project_name}...', f'[INFO] Stack: {stack}'])
+
+    started = time.perf_counter()
+    results = execute(stages, ctx, get_executor(workers))
+    wall_ms = int((time.perf_counter() - started) * 1000)
+    serial_ms = sum(result.duration_ms for result in results)
+    if ctx.token.cancelled:
+        status = 'Stopped'
+    else:
+        status = 'Success' if all(result.status == 'Success' for result in results) else 'Failed'
+
+    lines = []
+    skipped = [result.name for result in results if result.status == 'Skipped']
+    if skipped:
+        lines.append(f'[WARN] Skipped stages: {", ".join(skipped)}')
+    if cache:
+        hits = [result for result in results if result.cache == 'hit']
+        misses = sum(1 for result in results if result.cache == 'miss')
+        lines.append(f'[CACHE] {len(hits)} hit(s), {misses} miss(es), {sum(r.saved_ms for r in hits)} ms saved')
+    speedup = serial_ms / wall_ms if wall_ms else 1
+    lines.append(f'[INFO] Pipeline wall time {wall_ms} ms (serial {serial_ms} ms, x{speedup:.1f})')
+    if status == 'Success':
+        lines += ['[INFO] Service restarted successfully.', '[RESULT] DEPLOYMENT SUCCESSFUL.']
+    elif status == 'Stopped':
+        lines += [f'[WARN] Pipeline cancelled ({ctx.token.reason}).', '[RESULT] DEPLOYMENT STOPPED.']
+    else:
+        lines += ['[FATAL] Rollback initiated.', '[RESULT] DEPLOYMENT FAILED.']
+
+    return PipelineResult(status, results, '\n'.join(ctx.lines + lines), wall_ms, serial_ms, lines)
+
+
+def stage_rows(deployment_id, result):
+    """Rows for the deployment_stages table (bulk insert from either tier)."""
+    return [{
+        'deployment_id': deployment_id, 'position': position, 'name': stage.name, 'status': stage.status,
+        'started_at': stage.started_at, 'ended_at': stage.ended_at, 'duration_ms': stage.duration_ms, 'log': stage.log,
+        'cache': stage.cache, 'saved_ms': stage.saved_ms,
+    } for position, stage in enumerate(result.stages)]
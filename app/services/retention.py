@@ -0,0 +1,89 @@
+import zlib
+from datetime import datetime, timedelta
+from app import db
+from app.database.models import Project, Deployment, DeploymentArchive, RetentionPolicy
+from app.services.pipeline import FINAL_STATUSES
+
+
+def resolve_policy(project_id, client_name, project_policies, client_policies, default):
+    """Project policy first, then the client's, then the configured default: (keep_latest, keep_days)."""
+    policy = project_policies.get(project_id) or client_policies.get(client_name)
+    if policy is not None:
+        return policy.keep_latest, policy.keep_days
+    return default
+
+
+def expired_ids(project_id, keep_latest, keep_days, limit):
+    """Ids of finished deployments outside both the N latest and the X-day window."""
+    if keep_latest is None and keep_days is None:
+        return []
+    finished = (Deployment.project_id == project_id, Deployment.status.in_(FINAL_STATUSES))
+    query = db.select(Deployment.id).where(*finished)
+    offset = keep_latest or 0
+
+    if keep_days is not None:
+        cutoff = datetime.utcnow() - timedelta(days=keep_days)
+        query = query.where(Deployment.timestamp < cutoff)
+        if keep_latest is not None:
+            # Everything newer than the cutoff is kept anyway and counts towards the N latest
+            newer = db.session.scalar(
+                db.select(db.func.count()).select_from(Deployment).where(*finished, Deployment.timestamp >= cutoff)
+            )
+            offset = max(0, keep_latest - newer)
+
+    query = query.order_by(Deployment.timestamp.desc(), Deployment.id.desc()).offset(offset).limit(limit)
+    return list(db.session.scalars(query))
+
+
+def archive_batch(ids, client_name):
+    """Copies a batch into deployment_archive (log compressed) and removes it from the hot table."""
+    rows = db.session.execute(
+        db.select(Deployment.id, Deployment.tenant_id, Deployment.project_id, Deployment.user_id, Deployment.status,
+                  Deployment.triggered_by, Deployment.timestamp, Deployment.started_at,
+                  Deployment.ended_at, Deployment.duration_ms, Deployment.log_content).where(Deployment.id.in_(ids))
+    ).mappings().all()
+    now = datetime.utcnow()
+    archived = []
+    for row in rows:
+        item = dict(row)
+        item['log_compressed'] = zlib.compress((item.pop('log_content') or '').encode('utf-8'), 9)
+        item['client_name'] = client_name
+        item['archived_at'] = now
+        archived.append(item)
+    if archived:
+        db.session.execute(db.insert(DeploymentArchive), archived)
+        db.session.execute(db.delete(Deployment).where(Deployment.id.in_(ids)))
+    db.session.commit()
+    return len(archived)
+
+
+def run_retention(default=(None, None), batch_size=500, max_batches=None, dry_run=False, progress=None):
+    """Archives expired deployments project by project, committing every batch_size rows."""
+    project_policies = {p.project_id: p for p in RetentionPolicy.query.filter(RetentionPolicy.project_id.isnot(None))}
+    client_policies = {p.client_name: p for p in RetentionPolicy.query.filter(RetentionPolicy.client_name.isnot(None))}
+    projects = db.session.execute(db.select(Project.id, Project.client_name).order_by(Project.id)).all()
+
+    stats = {'projects': 0, 'archived': 0, 'batches': 0}
+    for project_id, client_name in projects:
+        keep_latest, keep_days = resolve_policy(project_id, client_name, project_policies, client_policies, default)
+        stats['projects'] += 1
+        if dry_run:
+            stats['archived'] += len(expired_ids(project_id, keep_latest, keep_days, None))
+            continue
+        while max_batches is None or stats['batches'] < max_batches:
+            ids = expired_ids(project_id, keep_latest, keep_days, batch_size)
+            if not ids:
+                break
+            stats['archived'] += archive_batch(ids, client_name)
+            stats['batches'] += 1
+            if progress:
+                progress(project_id, stats)
+            if len(ids) < batch_size:
+                break
+        if max_batches is not None and stats['batches'] >= max_batches:
+            break
+    return stats
+
+
+def archived_log(archive):
+    return zlib.decompress(archive.log_compressed).decode('utf-8') if archive.log_compressed else ''
@@ -0,0 +1,148 @@
+from datetime import datetime, timedelta
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from app.database.models import Deployment, DeploymentArchive, DeploymentRollup, Project
+
+GRANULARITIES = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+# Counter column incremented for each final status
+STATUS_COLUMNS = {'Success': 'success', 'Failed': 'failed', 'Stopped': 'stopped'}
+MAX_POINTS = 24 * 93
+
+
+def bucket_start(moment, granularity):
+    if granularity == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def duration_ms(started_at, ended_at):
+    if not started_at or not ended_at:
+        return None
+    return max(0, int((ended_at - started_at).total_seconds() * 1000))
+
+
+def _insert(dialect_name):
+    return postgresql.insert if dialect_name == 'postgresql' else sqlite.insert
+
+
+def rollup_statements(dialect_name, project_id, client_name, status, finished_at, duration=None):
+    """Upserts adding one finished deployment to its project and client series.
+
+    Returned as statements so both the Flask session and the async API tier can
+    run them inside the transaction that records the deployment.
+    """
+    column = STATUS_COLUMNS.get(status)
+    if column is None:
+        return []
+    insert = _insert(dialect_name)
+    statements = []
+    for scope, key in (('project', str(project_id)), ('client', client_name)):
+        for granularity in GRANULARITIES:
+            values = {
+                'scope': scope, 'scope_key': key, 'granularity': granularity,
+                'bucket': bucket_start(finished_at, granularity),
+                'total': 1, 'success': 0, 'failed': 0, 'stopped': 0,
+                'duration_ms_sum': duration or 0, 'duration_count': 1 if duration is not None else 0,
+            }
+            values[column] = 1
+            stmt = insert(DeploymentRollup).values(**values)
+            table = DeploymentRollup.__table__.c
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['scope', 'scope_key', 'granularity', 'bucket'],
+                set_={
+                    'total': table.total + 1,
+                    column: table[column] + 1,
+                    'duration_ms_sum': table.duration_ms_sum + (duration or 0),
+                    'duration_count': table.duration_count + (1 if duration is not None else 0),
+                },
+            )
+            statements.append(stmt)
+    return statements
+
+
+def record_deployment(deployment, client_name):
+    """Adds a finished deployment to the rollups in the current (uncommitted) transaction."""
+    finished_at = deployment.ended_at or deployment.timestamp or datetime.utcnow()
+    for stmt in rollup_statements(db.engine.dialect.name, deployment.project_id, client_name, deployment.status,
+                                  finished_at, duration_ms(deployment.started_at, deployment.ended_at)):
+        db.session.execute(stmt)
+
+
+# --- BACKFILL ---
+def backfill(batch_size=5000, progress=None):
+    """Rebuilds every rollup from deployments and their archive, streaming rows in chunks."""
+    points = {}
+
+    def add(project_id, client_name, status, timestamp, started_at, ended_at):
+        column = STATUS_COLUMNS.get(status)
+        if column is None:
+            return
+        finished_at = ended_at or timestamp
+        duration = duration_ms(started_at, ended_at)
+        for scope, key in (('project', str(project_id)), ('client', client_name)):
+            for granularity in GRANULARITIES:
+                point = points.setdefault((scope, key, granularity, bucket_start(finished_at, granularity)),
+                                          {'total': 0, 'success': 0, 'failed': 0, 'stopped': 0,
+                                           'duration_ms_sum': 0, 'duration_count': 0})
+                point['total'] += 1
+                point[column] += 1
+                if duration is not None:
+                    point['duration_ms_sum'] += duration
+                    point['duration_count'] += 1
+
+    live = (db.select(Deployment.project_id, Project.client_name, Deployment.status, Deployment.timestamp,
+                      Deployment.started_at, Deployment.ended_at)
+            .join(Project, Project.id == Deployment.project_id))
+    archived = db.select(DeploymentArchive.project_id, DeploymentArchive.client_name, DeploymentArchive.status,
+                         DeploymentArchive.timestamp, DeploymentArchive.started_at, DeploymentArchive.ended_at)
+    seen = 0
+    for query in (live, archived):
+        for row in db.session.execute(query.execution_options(yield_per=batch_size)):
+            add(*row)
+            seen += 1
+            if progress and seen % batch_size == 0:
+                progress(seen)
+
+    db.session.execute(db.delete(DeploymentRollup))
+    rows = [dict(zip(('scope', 'scope_key', 'granularity', 'bucket'), key), **value) for key, value in points.items()]
+    for i in range(0, len(rows), batch_size):
+        db.session.execute(db.insert(DeploymentRollup), rows[i:i + batch_size])
+    db.session.commit()
+    return seen, len(rows)
+
+
+# --- SERIES ---
+def series(scope, key, granularity, since=None, until=None):
+    """Chart-ready series for one scope: parallel arrays, empty buckets filled with zeros."""
+    step = GRANULARITIES[granularity]
+    until = bucket_start(until or datetime.utcnow(), granularity)
+    since = bucket_start(since or until - step * (47 if granularity == 'hour' else 29), granularity)
+    if since > until:
+        since, until = until, since
+    if (until - since) / step >= MAX_POINTS:
+        since = until - step * (MAX_POINTS - 1)
+
+    rows = {row.bucket: row for row in db.session.execute(
+        db.select(DeploymentRollup).where(
+            DeploymentRollup.scope == scope,
+            DeploymentRollup.scope_key == str(key),
+            DeploymentRollup.granularity == granularity,
+            DeploymentRollup.bucket.between(since, until),
+        ).order_by(DeploymentRollup.bucket)
+    ).scalars()}
+
+    result = {'scope': scope, 'key': str(key), 'granularity': granularity,
+              'buckets': [], 'total': [], 'success': [], 'failed': [], 'stopped': [], 'avg_duration_ms': []}
+    moment = since
+    while moment <= until:
+        row = rows.get(moment)
+        result['buckets'].append(moment.isoformat())
+        for name in ('total', 'success', 'failed', 'stopped'):
+            result[name].append(getattr(row, name) if row else 0)
+        result['avg_duration_ms'].append(
+            round(row.duration_ms_sum / row.duration_count) if row and row.duration_count else None)
+        moment += step
+    return result
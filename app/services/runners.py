@@ -0,0 +1,249 @@
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+class RunnerPool:
+    """Local runners of this process: registry rows, heartbeats and the dispatch loop.
+
+    Every web worker (or a dedicated ``flask runners run`` process) registers
+    RUNNERS_PER_PROCESS runners of RUNNER_SLOTS slots each. One scheduler thread
+    claims queued deployments for free slots and runs them on a thread pool;
+    runners that stop heart-beating are reaped by the other processes and their
+    deployments go back to the queue.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._runners = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._executor = None
+        self._pid = None
+        self._tokens = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['runners'] = self
+        app.extensions['lifecycle'].on_shutdown(self.stop)
+        if app.config.get('RUNNERS_AUTOSTART'):
+            # Started on the first request, so threads live in the serving process (never the pre-fork master)
+            app.before_request(self.ensure_started)
+
+    @property
+    def started(self):
+        return self._thread is not None and self._pid == os.getpid()
+
+    def ensure_started(self):
+        if not self.started:
+            with self._lock:
+                if not self.started:
+                    self.start()
+
+    def notify(self):
+        """Wakes the dispatch loop right away (a deployment was queued or a slot freed)."""
+        self._wake.set()
+
+    def cancel(self, deployment_id, reason='stopped'):
+        """Interrupts a deployment running in this process; returns False if it runs elsewhere.
+
+        Other processes notice the status change on their next dispatch round
+        (SCHEDULER_POLL_SECONDS), so a stop frees its slot within that bound.
+        """
+        with self._lock:
+            token = self._tokens.get(deployment_id)
+        if token is None:
+            return False
+        token.cancel(reason)
+        return True
+
+    # --- REGISTRY ---
+    def _register(self):
+        from app import db
+        from app.database.models import Runner
+
+        config = self.app.config
+        host, pid = socket.gethostname(), os.getpid()
+        now = datetime.utcnow()
+        self._runners = []
+        for index in range(config['RUNNERS_PER_PROCESS']):
+            name = f'{host}-{pid}-{index + 1}'
+            runner = Runner.query.filter_by(name=name).first() or Runner(name=name)
+            runner.host, runner.pid, runner.slots = host, pid, config['RUNNER_SLOTS']
+            runner.status, runner.started_at, runner.last_heartbeat = 'online', now, now
+            db.session.add(runner)
+            db.session.flush()
+            self._runners.append({'id': runner.id, 'name': name, 'slots': runner.slots, 'busy': 0})
+        db.session.commit()
+
+    def _heartbeat(self):
+        from app import db
+        from app.database.models import Runner
+
+        db.session.execute(
+            db.update(Runner).where(Runner.id.in_([r['id'] for r in self._runners]))
+            .values(last_heartbeat=datetime.utcnow(), status='online')
+        )
+        db.session.commit()
+
+    def start(self):
+        with self.app.app_context():
+            self._register()
+        self._pid = os.getpid()
+        self._stopping.clear()
+        slots = sum(runner['slots'] for runner in self._runners)
+        self._executor = ThreadPoolExecutor(max_workers=slots, thread_name_prefix='runner-slot')
+        self._thread = threading.Thread(target=self._loop, name='runner-scheduler', daemon=True)
+        self._thread.start()
+
+    # --- SLOTS ---
+    def _reserve_slot(self):
+        with self._lock:
+            free = [runner for runner in self._runners if runner['busy'] < runner['slots']]
+            if not free:
+                return None
+            # Spread load: the runner with the most free slots takes the work
+            runner = max(free, key=lambda r: r['slots'] - r['busy'])
+            runner['busy'] += 1
+            return runner
+
+    def _release_slot(self, runner):
+        with self._lock:
+            runner['busy'] -= 1
+        self.notify()
+
+    def free_slots(self):
+        with self._lock:
+            return sum(runner['slots'] - runner['busy'] for runner in self._runners)
+
+    # --- DISPATCH ---
+    def _loop(self):
+        from app import db
+        from app.services import scheduler
+
+        config = self.app.config
+        next_beat = 0.0
+        with self.app.app_context():
+            while not self._stopping.is_set():
+                try:
+                    now = time.monotonic()
+                    if now >= next_beat:
+                        self._heartbeat()
+                        scheduler.reap_stale_runners(config['RUNNER_TIMEOUT_SECONDS'])
+                        next_beat = now + config['RUNNER_HEARTBEAT_SECONDS']
+                    self._dispatch(scheduler)
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception('Boucle du planificateur de runners')
+                finally:
+                    db.session.remove()
+                self._wake.wait(config['SCHEDULER_POLL_SECONDS'])
+                self._wake.clear()
+
+    def _check_cancellations(self, scheduler):
+        with self._lock:
+            running = list(self._tokens)
+        runner_ids = [runner['id'] for runner in self._runners]
+        for deployment_id in scheduler.cancelled_ids(running, runner_ids):
+            self.cancel(deployment_id)
+
+    def _dispatch(self, scheduler):
+        from app.database.models import Deployment
+
+        config = self.app.config
+        lifecycle = self.app.extensions['lifecycle']
+        self._check_cancellations(scheduler)
+        if not lifecycle.accepting:
+            return
+        limits = (config['SCHEDULER_MAX_PER_PROJECT'], config['SCHEDULER_MAX_PER_CLIENT'])
+        free = self.free_slots()
+        if not free:
+            if config['SCHEDULER_PREEMPT']:
+                victim = scheduler.preemption_victim([runner['id'] for runner in self._runners], *limits)
+                if victim is not None and scheduler.requeue([Deployment.id == victim]):
+                    # Its slot frees as soon as the stages see the token; the hotfix is placed next round
+                    self.cancel(victim, 'preempted by a hotfix')
+            return
+        for candidate in scheduler.plan(free, *limits):
+            runner = self._reserve_slot()
+            if runner is None:
+                break
+            if scheduler.claim(candidate, runner['id'], *limits):
+                self._executor.submit(self._execute, runner, candidate.id)
+            else:
+                self._release_slot(runner)
+
+    def _execute(self, runner, deployment_id):
+        from app import db, build_cache
+        from app.database.models import Deployment, Project
+        from app.services import deployments, scheduler
+        from app.services.lifecycle import ShuttingDown
+        from app.services.pipeline import run_pipeline, CancellationToken
+
+        config = self.app.config
+        token = CancellationToken()
+        with self._lock:
+            self._tokens[deployment_id] = token
+        with self.app.app_context():
+            try:
+                with self.app.extensions['lifecycle'].deployment():
+                    deployment = db.session.get(Deployment, deployment_id)
+                    project = db.session.get(Project, deployment.project_id)
+                    name, stack = project.name, deployment.stack or project.stack
+                    waited = int((deployment.started_at - deployment.queued_at).total_seconds() * 1000)
+                    revision = build_cache.revision(db.session, deployment)
+                    deployments.invalidate(project.id)
+                    # No transaction stays open while the pipeline runs
+                    db.session.close()
+                    # The log is appended as the run goes, so tailing readers see each stage when it ends
+                    log = deployments.LogWriter(deployment_id, runner['id'], project.id, project.tenant_id)
+                    log([f"[INFO] Runner {runner['name']} (attente en file: {waited} ms)",
+                         f"[INFO] Révision: {revision or 'non versionnée'}"])
+                    # Without a known revision the sources may have changed: nothing can be reused safely
+                    cache = build_cache if build_cache.enabled and revision is not None else None
+                    result = run_pipeline(name, stack, config['PIPELINE_TIME_SCALE'], config['PIPELINE_WORKERS'],
+                                          token=token, cache=cache, cache_scope=[project.id, stack, revision],
+                                          on_log=log)
+                    deployments.complete(deployment_id, runner['id'], result, log)
+            except ShuttingDown:
+                scheduler.requeue([Deployment.id == deployment_id])
+            except Exception as err:
+                db.session.rollback()
+                self.app.logger.exception('Déploiement %s interrompu', deployment_id)
+                deployments.abort(deployment_id, runner['id'], f'Runner {runner["name"]}: {err}')
+            finally:
+                db.session.remove()
+                with self._lock:
+                    self._tokens.pop(deployment_id, None)
+                self._release_slot(runner)
+
+    # --- SHUTDOWN ---
+    def stop(self, deadline=None):
+        """Lifecycle hook: stop claiming, then hand unfinished deployments back to the queue."""
+        if not self.started:
+            return
+        from app import db
+        from app.database.models import Deployment, Runner
+        from app.services import scheduler
+
+        self._stopping.set()
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self._executor.shutdown(wait=False)
+        runner_ids = [runner['id'] for runner in self._runners]
+        with self.app.app_context():
+            scheduler.requeue([Deployment.runner_id.in_(runner_ids)])
+            with self._lock:
+                for token in self._tokens.values():
+                    token.cancel('worker shutting down')
+            db.session.execute(db.update(Runner).where(Runner.id.in_(runner_ids)).values(status='offline'))
+            db.session.commit()
+            db.session.remove()
+        self._thread = None
@@ -0,0 +1,192 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, TemplateError
+from app.services.pipeline import stack_family, stack_matches
+from app.services.tenancy import slugify
+
+TEMPLATES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scaffolds'))
+# Rendered into every skeleton; a template's own file of the same name wins
+COMMON = '_common'
+SUFFIX = '.j2'
+
+# --- STACK TEMPLATES ---
+# One template per stack family (pipeline.STACK_FAMILIES); the stacks below get a template of
+# their own first, so 'React Native' is a mobile app and not a web frontend
+SPECIALISED = (
+    ('mobile', ('react native', 'ionic', 'mobile', 'android', 'ios')),
+    ('django', ('django',)),
+)
+FAMILY_TEMPLATES = {'python': 'flask', 'node': 'node', 'java': 'spring', 'flutter': 'mobile', 'php': 'laravel'}
+SCAFFOLDS = ('mobile', 'django', 'flask', 'node', 'spring', 'laravel')
+
+TOOLING = {
+    'django': {'install': 'pip install -r requirements.txt', 'test': 'python manage.py test',
+               'commands': ['pip install -r requirements.txt', 'python manage.py migrate', 'python manage.py runserver']},
+    'flask': {'install': 'pip install -r requirements.txt', 'test': 'pytest -q',
+              'commands': ['pip install -r requirements.txt', 'flask --app wsgi run']},
+    'node': {'install': 'npm ci', 'test': 'npm test', 'commands': ['npm install', 'npm run dev']},
+    'spring': {'install': 'mvn -B dependency:resolve', 'test': 'mvn -B test',
+               'commands': ['mvn spring-boot:run']},
+    'laravel': {'install': 'composer install', 'test': 'php artisan test',
+                'commands': ['composer install', 'cp .env.example .env', 'php artisan key:generate', 'php artisan serve']},
+    'mobile': {'install': 'flutter pub get', 'test': 'flutter test', 'commands': ['flutter pub get', 'flutter run']},
+    'generic': {'install': 'echo "Installation à définir"', 'test': 'echo "Tests à définir"',
+                'commands': ['make install', 'make test']},
+}
+
+
+def template_for(stack):
+    for template, keywords in SPECIALISED:
+        if stack_matches(stack, keywords):
+            return template
+    return FAMILY_TEMPLATES.get(stack_family(stack), 'generic')
+
+
+def identifier(name):
+    """Slug usable as a Python/Java/Dart package name."""
+    package = slugify(name).replace('-', '_')
+    return f'p_{package}' if package[0].isdigit() else package
+
+
+class ScaffoldError(Exception):
+    pass
+
+
+class ProjectSpec:
+    __slots__ = ('name', 'client', 'stack')
+
+    def __init__(self, name, client, stack):
+        self.name = name
+        self.client = client
+        self.stack = stack
+
+    @property
+    def slug(self):
+        return slugify(self.name)
+
+    def directory(self, root):
+        return os.path.join(root, slugify(self.client), self.slug)
+
+
+class Scaffolder:
+    """Renders project skeletons from the stack templates in app/scaffolds/.
+
+    A template is a directory of Jinja files (``.j2``); path segments are
+    templates too, e.g. ``{{ package }}/settings.py.j2``. Each template is
+    listed and compiled once per Scaffolder, then only rendered: compiled
+    Jinja templates are thread-safe, so many projects render and write in
+    parallel from the same cache.
+    """
+
+    def __init__(self, templates_dir=TEMPLATES_DIR):
+        self.templates_dir = templates_dir
+        self.env = Environment(loader=FileSystemLoader(templates_dir), undefined=StrictUndefined,
+                               keep_trailing_newline=True, trim_blocks=True, lstrip_blocks=True,
+                               auto_reload=False)
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    # --- TEMPLATE CACHE ---
+    def _sources(self, template):
+        root = os.path.join(self.templates_dir, template)
+        if not os.path.isdir(root):
+            raise ScaffoldError(f"Modèle {template} introuvable dans {self.templates_dir}")
+        sources = {}
+        for directory, _, files in os.walk(root):
+            for filename in files:
+                if filename.endswith(SUFFIX):
+                    relative = os.path.relpath(os.path.join(directory, filename), root)
+                    sources[relative[:-len(SUFFIX)]] = f'{template}/{relative}'.replace(os.sep, '/')
+        return sources
+
+    def compiled(self, template):
+        """[(path template, content template)] of a stack template, compiled on first use."""
+        files = self._compiled.get(template)
+        if files is None:
+            with self._lock:
+                files = self._compiled.get(template)
+                if files is None:
+                    sources = {**self._sources(COMMON), **self._sources(template)}
+                    files = [(self.env.from_string(path), self.env.get_template(name))
+                             for path, name in sorted(sources.items())]
+                    self._compiled[template] = files
+        return files
+
+    # --- RENDERING ---
+    def context(self, spec, template):
+        return {
+            'name': spec.name, 'client': spec.client, 'stack': spec.stack, 'template': template,
+            'slug': spec.slug, 'package': identifier(spec.name), 'client_package': identifier(spec.client),
+            'generated_at': datetime.utcnow().strftime('%d/%m/%Y %H:%M'), **TOOLING[template],
+        }
+
+    def render(self, spec):
+        """[(relative path, text)] of one project's skeleton."""
+        template = template_for(spec.stack)
+        context = self.context(spec, template)
+        try:
+            return [(path.render(context), content.render(context)) for path, content in self.compiled(template)]
+        except TemplateError as err:
+            raise ScaffoldError(f"{spec.name}: modèle {template} invalide ({err})") from err
+
+    def write(self, spec, root):
+        target = spec.directory(root)
+        files = self.render(spec)
+        # Claimed atomically: two specs slugified to the same directory must not both write into it
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.mkdir(target)
+        except FileExistsError:
+            raise ScaffoldError(f"{target} existe déjà") from None
+        for path, text in files:
+            full_path = os.path.join(target, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, 'w', encoding='utf-8', newline='\n') as handle:
+                handle.write(text)
+        return target, len(files)
+
+    # --- GENERATION ---
+    def generate(self, session, specs, root, workers=8, record=True):
+        """Writes every skeleton in parallel, then records one Project row per skeleton written.
+
+        Returns {'created': [(spec, directory, project id)], 'failed': [(spec, message)], 'files': n, timings}.
+        """
+        from app import cache
+        from app.database.models import Project
+        from app.services.events import project_event
+
+        started = time.perf_counter()
+
+        def one(spec):
+            try:
+                return spec, *self.write(spec, root), None
+            except (ScaffoldError, OSError) as err:
+                return spec, None, 0, str(err)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(one, specs))
+        rendered = time.perf_counter()
+
+        written = [(spec, target) for spec, target, _, error in results if error is None]
+        project_ids = [None] * len(written)
+        if record and written:
+            now = datetime.utcnow()
+            projects = [Project(name=spec.name, client_name=spec.client, stack=spec.stack, status='Running',
+                                last_deploy=now) for spec, _ in written]
+            session.add_all(projects)
+            session.flush()
+            for project in projects:
+                session.execute(project_event(project.id, project.tenant_id, project.status, project.last_deploy))
+            project_ids = [project.id for project in projects]
+            session.commit()
+            cache.invalidate_tags('projects', 'tenants')
+        return {
+            'created': [(spec, target, project_id) for (spec, target), project_id in zip(written, project_ids)],
+            'failed': [(spec, error) for spec, _, _, error in results if error is not None],
+            'files': sum(count for _, _, count, _ in results),
+            'render_seconds': rendered - started,
+            'record_seconds': time.perf_counter() - rendered,
+        }
@@ -0,0 +1,228 @@
+from datetime import datetime, timedelta
+from sqlalchemy.orm import aliased
+from app import db
+from app.database.models import Deployment, Project, Runner
+from app.services.pipeline import PRIORITIES
+from app.services.rollups import rollup_statements
+from app.services.events import deployment_event
+from app.services.logtail import log_append
+
+# Queued deployments considered per planning round (oldest first)
+WINDOW = 200
+# Recent starts used for the queue wait statistics
+WAIT_SAMPLE = 200
+
+
+# --- PLACEMENT ---
+def running_counts():
+    rows = db.session.execute(
+        db.select(Deployment.project_id, Project.client_name, db.func.count())
+        .join(Project, Project.id == Deployment.project_id)
+        .where(Deployment.status == 'Running')
+        .group_by(Deployment.project_id, Project.client_name)
+    )
+    per_project, per_client = {}, {}
+    for project_id, client_name, count in rows:
+        per_project[project_id] = count
+        per_client[client_name] = per_client.get(client_name, 0) + count
+    return per_project, per_client
+
+
+def plan(free_slots, max_per_project, max_per_client):
+    """Picks up to free_slots queued deployments to start now.
+
+    Higher priority classes always go first. Within a class, fair share: each
+    pick goes to the eligible client with the fewest running deployments, oldest
+    queued first within a client and on ties, so one client flooding the queue
+    cannot starve the others.
+    """
+    per_project, per_client = running_counts()
+    queued = db.session.execute(
+        db.select(Deployment.id, Deployment.project_id, Deployment.tenant_id, Deployment.priority, Project.client_name)
+        .join(Project, Project.id == Deployment.project_id)
+        .where(Deployment.status == 'Queued')
+        .order_by(Deployment.priority, Deployment.queued_at, Deployment.id)
+        .limit(WINDOW)
+    ).all()
+
+    def rank(row):
+        return row.priority, per_client.get(row.client_name, 0)
+
+    chosen = []
+    while len(chosen) < free_slots:
+        best = None
+        for row in queued:
+            if per_project.get(row.project_id, 0) >= max_per_project or per_client.get(row.client_name, 0) >= max_per_client:
+                continue
+            if best is None or rank(row) < rank(best):
+                best = row
+        if best is None:
+            break
+        chosen.append(best)
+        queued.remove(best)
+        per_project[best.project_id] = per_project.get(best.project_id, 0) + 1
+        per_client[best.client_name] = per_client.get(best.client_name, 0) + 1
+    return chosen
+
+
+def claim(candidate, runner_id, max_per_project, max_per_client):
+    """Atomically moves a planned deployment from Queued to Running on runner_id.
+
+    The limits are re-checked inside the UPDATE, so processes planning at the
+    same time cannot push a project or client past its limit.
+    """
+    other, other_project = aliased(Deployment), aliased(Project)
+    project_running = (
+        db.select(db.func.count()).select_from(other)
+        .where(other.project_id == candidate.project_id, other.status == 'Running')
+        .scalar_subquery()
+    )
+    client_running = (
+        db.select(db.func.count()).select_from(other)
+        .join(other_project, other_project.id == other.project_id)
+        .where(other_project.client_name == candidate.client_name, other.status == 'Running')
+        .scalar_subquery()
+    )
+    started_at = datetime.utcnow()
+    claimed = db.session.execute(
+        db.update(Deployment)
+        .where(Deployment.id == candidate.id, Deployment.status == 'Queued',
+               project_running < max_per_project, client_running < max_per_client)
+        .values(status='Running', runner_id=runner_id, started_at=started_at)
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+    if claimed:
+        db.session.execute(deployment_event(candidate.id, candidate.project_id, candidate.tenant_id, 'Running',
+                                            runner_id=runner_id, started_at=started_at))
+    db.session.commit()
+    return claimed
+
+
+def requeue(criteria):
+    """Puts Running deployments matching criteria back in the queue (runner lost, shutting down or pre-empted).
+
+    A deployment whose project and stack already has a queued run is stopped
+    instead: the queued run does the same work.
+    """
+    rows = db.session.execute(
+        db.select(Deployment.id, Deployment.project_id, Deployment.tenant_id, Deployment.stack, Project.client_name)
+        .join(Project, Project.id == Deployment.project_id)
+        .where(Deployment.status == 'Running', *criteria)
+    ).all()
+    now = datetime.utcnow()
+    count = 0
+    for row in rows:
+        duplicate = db.session.scalar(
+            db.select(Deployment.id)
+            .where(Deployment.project_id == row.project_id, Deployment.stack == row.stack, Deployment.status == 'Queued')
+        )
+        running = db.update(Deployment).where(Deployment.id == row.id, Deployment.status == 'Running')
+        if duplicate is None:
+            if db.session.execute(
+                running.values(status='Queued', runner_id=None, started_at=None)
+                .execution_options(synchronize_session=False)
+            ).rowcount:
+                count += 1
+                db.session.execute(deployment_event(row.id, row.project_id, row.tenant_id, 'Queued'))
+        elif db.session.execute(
+            running.values(status='Stopped', ended_at=now, log_content=log_append(f'[WARN] Remplacé par le déploiement #{duplicate}'))
+            .execution_options(synchronize_session=False)
+        ).rowcount:
+            for stmt in rollup_statements(db.engine.dialect.name, row.project_id, row.client_name, 'Stopped', now):
+                db.session.execute(stmt)
+            db.session.execute(deployment_event(row.id, row.project_id, row.tenant_id, 'Stopped', ended_at=now))
+    db.session.commit()
+    return count
+
+
+def preemption_victim(runner_ids, max_per_project, max_per_client):
+    """A running routine deployment of these runners to pre-empt for a waiting hotfix, if any.
+
+    Only pre-empts when a hotfix could be placed right away (its limits allow
+    it), and picks the most recently started victim so the least work is lost.
+    """
+    hotfix, routine = PRIORITIES['hotfix'], PRIORITIES['routine']
+    waiting = [row for row in plan(1, max_per_project, max_per_client) if row.priority == hotfix]
+    if not waiting or not runner_ids:
+        return None
+    return db.session.scalar(
+        db.select(Deployment.id)
+        .where(Deployment.status == 'Running', Deployment.priority >= routine, Deployment.runner_id.in_(runner_ids))
+        .order_by(Deployment.started_at.desc())
+        .limit(1)
+    )
+
+
+def cancelled_ids(deployment_ids, runner_ids):
+    """Deployments among deployment_ids that are no longer Running on these runners (stopped or re-queued)."""
+    if not deployment_ids:
+        return []
+    still_running = set(db.session.scalars(
+        db.select(Deployment.id).where(Deployment.id.in_(deployment_ids), Deployment.status == 'Running',
+                                       Deployment.runner_id.in_(runner_ids))
+    ))
+    return [deployment_id for deployment_id in deployment_ids if deployment_id not in still_running]
+
+
+def reap_stale_runners(timeout_seconds):
+    """Marks runners without a recent heartbeat offline and re-queues their deployments."""
+    cutoff = datetime.utcnow() - timedelta(seconds=timeout_seconds)
+    stale = db.session.scalars(
+        db.select(Runner.id).where(Runner.status == 'online', Runner.last_heartbeat < cutoff)
+    ).all()
+    if not stale:
+        return 0
+    db.session.execute(db.update(Runner).where(Runner.id.in_(stale)).values(status='offline'))
+    return requeue([Deployment.runner_id.in_(stale)])
+
+
+# --- STATISTICS ---
+def _percentile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def queue_stats():
+    now = datetime.utcnow()
+    depth, oldest = db.session.execute(
+        db.select(db.func.count(), db.func.min(Deployment.queued_at)).where(Deployment.status == 'Queued')
+    ).one()
+    recent = db.session.execute(
+        db.select(Deployment.queued_at, Deployment.started_at)
+        .where(Deployment.queued_at.is_not(None), Deployment.started_at.is_not(None))
+        .order_by(Deployment.id.desc()).limit(WAIT_SAMPLE)
+    ).all()
+    waits = sorted(max(0, int((started - queued).total_seconds() * 1000)) for queued, started in recent)
+    wait_ms = None
+    if waits:
+        wait_ms = {'count': len(waits), 'mean': round(sum(waits) / len(waits)), 'p50': _percentile(waits, 0.5),
+                   'p90': _percentile(waits, 0.9), 'max': waits[-1]}
+    return {
+        'depth': depth,
+        'oldest_wait_ms': int((now - oldest).total_seconds() * 1000) if oldest else 0,
+        'wait_ms': wait_ms,
+    }
+
+
+def runner_stats(timeout_seconds):
+    cutoff = datetime.utcnow() - timedelta(seconds=timeout_seconds)
+    runners = db.session.execute(
+        db.select(Runner.id, Runner.name, Runner.host, Runner.pid, Runner.slots, Runner.last_heartbeat)
+        .where(Runner.status == 'online', Runner.last_heartbeat >= cutoff)
+        .order_by(Runner.name)
+    ).mappings().all()
+    # Runners are shared by every tenant: slot usage counts all of them (one cached value for everyone)
+    busy = dict(db.session.execute(
+        db.select(Deployment.runner_id, db.func.count())
+        .where(Deployment.status == 'Running', Deployment.runner_id.is_not(None))
+        .group_by(Deployment.runner_id)
+        .execution_options(all_tenants=True)
+    ).all())
+    rows = [{**runner, 'busy': busy.get(runner['id'], 0)} for runner in runners]
+    slots = sum(row['slots'] for row in rows)
+    used = sum(row['busy'] for row in rows)
+    return {
+        'runners': rows,
+        'slots': slots,
+        'busy': used,
+        'utilisation': round(used / slots, 3) if slots else 0.0,
+    }
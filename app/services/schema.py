@@ -0,0 +1,96 @@
+from sqlalchemy import inspect, text, bindparam
+from app import db
+from app.database.models import Tenant, Project, Deployment
+from app.services.rollups import duration_ms
+from app.services.tenancy import slugify
+
+
+def missing_columns(engine):
+    """Model columns absent from tables that already exist (create_all never ALTERs a table)."""
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if table.name in tables:
+            present = {column['name'] for column in inspector.get_columns(table.name)}
+            missing.extend(column for column in table.columns if column.name not in present)
+    return missing
+
+
+def _column_ddl(column, dialect):
+    # Added as nullable: SQLite refuses NOT NULL without a default, the rows are backfilled first
+    ddl = f'{column.name} {column.type.compile(dialect=dialect)}'
+    for fk in column.foreign_keys:
+        ddl += f' REFERENCES {fk.column.table.name} ({fk.column.name})'
+        if fk.ondelete:
+            ddl += f' ON DELETE {fk.ondelete}'
+    return ddl
+
+
+def _create_indexes(connection):
+    inspector = inspect(connection)
+    for table in db.metadata.sorted_tables:
+        present = {index['name'] for index in inspector.get_indexes(table.name)}
+        present |= {constraint['name'] for constraint in inspector.get_unique_constraints(table.name)}
+        for index in table.indexes:
+            if index.name not in present:
+                index.create(connection)
+        for constraint in table.constraints:
+            if isinstance(constraint, db.UniqueConstraint) and constraint.name and constraint.name not in present:
+                # SQLite cannot ALTER a constraint in: a unique index enforces the same rule
+                columns = ', '.join(column.name for column in constraint.columns)
+                connection.execute(text(f'CREATE UNIQUE INDEX {constraint.name} ON {table.name} ({columns})'))
+
+
+def _backfill_tenants(connection):
+    # Same rule as the ORM's before_flush: a project joins (or creates) the tenant slugified from client_name
+    projects, tenants = Project.__table__, Tenant.__table__
+    names = connection.scalars(db.select(projects.c.client_name).where(projects.c.tenant_id.is_(None)).distinct()).all()
+    for name in names:
+        slug = slugify(name)
+        tenant_id = connection.scalar(db.select(tenants.c.id).where(tenants.c.slug == slug))
+        if tenant_id is None:
+            tenant_id = connection.execute(tenants.insert().values(slug=slug, name=name)).inserted_primary_key[0]
+        connection.execute(projects.update()
+                           .where(projects.c.client_name == name, projects.c.tenant_id.is_(None))
+                           .values(tenant_id=tenant_id))
+
+    deployments = Deployment.__table__
+    project_tenant = db.select(projects.c.tenant_id).where(projects.c.id == deployments.c.project_id).scalar_subquery()
+    connection.execute(deployments.update().where(deployments.c.tenant_id.is_(None)).values(tenant_id=project_tenant))
+    return len(names)
+
+
+def _backfill_durations(connection):
+    deployments = Deployment.__table__
+    rows = connection.execute(db.select(deployments.c.id, deployments.c.started_at, deployments.c.ended_at)
+                              .where(deployments.c.duration_ms.is_(None), deployments.c.ended_at.is_not(None))).all()
+    if rows:
+        connection.execute(deployments.update().where(deployments.c.id == bindparam('row_id'))
+                           .values(duration_ms=bindparam('duration')),
+                           [{'row_id': row.id, 'duration': duration_ms(row.started_at, row.ended_at)} for row in rows])
+    return len(rows)
+
+
+def upgrade(engine):
+    """Brings a database created by an older version up to the models, in one transaction.
+
+    Returns (added columns, tenants backfilled, durations backfilled); safe to run again.
+    """
+    missing = missing_columns(engine)
+    with engine.begin() as connection:
+        db.metadata.create_all(connection)
+        for column in missing:
+            connection.execute(text(f'ALTER TABLE {column.table.name} ADD COLUMN {_column_ddl(column, connection.dialect)}'))
+        for column in missing:
+            default = column.default
+            if default is not None and default.is_scalar:
+                connection.execute(column.table.update().where(column.is_(None)).values({column.name: default.arg}))
+        tenants = _backfill_tenants(connection)
+        durations = _backfill_durations(connection)
+        if connection.dialect.name != 'sqlite':
+            for column in missing:
+                if not column.nullable:
+                    connection.execute(text(f'ALTER TABLE {column.table.name} ALTER COLUMN {column.name} SET NOT NULL'))
+        _create_indexes(connection)
+    return missing, tenants, durations
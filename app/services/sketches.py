@@ -0,0 +1,165 @@
+import json
+import math
+from datetime import datetime
+from app.database.models import DurationSketch
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class DDSketch:
+    """Mergeable quantile sketch with bounded relative error (DDSketch).
+
+    Values land in logarithmic buckets of ratio gamma, so any quantile is
+    returned within ``relative_accuracy`` of the true value, whatever the
+    number of samples. Two sketches with the same accuracy merge by adding
+    bucket counts.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_bins=2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, index):
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, value, weight=1):
+        if value < 0:
+            raise ValueError('DDSketch only accepts non-negative values')
+        if value == 0:
+            self.zero_count += weight
+        else:
+            index = self._index(value)
+            self.bins[index] = self.bins.get(index, 0) + weight
+            self._collapse()
+        self.count += weight
+        self.sum += value * weight
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def _collapse(self):
+        # Past max_bins the lowest buckets fold together: only the fastest values lose precision
+        while len(self.bins) > self.max_bins:
+            lowest, second = sorted(self.bins)[:2]
+            self.bins[second] += self.bins.pop(lowest)
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError('Cannot merge sketches with different accuracy')
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self._collapse()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return min(max(self._value(index), self.min), self.max)
+        return self.max
+
+    def to_json(self):
+        return json.dumps({
+            'a': self.relative_accuracy, 'b': {str(k): v for k, v in self.bins.items()}, 'z': self.zero_count,
+            'n': self.count, 's': self.sum, 'min': self.min, 'max': self.max,
+        })
+
+    @classmethod
+    def from_json(cls, raw):
+        data = json.loads(raw)
+        sketch = cls(data['a'])
+        sketch.bins = {int(k): v for k, v in data['b'].items()}
+        sketch.zero_count = data['z']
+        sketch.count = data['n']
+        sketch.sum = data['s']
+        sketch.min = data['min']
+        sketch.max = data['max']
+        return sketch
+
+
+def summary(sketch):
+    if sketch is None or not sketch.count:
+        return None
+    result = {'count': sketch.count, 'min': sketch.min, 'max': sketch.max, 'mean': round(sketch.sum / sketch.count)}
+    for q in QUANTILES:
+        result[f'p{int(q * 100)}'] = round(sketch.quantile(q))
+    return result
+
+
+# --- PERSISTENCE ---
+def stack_scope(stack, tenant_id=None):
+    """(scope, key) of a stack's sketch: the tenant's own, or the all-tenant one when tenant_id is None."""
+    if tenant_id is None:
+        return 'stack', stack
+    return 'tenant_stack', f'{tenant_id}:{stack}'
+
+
+def _scopes(project_id, stack, tenant_id):
+    scopes = [('project', str(project_id)), stack_scope(stack)]
+    if tenant_id is not None:
+        scopes.append(stack_scope(stack, tenant_id))
+    return scopes
+
+
+def record_duration(session, project_id, stack, duration_ms, tenant_id=None):
+    """Adds one duration to the project and stack sketches within the caller's transaction.
+
+    The deployment row must already be flushed: on SQLite the write lock is then
+    held, and on other databases the rows are read FOR UPDATE, so concurrent
+    workers cannot lose each other's samples.
+    """
+    if duration_ms is None:
+        return
+    for scope, key in _scopes(project_id, stack, tenant_id):
+        row = session.query(DurationSketch).filter_by(scope=scope, scope_key=key).with_for_update().first()
+        if row is None:
+            row = DurationSketch(scope=scope, scope_key=key)
+            session.add(row)
+            sketch = DDSketch()
+        else:
+            sketch = DDSketch.from_json(row.data)
+        sketch.add(duration_ms)
+        row.data = sketch.to_json()
+        row.count = sketch.count
+        row.updated_at = datetime.utcnow()
+
+
+def load(session, scope, key):
+    row = session.query(DurationSketch).filter_by(scope=scope, scope_key=str(key)).first()
+    return DDSketch.from_json(row.data) if row else None
+
+
+def rebuild(session, rows):
+    """Recomputes every sketch from (project_id, tenant_id, stack, duration_ms) rows."""
+    sketches = {}
+    for project_id, tenant_id, stack, duration in rows:
+        if duration is None:
+            continue
+        for key in _scopes(project_id, stack, tenant_id):
+            sketches.setdefault(key, DDSketch()).add(duration)
+    session.query(DurationSketch).delete()
+    now = datetime.utcnow()
+    session.add_all(DurationSketch(scope=scope, scope_key=key, data=sketch.to_json(), count=sketch.count, updated_at=now)
+                    for (scope, key), sketch in sketches.items())
+    return len(sketches)
@@ -0,0 +1,83 @@
+import re
+import unicodedata
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import Column, Integer, event
+from sqlalchemy.orm import Session, with_loader_criteria
+
+# Tenant of the current request (Flask thread or FastAPI task); None = not scoped
+_current_tenant = ContextVar('current_tenant', default=None)
+
+
+class TenantScoped:
+    """Mixin for models carrying a tenant_id: every ORM query is filtered to the current tenant."""
+
+    # Each model declares its own tenant_id; this one only lets the criteria lambda be analysed on the mixin
+    tenant_id = Column(Integer)
+
+
+def slugify(name):
+    ascii_name = unicodedata.normalize('NFKD', name or '').encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', '-', ascii_name.lower()).strip('-') or 'tenant'
+
+
+def current_tenant_id():
+    return _current_tenant.get()
+
+
+def activate_tenant(tenant_id):
+    """Scopes the rest of the current context (request thread or task); returns a reset token."""
+    return _current_tenant.set(tenant_id)
+
+
+@contextmanager
+def tenant_scope(tenant_id):
+    """Runs the block scoped to tenant_id (None lifts the scope)."""
+    token = _current_tenant.set(tenant_id)
+    try:
+        yield
+    finally:
+        _current_tenant.reset(token)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _apply_tenant_criteria(execute_state):
+    # Registered on the base Session class, so the async API tier's sessions are scoped too
+    tenant_id = _current_tenant.get()
+    if tenant_id is None or execute_state.is_column_load or execute_state.execution_options.get('all_tenants'):
+        return
+    execute_state.statement = execute_state.statement.options(
+        with_loader_criteria(TenantScoped, lambda cls: cls.tenant_id == tenant_id, include_aliases=True)
+    )
+
+
+class Tenancy:
+    """Scopes each request to the user's tenant; staff users (no tenant) may pick one to browse."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['tenancy'] = self
+        app.before_request(self._enter)
+        app.teardown_request(self._exit)
+
+    @staticmethod
+    def resolve(user, session):
+        if not user.is_authenticated:
+            return None
+        return user.tenant_id or session.get('tenant_id')
+
+    def _enter(self):
+        from flask import g, session
+        from flask_login import current_user
+
+        g.tenant_token = activate_tenant(self.resolve(current_user, session))
+
+    def _exit(self, exc=None):
+        from flask import g
+
+        token = g.pop('tenant_token', None)
+        if token is not None:
+            _current_tenant.reset(token)
@@ -0,0 +1,299 @@
+import hashlib
+import hmac
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+from datetime import datetime
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+# Header names per CI: (event, delivery id, trigger label)
+SOURCES = {
+    'gitlab': ('X-Gitlab-Event', 'X-Gitlab-Event-UUID', 'GitLab Hook'),
+    'github': ('X-GitHub-Event', 'X-GitHub-Delivery', 'GitHub Hook'),
+}
+# Events that deploy when they touch one of WEBHOOK_DEPLOY_REFS
+PUSH_EVENTS = ('Push Hook', 'push')
+SYSTEM_USERNAME = 'ci-webhook'
+
+
+class InvalidWebhook(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _text(payload, *names):
+    """First non-empty of payload's string fields names; a field of any other type is a bad request."""
+    for name in names:
+        value = payload.get(name)
+        if value is not None and not isinstance(value, str):
+            raise InvalidWebhook(f'Champ {name} invalide')
+        if value:
+            return value
+    return ''
+
+
+def project_secret(secret_key, project_id):
+    """Per-project webhook secret, derived from SECRET_KEY so verifying a call needs no database lookup."""
+    return hmac.new(secret_key.encode(), f'webhook:{project_id}'.encode(), hashlib.sha256).hexdigest()
+
+
+def _raw(header):
+    return header.encode('utf-8', 'surrogateescape')
+
+
+def sign(secret, body):
+    return 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def _insert(dialect_name):
+    return postgresql.insert if dialect_name == 'postgresql' else sqlite.insert
+
+
+class WebhookIngestor:
+    """Receives CI webhooks: verify and enqueue in the request, commit in batches on a background thread.
+
+    The request path never touches the database, so a burst of pushes is
+    acknowledged at memory speed. One flusher thread per process drains the
+    queue in batches of up to WEBHOOK_BATCH_SIZE events (one insert and commit
+    per batch, duplicates dropped by delivery id) and queues at most one
+    deployment per project per batch. A full queue answers 503 so the CI retries later.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._queue = None
+        self._secrets = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._user_id = None
+        self._counters = dict.fromkeys(('accepted', 'rejected', 'dropped', 'duplicates', 'ignored', 'committed',
+                                        'deployments', 'batches', 'errors'), 0)
+        self._last_batch = {'size': 0, 'ms': 0.0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['webhooks'] = self
+        self._queue = queue.Queue(maxsize=app.config['WEBHOOK_QUEUE_SIZE'])
+        app.extensions['lifecycle'].on_shutdown(self.stop)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    # --- RECEIVING ---
+    def secret(self, project_id):
+        secret = self._secrets.get(project_id)
+        if secret is None:
+            secret = self._secrets[project_id] = project_secret(self.app.config['SECRET_KEY'], project_id)
+        return secret
+
+    def verify(self, project_id, headers, body):
+        """Returns the CI source ('gitlab' or 'github') of an authentic call, raises InvalidWebhook otherwise."""
+        secret = self.secret(project_id)
+        signature = headers.get('X-Hub-Signature-256')
+        token = headers.get('X-Gitlab-Token')
+        # Compared as bytes: compare_digest refuses non-ASCII str, which any caller can send
+        if signature is not None:
+            valid, source = hmac.compare_digest(_raw(signature), sign(secret, body).encode()), 'github'
+        elif token is not None:
+            valid, source = hmac.compare_digest(_raw(token), secret.encode()), 'gitlab'
+        else:
+            valid, source = False, None
+        if not valid:
+            self._count('rejected')
+            raise InvalidWebhook('Signature invalide', 401)
+        return source
+
+    def submit(self, project_id, headers, body):
+        """Verifies and enqueues one delivery; returns its delivery id."""
+        source = self.verify(project_id, headers, body)
+        event_header, delivery_header, _ = SOURCES[source]
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            raise InvalidWebhook('Corps JSON invalide')
+        if not isinstance(payload, dict):
+            raise InvalidWebhook('Corps JSON invalide')
+        # Retries of the same delivery reuse its id; without one, identical bodies count as the same event
+        delivery_id = headers.get(delivery_header) or hashlib.sha256(body).hexdigest()
+        event = {
+            'delivery_id': f'{source}:{delivery_id}'[:100],
+            'project_id': project_id,
+            'source': source,
+            'event': (headers.get(event_header) or _text(payload, 'object_kind') or 'unknown')[:50],
+            'ref': _text(payload, 'ref')[:200] or None,
+            'commit_sha': _text(payload, 'checkout_sha', 'after')[:64] or None,
+            'received_at': datetime.utcnow(),
+        }
+        self.ensure_started()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self._count('dropped')
+            raise InvalidWebhook('File des webhooks pleine, réessayez plus tard', 503)
+        self._count('accepted')
+        return event['delivery_id']
+
+    # --- FLUSHING ---
+    @property
+    def started(self):
+        return self._thread is not None and self._pid == os.getpid()
+
+    def ensure_started(self):
+        if not self.started:
+            with self._lock:
+                if not self.started:
+                    self._pid = os.getpid()
+                    self._stopping.clear()
+                    self._thread = threading.Thread(target=self._loop, name='webhook-flusher', daemon=True)
+                    self._thread.start()
+
+    def _take(self, timeout):
+        """Blocks for the first event, then takes whatever else is already queued (up to one batch)."""
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        limit = self.app.config['WEBHOOK_BATCH_SIZE']
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        from app import db
+
+        interval = self.app.config['WEBHOOK_FLUSH_SECONDS']
+        with self.app.app_context():
+            while not (self._stopping.is_set() and self._queue.empty()):
+                batch = self._take(interval)
+                if not batch:
+                    continue
+                for attempt in range(2):
+                    try:
+                        self._flush(batch)
+                        break
+                    except Exception:
+                        db.session.rollback()
+                        if attempt:
+                            self._count('errors', len(batch))
+                            self.app.logger.exception('Lot de %s webhooks perdu', len(batch))
+                    finally:
+                        db.session.remove()
+                # Under load the queue refills while a batch commits, so batches grow with the arrival rate
+                if len(batch) < self.app.config['WEBHOOK_BATCH_SIZE'] and not self._stopping.is_set():
+                    time.sleep(interval)
+
+    def _system_user_id(self):
+        from app import db
+        from app.database.models import User
+
+        if self._user_id is None:
+            user = User.query.filter_by(username=SYSTEM_USERNAME).first()
+            if user is None:
+                user = User(username=SYSTEM_USERNAME, email=f'{SYSTEM_USERNAME}@devops.local')
+                # Nobody signs in as the webhook user
+                user.set_password(secrets.token_urlsafe(32))
+                db.session.add(user)
+                try:
+                    db.session.commit()
+                except IntegrityError:
+                    # Another worker created it first
+                    db.session.rollback()
+                    user = User.query.filter_by(username=SYSTEM_USERNAME).one()
+            self._user_id = user.id
+        return self._user_id
+
+    def _flush(self, batch):
+        from app import db, runners
+        from app.database.models import Project, WebhookEvent
+        from app.services import deployments
+
+        started = time.perf_counter()
+        config = self.app.config
+        unique = {event['delivery_id']: event for event in batch}
+        seen = set(db.session.scalars(
+            db.select(WebhookEvent.delivery_id).where(WebhookEvent.delivery_id.in_(list(unique)))
+        ))
+        projects = {project.id: project for project in db.session.scalars(
+            db.select(Project).where(Project.id.in_({event['project_id'] for event in unique.values()}))
+        )}
+        events = [event for key, event in unique.items() if key not in seen and event['project_id'] in projects]
+        duplicates = len(batch) - len(unique) + len(seen & unique.keys())
+
+        # One deployment request per project per batch; the newest push names the trigger
+        deploys = {}
+        for event in events:
+            if event['event'] in PUSH_EVENTS and event['ref'] in config['WEBHOOK_DEPLOY_REFS']:
+                deploys[event['project_id']] = event
+        queued = []
+        if deploys:
+            user_id = self._system_user_id()
+            for project_id, event in deploys.items():
+                deployment, outcome = deployments.request_deployment(
+                    db.session, projects[project_id], user_id, SOURCES[event['source']][2],
+                    policy=config['DEPLOY_COALESCE_POLICY'])
+                event['deployment_id'] = deployment.id
+                # Committed one by one: a coalescing retry rolls back the session, which must not undo other projects
+                db.session.commit()
+                if outcome != 'joined':
+                    queued.append(project_id)
+
+        if events:
+            rows = [{'deployment_id': None, **event} for event in events]
+            db.session.execute(
+                _insert(db.engine.dialect.name)(WebhookEvent).on_conflict_do_nothing(index_elements=['delivery_id']),
+                rows,
+            )
+        db.session.commit()
+        for project_id in queued:
+            deployments.invalidate(project_id)
+        if queued:
+            runners.notify()
+
+        with self._lock:
+            self._counters['committed'] += len(events)
+            self._counters['duplicates'] += duplicates
+            # Events for projects deleted since the secret was issued
+            self._counters['ignored'] += len(batch) - duplicates - len(events)
+            self._counters['deployments'] += len(queued)
+            self._counters['batches'] += 1
+            self._last_batch = {'size': len(batch), 'ms': round((time.perf_counter() - started) * 1000, 2)}
+
+    # --- STATISTICS ---
+    def stats(self):
+        with self._lock:
+            return {**self._counters, 'queued': self._queue.qsize(), 'last_batch': dict(self._last_batch)}
+
+    def wait_idle(self, timeout=30):
+        """Blocks until every accepted event is committed or dropped (benchmarks, shutdown)."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                settled = self._counters['committed'] + self._counters['duplicates'] + \
+                    self._counters['ignored'] + self._counters['errors']
+                if settled >= self._counters['accepted']:
+                    return True
+            time.sleep(0.01)
+        return False
+
+    # --- SHUTDOWN ---
+    def stop(self, deadline=None):
+        """Lifecycle hook: commits what is still queued before the worker exits."""
+        if not self.started:
+            return
+        self._stopping.set()
+        self._thread.join(timeout=max(1.0, deadline - time.monotonic()) if deadline else 10)
+        self._thread = None
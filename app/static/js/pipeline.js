@@ -1,10 +1,210 @@
 console.log('Centre DevOps Pipeline Manager Chargé');
 
-// Placeholder for pipeline management functions
-function triggerDeploy(projectId) {
-    console.log('Déclenchement du déploiement pour le projet:', projectId);
+// Read-only JSON API (/api/v1): request only the fields a view needs
+function apiGet(resource, params = {}) {
+    const query = new URLSearchParams();
+    for (const [key, value] of Object.entries(params)) {
+        if (value === undefined || value === null) continue;
+        query.set(key, Array.isArray(value) ? value.join(',') : value);
+    }
+    const qs = query.toString();
+    return fetch(`/api/v1/${resource}${qs ? '?' + qs : ''}`, { credentials: 'same-origin' })
+        .then(response => {
+            if (!response.ok) throw new Error(`API ${response.status}`);
+            return response.json();
+        });
 }
 
+// Walks every page of a listing by following next_cursor
+async function apiListAll(resource, params = {}) {
+    const rows = [];
+    let cursor = null;
+    do {
+        const page = await apiGet(resource, { ...params, cursor });
+        rows.push(...page.data);
+        cursor = page.next_cursor;
+    } while (cursor);
+    return rows;
+}
+
+// Longest a log request waits on the server for new output (capped server-side)
+const LOG_WAIT_SECONDS = 20;
+
+function resetDeployButton(btn) {
+    btn.disabled = false;
+    btn.innerHTML = '🚀 Déclencher Déploiement';
+}
+
+function showDeploymentResult(deployment, badge, logBox) {
+    if (deployment.status === 'Success') {
+        badge.className = 'badge bg-success fs-6';
+        badge.innerText = 'En cours';
+        logBox.style.border = "2px solid #198754";
+    } else if (deployment.status === 'Stopped') {
+        badge.className = 'badge bg-secondary fs-6';
+        badge.innerText = 'Arrêté';
+        logBox.style.border = "2px solid #6c757d";
+    } else {
+        badge.className = 'badge bg-danger fs-6';
+        badge.innerText = 'Erreur';
+        logBox.style.border = "2px solid #dc3545";
+    }
+}
+
+// --- LOG TAIL ---
+// Only one deployment log is followed per page; starting another cancels the previous one
+let activeTail = null;
+
+// Follows a deployment's log until nothing more will be appended. Each long-poll
+// returns only the bytes written after `offset`; the new offset, status and
+// completion flag come back in headers. onStatus runs while no output has arrived.
+async function tailDeploymentLog(deploymentId, logBox, onStatus = () => {}) {
+    if (activeTail) activeTail.abort();
+    const controller = activeTail = new AbortController();
+    let offset = 0;
+    let status = null;
+    let received = false;
+    for (;;) {
+        const response = await fetch(`/api/deployment/${deploymentId}/log?since=${offset}&wait=${LOG_WAIT_SECONDS}`,
+                                     { credentials: 'same-origin', signal: controller.signal });
+        if (response.status === 416) {
+            // Offset past the end (log replaced): start over
+            offset = 0;
+            received = false;
+            continue;
+        }
+        if (!response.ok) throw new Error(`API ${response.status}`);
+        const chunk = await response.text();
+        if (chunk) {
+            if (!received) logBox.textContent = '';
+            received = true;
+            logBox.append(chunk);
+            logBox.scrollTop = logBox.scrollHeight;
+        }
+        offset = Number(response.headers.get('X-Log-Offset'));
+        const current = response.headers.get('X-Deployment-Status');
+        if (current !== status) {
+            status = current;
+            if (!received) onStatus(status);
+        }
+        if (response.headers.get('X-Log-Complete') === '1') {
+            if (activeTail === controller) activeTail = null;
+            return status;
+        }
+        const retryAfter = response.headers.get('Retry-After');
+        if (!chunk && retryAfter) {
+            // The server had no waiting slot left: it answered at once, poll again later
+            await new Promise(resolve => setTimeout(resolve, Number(retryAfter) * 1000));
+            if (controller.signal.aborted) throw new DOMException('Aborted', 'AbortError');
+        }
+    }
+}
+
+// Detail page: reopening a deployment streams its log instead of fetching it whole
+function followLatestDeployment(logBox) {
+    tailDeploymentLog(logBox.dataset.deploymentId, logBox, status => {
+        if (status === 'Queued') logBox.textContent = `> Déploiement #${logBox.dataset.deploymentId} en file...`;
+        if (status === 'Running') logBox.textContent = `> Déploiement #${logBox.dataset.deploymentId} en cours...`;
+    }).catch(err => { if (err.name !== 'AbortError') console.error(err); });
+}
+
+// Deploy button on the project detail page
+async function triggerDeploy(projectId) {
+    const btn = document.getElementById('deployBtn');
+    const logBox = document.getElementById('consoleLogs');
+    const badge = document.getElementById('statusBadge');
+    const runnerBadge = document.getElementById('runnerBadge');
+    const stopBtn = document.getElementById('stopBtn');
+    const priority = document.getElementById('deployPriority');
+
+    btn.disabled = true;
+    btn.innerHTML = '<span class="spinner-border spinner-border-sm"></span> Pipeline En cours...';
+    logBox.innerHTML = '> Mise en file du déploiement...';
+    logBox.className = 'console-logs';
+
+    try {
+        // One key per click: a retried request returns the same deployment instead of queueing another
+        const response = await fetch(`/api/deploy/${projectId}`, {
+            method: 'POST',
+            headers: { 'Idempotency-Key': crypto.randomUUID(), 'Content-Type': 'application/json' },
+            body: JSON.stringify({ priority: priority ? priority.value : 'normal' }),
+        });
+        const queued = await response.json();
+        if (response.status === 429) {
+            // Turned away by admission control before anything was queued
+            logBox.textContent = `> ${queued.error}`;
+            resetDeployButton(btn);
+            return;
+        }
+        if (!response.ok) throw new Error(queued.error || `API ${response.status}`);
+        logBox.innerHTML = queued.outcome === 'joined'
+            ? `> Un déploiement identique (#${queued.deployment_id}) est déjà en cours, suivi de celui-ci...`
+            : `> Déploiement #${queued.deployment_id} en file (position ${queued.queue_position})...`;
+        if (stopBtn) {
+            stopBtn.onclick = () => stopDeployment(queued.deployment_id);
+            stopBtn.classList.remove('d-none');
+        }
+
+        await tailDeploymentLog(queued.deployment_id, logBox, status => {
+            if (status === 'Running') {
+                logBox.innerHTML = `> Déploiement #${queued.deployment_id} pris en charge par un runner...`;
+            }
+        });
+        const { data: deployment } = await apiGet(`deployments/${queued.deployment_id}`, { fields: ['status', 'runner_id'] });
+        const runners = await apiGet('runners');
+        const runner = runners.data.runners.find(r => r.id === deployment.runner_id);
+        if (runner && runnerBadge) runnerBadge.innerText = runner.name;
+        showDeploymentResult(deployment, badge, logBox);
+    } catch (err) {
+        if (err.name === 'AbortError') return;
+        console.error(err);
+        logBox.innerHTML = "[ERREUR] Impossible de contacter l'API.";
+    }
+    if (stopBtn) stopBtn.classList.add('d-none');
+    resetDeployButton(btn);
+}
+
+// The runner interrupts the pipeline; the polling loop then shows the partial log
 function stopDeployment(deploymentId) {
-    console.log('Arrêt du déploiement:', deploymentId);
+    return fetch(`/api/deploy/${deploymentId}/stop`, { method: 'POST' })
+        .then(response => response.json())
+        .then(data => { if (data.error) console.warn(data.error); });
 }
+
+// --- LIVE DASHBOARD ---
+// Same labels as the server-rendered badges in home.html
+const PROJECT_BADGES = {
+    Running: ['bg-success', 'En cours'],
+    Stopped: ['bg-secondary', 'Arrêté'],
+};
+
+function applyProjectDelta(delta) {
+    const badge = document.querySelector(`[data-project-status="${delta.id}"]`);
+    if (!badge) return;  // Created after the page was rendered
+    const [cls, label] = PROJECT_BADGES[delta.status] || ['bg-danger', 'Erreur'];
+    badge.className = `badge ${cls}`;
+    badge.innerText = label;
+    const lastDeploy = document.querySelector(`[data-project-last-deploy="${delta.id}"]`);
+    if (lastDeploy && delta.last_deploy) {
+        lastDeploy.innerText = delta.last_deploy.slice(0, 16).replace('T', ' ');
+    }
+}
+
+// One EventSource per dashboard; the browser reconnects by itself after a drop
+function connectStatusStream(grid) {
+    if (!window.EventSource) return;
+    const source = new EventSource(grid.dataset.streamUrl);
+    source.addEventListener('status', event => JSON.parse(event.data).forEach(applyProjectDelta));
+    // The server dropped deltas for this page (it fell behind): start from a fresh render
+    source.addEventListener('resync', () => {
+        source.close();
+        window.location.reload();
+    });
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    const grid = document.getElementById('projectsGrid');
+    if (grid) connectStatusStream(grid);
+    const logBox = document.getElementById('consoleLogs');
+    if (logBox && logBox.dataset.deploymentId) followLatestDeployment(logBox);
+});
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from fastapi import Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from flask.sessions import SecureCookieSessionInterface
+from itsdangerous import BadSignature
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import cache
+from app.database.models import User, OutboxEvent
+from app.services.tenancy import Tenancy, activate_tenant
+from backend.database import flask_app, get_session, SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Reads the session cookie issued by the Flask login view: one login works for both tiers
+_session_interface = SecureCookieSessionInterface()
+_serializer = _session_interface.get_signing_serializer(flask_app)
+_max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+
+
+def flask_session(request: Request):
+    cookie = request.cookies.get(flask_app.config.get('SESSION_COOKIE_NAME', 'session'))
+    if not cookie:
+        return {}
+    try:
+        return _serializer.loads(cookie, max_age=_max_age)
+    except BadSignature:
+        return {}
+
+
+def session_user_id(request: Request):
+    user_id = flask_session(request).get('_user_id')
+    return int(user_id) if user_id is not None else None
+
+
+async def current_user(request: Request, session: AsyncSession = Depends(get_session)):
+    user_id = session_user_id(request)
+    if user_id is None:
+        raise HTTPException(status_code=401, detail='Authentification requise')
+    # Same cached identity as the Flask user loader, so most requests skip the SELECT.
+    # The cache client blocks (filesystem / Redis backends): it runs off the event loop
+    identity = await run_in_threadpool(cache.get, f'user:{user_id}')
+    if identity is None:
+        row = (await session.execute(
+            select(User.id, User.username, User.email, User.tenant_id, User.created_at).where(User.id == user_id)
+        )).mappings().first()
+        if row is None:
+            raise HTTPException(status_code=401, detail='Authentification requise')
+        identity = dict(row)
+        await run_in_threadpool(cache.set, f'user:{user_id}', identity, timeout=600, tags=('users',))
+    user = User(**identity)
+    # Same tenant scope as the Flask request hook, for the rest of this request's task
+    activate_tenant(Tenancy.resolve(user, flask_session(request)))
+    return user
+
+
+async def watch_identities():
+    """Drops cached identities changed by other processes ('user' outbox events, e.g. a new tenant).
+
+    This tier has no event bus: the outbox is polled instead. Each poll re-reads
+    the last OUTBOX_GAP_SECONDS as well, so rows committed late are not missed
+    (dropping an entry twice is harmless).
+    """
+    config = flask_app.config
+    since = datetime.utcnow()
+    while True:
+        await asyncio.sleep(config['OUTBOX_POLL_SECONDS'])
+        started = datetime.utcnow()
+        try:
+            async with SessionLocal() as session:
+                user_ids = (await session.scalars(
+                    select(OutboxEvent.key).distinct()
+                    .where(OutboxEvent.topic == 'user',
+                           OutboxEvent.created_at >= since - timedelta(seconds=config['OUTBOX_GAP_SECONDS']))
+                )).all()
+            for user_id in user_ids:
+                await run_in_threadpool(cache.delete, f'user:{user_id}')
+            since = started
+        except Exception:
+            logger.exception('Suivi des identités')
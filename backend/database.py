@@ -0,0 +1,47 @@
+import os
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from config import Config
+from app import cache
+from app.database.models import configure_sqlite
+
+# Same import name as create_app(), so the relative SQLite path and the cache
+# directory resolve to the same instance folder as the Flask application.
+flask_app = Flask('app')
+flask_app.config.from_object(Config)
+cache.init_app(flask_app)
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql',
+}
+
+
+def async_database_url(uri, instance_path):
+    url = make_url(uri)
+    if url.drivername.startswith('sqlite') and url.database and url.database != ':memory:':
+        if not os.path.isabs(url.database):
+            url = url.set(database=os.path.join(instance_path, url.database))
+    backend = url.drivername.split('+', 1)[0]
+    return url.set(drivername=ASYNC_DRIVERS.get(backend, url.drivername))
+
+
+database_url = async_database_url(Config.SQLALCHEMY_DATABASE_URI, flask_app.instance_path)
+engine = create_async_engine(
+    database_url,
+    echo=Config.SQLALCHEMY_ECHO,
+    # Same lock timeout as the Flask engine: both tiers write to the same SQLite file
+    **(Config.SQLALCHEMY_ENGINE_OPTIONS if database_url.get_backend_name() == 'sqlite' else {}),
+)
+if engine.dialect.name == 'sqlite':
+    # Same pragmas as the Flask engine (foreign keys, WAL) on the aiosqlite connections
+    event.listen(engine.sync_engine, 'connect', lambda dbapi_connection, record: configure_sqlite(dbapi_connection))
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+
+async def get_session():
+    async with SessionLocal() as session:
+        yield session
@@ -1,7 +1,215 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime
+from fastapi import FastAPI, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import cache
+from app.database.models import Project, Deployment
+from app.routes.api import RESOURCES
+from app.services.pipeline import FINAL_STATUSES, PRIORITIES, DEFAULT_PRIORITY
+from app.services import deployments
+from app.services.rollups import rollup_statements, duration_ms
+from app.services.events import deployment_event, project_event
+from app.services.logtail import parse_range, log_state_query, tail_response
+from app.services.admission import AdmissionControl, Rejected, queue_depth_query
+from backend.auth import current_user, session_user_id, watch_identities
+from backend.database import get_session, flask_app, SessionLocal
+
+logger = logging.getLogger(__name__)
+admission = AdmissionControl()
+admission.configure(flask_app.config)
+
+
+async def _probe_queue_depth():
+    # No event bus in this tier: the queue depth admission control needs is recounted periodically
+    while True:
+        try:
+            async with SessionLocal() as session:
+                admission.queue_depth = await session.scalar(queue_depth_query())
+        except Exception:
+            logger.exception('Sonde de la file de déploiement')
+        await asyncio.sleep(flask_app.config['ADMISSION_DEPTH_POLL_SECONDS'])
+
+
+@asynccontextmanager
+async def lifespan(app):
+    tasks = [asyncio.create_task(_probe_queue_depth())] if admission.enabled else []
+    if not cache.shared:
+        # Per-process cache: identities changed elsewhere must be dropped here too
+        tasks.append(asyncio.create_task(watch_identities()))
+    yield
+    for task in tasks:
+        task.cancel()
+
+
+# High-concurrency API tier: same models, same database and same login session
+# as the Flask application, served with async SQLAlchemy.
+app = FastAPI(title='Centre DevOps API', lifespan=lifespan)
+
+
+@app.exception_handler(HTTPException)
+async def http_error(request, exc):
+    # Same error shape as the Flask routes: {"error": "..."}
+    return JSONResponse({'error': exc.detail}, status_code=exc.status_code, headers=exc.headers)
+
+
+def _serialize(row):
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()}
+
+
+async def _detail(session, resource, object_id):
+    spec = RESOURCES[resource]
+    model = spec['model']
+    columns = [getattr(model, name) for name in spec['detail']]
+    row = (await session.execute(select(*columns).where(model.id == object_id))).mappings().first()
+    if row is None:
+        raise HTTPException(status_code=404, detail='Ressource introuvable')
+    return {'data': _serialize(row)}
+
+
+async def _invalidate_project(project_id):
+    # Shared cache backends (filesystem/redis) also clear the Flask workers' entries
+    await run_in_threadpool(cache.invalidate_tags, 'projects', f'project:{project_id}')
+
+
+async def _record_rollups(session, deployment, client_name):
+    finished_at = deployment.ended_at or datetime.utcnow()
+    for stmt in rollup_statements(session.bind.dialect.name, deployment.project_id, client_name, deployment.status,
+                                  finished_at, duration_ms(deployment.started_at, deployment.ended_at)):
+        await session.execute(stmt)
 
-app = FastAPI()
 
 @app.get("/")
 def read_root():
     return {"message": "Bienvenue sur Projet de fin d'unite!"}
+
+
+# --- STATUS ---
+@app.get('/api/v1/projects/{project_id}')
+async def get_project(project_id: int, user=Depends(current_user), session: AsyncSession = Depends(get_session)):
+    return await _detail(session, 'projects', project_id)
+
+
+@app.get('/api/v1/deployments/{deploy_id}')
+async def get_deployment(deploy_id: int, user=Depends(current_user), session: AsyncSession = Depends(get_session)):
+    return await _detail(session, 'deployments', deploy_id)
+
+
+@app.get('/api/v1/admission/stats')
+async def admission_stats(user=Depends(current_user)):
+    # Deploy triggers admitted / turned away (429) by this process, per reason
+    return {'data': admission.stats()}
+
+
+@app.get('/api/deployment/{deploy_id}/log', response_class=PlainTextResponse)
+async def deployment_log(deploy_id: int, request: Request, since: int = 0, wait: float = 0, user=Depends(current_user),
+                         session: AsyncSession = Depends(get_session)):
+    # Same contract as the Flask route: bytes after ?since= (or Range), offset and completion in headers
+    config = flask_app.config
+    byte_range = parse_range(request.headers.get('range'))
+    first, last = byte_range or (max(since, 0), None)
+    deadline = asyncio.get_running_loop().time() + min(max(wait, 0), config['LOG_TAIL_MAX_WAIT_SECONDS'])
+    row = (await session.execute(log_state_query(deploy_id))).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail='Ressource introuvable')
+    code, body, headers = tail_response(row, first, last, byte_range is not None, config['RUNNER_TIMEOUT_SECONDS'])
+    if not body and headers['X-Log-Complete'] == '0' and first <= int(headers['X-Log-Size']):
+        # Long poll without the outbox dispatcher: a cheap status/length probe, no connection held in between
+        probe = select(Deployment.status, func.length(Deployment.log_content)).where(Deployment.id == deploy_id)
+        seen = (await session.execute(probe)).first()
+        await session.rollback()
+        while asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(config['LOG_TAIL_POLL_SECONDS'])
+            current = (await session.execute(probe)).first()
+            await session.rollback()
+            if current != seen:
+                row = (await session.execute(log_state_query(deploy_id))).first()
+                code, body, headers = tail_response(row, first, last, byte_range is not None,
+                                                    config['RUNNER_TIMEOUT_SECONDS'])
+                break
+    return Response(body, status_code=code, headers=headers, media_type='text/plain; charset=utf-8')
+
+
+# --- DEPLOYMENT MANAGEMENT ---
+async def admitted(project_id: int, request: Request):
+    # Resolved before current_user and the session: a rejected trigger costs no query
+    user_id = session_user_id(request)
+    if not admission.enabled or user_id is None:
+        yield
+        return
+    try:
+        admission.admit(user_id, project_id)
+    except Rejected as err:
+        raise HTTPException(status_code=429, detail=err.message, headers={'Retry-After': str(err.retry_after)})
+    try:
+        yield
+    finally:
+        admission.release()
+
+
+@app.post('/api/deploy/{project_id}')
+async def trigger_deploy(project_id: int, request: Request, admission_slot=Depends(admitted),
+                         user=Depends(current_user), session: AsyncSession = Depends(get_session)):
+    project = await session.get(Project, project_id)
+    if project is None:
+        raise HTTPException(status_code=404, detail='Ressource introuvable')
+    stack, policy, priority = project.stack, flask_app.config['DEPLOY_COALESCE_POLICY'], DEFAULT_PRIORITY
+    if request.headers.get('content-type', '').startswith('application/json'):
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail='Corps JSON invalide')
+        if not isinstance(body, dict):
+            raise HTTPException(status_code=400, detail='Corps JSON invalide')
+        stack, policy, priority = body.get('stack', stack), body.get('coalesce') or policy, body.get('priority') or priority
+    # Same checks as the Flask route: a list or an object must not reach the lookups below
+    if not isinstance(stack, str):
+        raise HTTPException(status_code=400, detail='Stack invalide')
+    if not isinstance(policy, str) or policy not in deployments.COALESCE_POLICIES:
+        raise HTTPException(status_code=400, detail=f'Politique inconnue: {policy}')
+    if not isinstance(priority, str) or priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f'Priorité inconnue: {priority} ({", ".join(PRIORITIES)})')
+
+    # Runner pools of the Flask workers (or 'flask runners run') pick the deployment up
+    try:
+        deployment, outcome = await session.run_sync(
+            deployments.request_deployment, project, user.id, user.username, stack, policy,
+            request.headers.get('Idempotency-Key'), PRIORITIES[priority])
+    except deployments.IdempotencyConflict:
+        raise HTTPException(status_code=422, detail='Clé d\'idempotence déjà utilisée pour un autre projet')
+    await session.commit()
+    position = await session.run_sync(deployments.queue_position, deployment)
+    added = outcome in ('queued', 'superseded')
+    if added:
+        await _invalidate_project(project_id)
+
+    return JSONResponse({'status': deployment.status, 'deployment_id': deployment.id, 'outcome': outcome,
+                         'queue_position': position}, status_code=202 if added else 200)
+
+
+@app.post('/api/deploy/{deploy_id}/stop')
+async def stop_deploy(deploy_id: int, user=Depends(current_user), session: AsyncSession = Depends(get_session)):
+    deployment = await session.get(Deployment, deploy_id)
+    if deployment is None:
+        raise HTTPException(status_code=404, detail='Ressource introuvable')
+    if deployment.status in FINAL_STATUSES:
+        raise HTTPException(status_code=400, detail=f'Impossible d\'arrêter un déploiement {deployment.status.lower()}')
+
+    now = datetime.utcnow()
+    deployment.status = 'Stopped'
+    deployment.ended_at = now
+    deployment.duration_ms = duration_ms(deployment.started_at, now)
+    deployment.log_content += f'\n[WARN] Deployment stopped by {user.username} at {now.strftime("%Y-%m-%d %H:%M:%S")}'
+    project = await session.get(Project, deployment.project_id)
+    project.status = 'Stopped'
+    await _record_rollups(session, deployment, project.client_name)
+    await session.execute(deployment_event(deployment.id, project.id, project.tenant_id, 'Stopped', ended_at=now))
+    await session.execute(project_event(project.id, project.tenant_id, project.status, project.last_deploy))
+    await session.commit()
+    await _invalidate_project(project.id)
+
+    return {'status': 'Stopped', 'message': 'Deployment stopped successfully'}
@@ -8,3 +8,122 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SECRET_KEY = os.environ.get('SECRET_KEY', 'hackathon-secret-key-matrix-2026')
     SQLALCHEMY_ECHO = False
+    # Runner threads write concurrently: wait for SQLite's lock instead of failing
+    SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}}
+
+    # Cache backend: 'memory' (per worker LRU), 'filesystem' (shared by workers on one host),
+    # 'redis' (any Redis-protocol server, 'fakeredis://' for a local stand-in) or 'null'
+    CACHE_TYPE = os.environ.get('CACHE_TYPE', 'memory')
+    CACHE_DEFAULT_TIMEOUT = 300
+    CACHE_MAX_ENTRIES = 2048
+    CACHE_DIR = os.environ.get('CACHE_DIR')
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_KEY_PREFIX = 'devops:'
+
+    # Response compression: best of br/zstd/gzip accepted by the client (br and zstd
+    # need the optional brotli / zstandard packages). SSE is never compressed.
+    COMPRESS_ENABLED = True
+    COMPRESS_MIN_SIZE = 500
+    COMPRESS_ALGORITHMS = ('br', 'zstd', 'gzip')
+    COMPRESS_LEVELS = {'br': 4, 'zstd': 3, 'gzip': 6}
+    COMPRESS_MIMETYPES = (
+        'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+        'application/javascript', 'application/json', 'application/x-ndjson', 'image/svg+xml',
+    )
+
+    # Deployment history retention (flask retention run). A finished deployment is
+    # archived once it is outside both the N latest of its project and the X-day
+    # window. Per-project / per-client policies override these defaults; None disables.
+    RETENTION_DEFAULT_KEEP_LATEST = 200
+    RETENTION_DEFAULT_KEEP_DAYS = 90
+
+    # Simulated pipeline: stages of one deployment run in parallel on a shared pool.
+    # PIPELINE_TIME_SCALE multiplies the simulated stage durations (0 = instant).
+    PIPELINE_WORKERS = int(os.environ.get('PIPELINE_WORKERS', 8))
+    PIPELINE_TIME_SCALE = float(os.environ.get('PIPELINE_TIME_SCALE', 1.0))
+
+    # Runner pool: each web worker (or 'flask runners run') registers RUNNERS_PER_PROCESS
+    # runners of RUNNER_SLOTS slots. The scheduler places queued deployments on free
+    # slots with per-project / per-client limits and fair share across clients.
+    RUNNERS_AUTOSTART = os.environ.get('RUNNERS_AUTOSTART', '1') == '1'
+    RUNNERS_PER_PROCESS = int(os.environ.get('RUNNERS_PER_PROCESS', 2))
+    RUNNER_SLOTS = int(os.environ.get('RUNNER_SLOTS', 2))
+    RUNNER_HEARTBEAT_SECONDS = 5
+    RUNNER_TIMEOUT_SECONDS = 30
+    SCHEDULER_POLL_SECONDS = 0.5
+    SCHEDULER_MAX_PER_PROJECT = 1
+    SCHEDULER_MAX_PER_CLIENT = 3
+    # A queued hotfix with no free slot may pre-empt (re-queue) running routine work
+    SCHEDULER_PREEMPT = True
+
+    # Duplicate triggers (same project and stack already queued or running):
+    # 'join' returns the existing deployment, 'supersede' replaces the queued one
+    DEPLOY_COALESCE_POLICY = os.environ.get('DEPLOY_COALESCE_POLICY', 'join')
+
+    # CI webhooks (/hooks/<project_id>): requests are verified and queued in memory, then
+    # committed in batches of up to WEBHOOK_BATCH_SIZE by a background thread
+    WEBHOOK_QUEUE_SIZE = 50000
+    WEBHOOK_BATCH_SIZE = 500
+    WEBHOOK_FLUSH_SECONDS = 0.2
+    WEBHOOK_DEPLOY_REFS = ('refs/heads/main', 'refs/heads/master')
+
+    # Outbox (outbox_events): state changes are fanned out to in-process subscribers by one
+    # dispatcher thread per worker, woken by local commits or every OUTBOX_POLL_SECONDS
+    OUTBOX_DISPATCH = os.environ.get('OUTBOX_DISPATCH', '1') == '1'
+    OUTBOX_BATCH_SIZE = 500
+    OUTBOX_POLL_SECONDS = 0.5
+    OUTBOX_GAP_SECONDS = 2
+    OUTBOX_MAX_ATTEMPTS = 5
+    OUTBOX_RETENTION_SECONDS = 3600
+    OUTBOX_PRUNE_SECONDS = 60
+
+    # Live dashboard (/dashboard/stream, Server-Sent Events). Each open dashboard holds a
+    # connection: with the gthread worker class it also holds a thread, so serve.py lowers
+    # this limit to (threads - 1) // 2 per worker; use gevent when many dashboards stay open
+    SSE_MAX_CLIENTS = int(os.environ.get('SSE_MAX_CLIENTS', 100))
+    SSE_CLIENT_BUFFER = 100
+    SSE_HEARTBEAT_SECONDS = 15
+    SSE_RETRY_MS = 3000
+
+    # Audit trail (audit_events): mutating requests of AUDIT_BLUEPRINTS are buffered in memory
+    # and written in batches by a background thread; AUDIT_LOG_FILE adds a JSON-lines copy
+    AUDIT_ENABLED = os.environ.get('AUDIT_ENABLED', '1') == '1'
+    AUDIT_BLUEPRINTS = ('core',)
+    AUDIT_BUFFER_SIZE = 10000
+    AUDIT_BATCH_SIZE = 500
+    AUDIT_FLUSH_SECONDS = 1.0
+    AUDIT_LOG_FILE = os.environ.get('AUDIT_LOG_FILE')
+
+    # Build cache: outputs of pipeline stages whose inputs (project, stack, revision,
+    # upstream stages) did not change are reused from disk; least recently used first out.
+    # Projects without a known revision (no webhook received yet) always build from scratch.
+    BUILD_CACHE_ENABLED = os.environ.get('BUILD_CACHE_ENABLED', '1') == '1'
+    BUILD_CACHE_DIR = os.environ.get('BUILD_CACHE_DIR')  # default: <instance>/build-cache
+    BUILD_CACHE_MAX_BYTES = int(os.environ.get('BUILD_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+    # Project skeletons generated by scripts/project.py: <SCAFFOLD_ROOT>/<client>/<project>
+    SCAFFOLD_ROOT = os.environ.get('SCAFFOLD_ROOT')  # default: <instance>/scaffolds
+
+    # Deployment log tail (/api/deployment/<id>/log): longest a request may wait for new output.
+    # A waiting request holds a gthread thread, so serve.py lowers LOG_TAIL_MAX_WAITERS to
+    # (threads - 1) // 2 per worker; past it, requests answer at once with a Retry-After
+    LOG_TAIL_MAX_WAIT_SECONDS = 25
+    LOG_TAIL_MAX_WAITERS = int(os.environ.get('LOG_TAIL_MAX_WAITERS', 100))
+    LOG_TAIL_RETRY_SECONDS = 2
+    LOG_TAIL_POLL_SECONDS = 0.5  # async API tier: it has no event bus and probes the row instead
+
+    # History exports (/api/v1/deployments/export, flask export deployments): rows per query
+    EXPORT_BATCH_SIZE = 5000
+
+    # Admission control of deployment triggers (per process): 429 + Retry-After before any query.
+    # Token buckets per user and per project (rate per second, burst); 0 disables a limit.
+    # The in-flight limit shrinks as the queue approaches ADMISSION_MAX_QUEUE_DEPTH, then closes.
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', '1') == '1'
+    ADMISSION_USER_RATE = 1.0
+    ADMISSION_USER_BURST = 10
+    ADMISSION_PROJECT_RATE = 0.5
+    ADMISSION_PROJECT_BURST = 5
+    ADMISSION_MAX_IN_FLIGHT = 16
+    ADMISSION_MAX_QUEUE_DEPTH = 1000
+    ADMISSION_QUEUE_RETRY_SECONDS = 10
+    ADMISSION_DEPTH_POLL_SECONDS = 2  # async API tier: queue depth probe interval
@@ -1,5 +1,11 @@
+import argparse
+import difflib
+import hashlib
 import os
 import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Definition of the Project Structure and File Contents - UPDATED 2026
 project_structure = {
@@ -960,43 +966,135 @@ with app.app_context():
 """,
 }
 
-def create_files():
-    base_dir = os.getcwd()
+# SHA-256 of the contents earlier versions of this installer wrote, per file. Only those
+# files are upgraded in place: any other content was edited after installation (or by
+# the project itself since) and is left alone unless --force is given. When a file's
+# content changes above, add the digest of its previous content here.
+PREVIOUS_VERSIONS = {}
+
+
+# --- INCREMENTAL INSTALL ---
+# Files are compared by SHA-256 of their bytes: unchanged files are left alone (mtime
+# included), so editors, build tools and watchers of an existing workspace see no change.
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def plan_file(base_dir, filepath, content, force=False):
+    """Returns (action, filepath, current bytes or None, wanted bytes); action is create, update, modified or unchanged."""
+    wanted = content.encode('utf-8')
+    full_path = os.path.join(base_dir, filepath)
+    try:
+        with open(full_path, 'rb') as f:
+            current = f.read()
+    except FileNotFoundError:
+        return 'create', filepath, None, wanted
+    digest = _digest(current)
+    if len(current) == len(wanted) and digest == _digest(wanted):
+        return 'unchanged', filepath, current, wanted
+    if force or digest in PREVIOUS_VERSIONS.get(filepath, ()):
+        return 'update', filepath, current, wanted
+    return 'modified', filepath, current, wanted
+
+
+def write_atomic(full_path, data, mode):
+    """Writes through a temporary file in the same directory: readers never see half a file."""
+    directory = os.path.dirname(full_path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.install-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp, mode)
+        os.replace(tmp, full_path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def print_diff(action, filepath, current, wanted):
+    old = current.decode('utf-8', errors='replace').splitlines(keepends=True) if current else []
+    new = wanted.decode('utf-8').splitlines(keepends=True)
+    fromfile = '/dev/null' if action == 'create' else f'a/{filepath}'
+    sys.stdout.writelines(difflib.unified_diff(old, new, fromfile=fromfile, tofile=f'b/{filepath}'))
+    if new and not new[-1].endswith('\n'):
+        print()
+
+
+def install(base_dir, dry_run=False, workers=8, force=False):
+    """Brings base_dir in line with project_structure; returns the planned actions and timings."""
+    # mkstemp creates 0600 files: new files get the permissions open() would have given them
+    umask = os.umask(0)
+    os.umask(umask)
+    timings = {}
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        plan = list(pool.map(lambda item: plan_file(base_dir, *item, force), project_structure.items()))
+    timings['analyse'] = time.perf_counter() - started
+
+    changes = [entry for entry in plan if entry[0] in ('create', 'update')]
+    started = time.perf_counter()
+    if dry_run:
+        for entry in changes:
+            print_diff(*entry)
+    else:
+        def apply(entry):
+            action, filepath, _, wanted = entry
+            full_path = os.path.join(base_dir, filepath)
+            mode = os.stat(full_path).st_mode & 0o7777 if action == 'update' else 0o666 & ~umask
+            write_atomic(full_path, wanted, mode)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(apply, changes))
+    timings['écriture'] = time.perf_counter() - started
+    return plan, timings
+
+
+def create_files(base_dirs=None, dry_run=False, workers=8, force=False):
+    base_dirs = base_dirs or [os.getcwd()]
     
-    print("\\n" + "="*60)
+    print("\n" + "="*60)
     print("📂 Centre DevOps - Installation du Projet (Mise à jour 2026)")
     print("="*60)
-    print(f"Répertoire cible: {base_dir}\\n")
     
-    for filepath, content in project_structure.items():
-        # Handle directory creation
-        full_path = os.path.join(base_dir, filepath)
-        directory = os.path.dirname(full_path)
-        
-        if directory and not os.path.exists(directory):
-            os.makedirs(directory)
-            print(f"✅ Répertoire créé: {directory}")
-            
-        # Write file content
-        with open(full_path, 'w', encoding='utf-8') as f:
-            f.write(content)
-        print(f"✅ Fichier créé: {filepath}")
-
-    print("\\n" + "="*60)
+    icons = {'create': '✅ Fichier créé', 'update': '🔄 Fichier mis à jour'}
+    for base_dir in base_dirs:
+        print(f"Répertoire cible: {base_dir}{' (simulation, aucun fichier écrit)' if dry_run else ''}\n")
+        plan, timings = install(base_dir, dry_run, workers, force)
+        counts = {action: sum(1 for entry in plan if entry[0] == action)
+                  for action in ('create', 'update', 'modified', 'unchanged')}
+        for action, filepath, _, _ in plan:
+            if action == 'modified':
+                print(f"⚠️  Modifié localement, conservé: {filepath}")
+            elif action != 'unchanged' and not dry_run:
+                print(f"{icons[action]}: {filepath}")
+        print(f"\n📊 {counts['create']} à créer, {counts['update']} à mettre à jour, {counts['unchanged']} inchangés"
+              if dry_run else
+              f"\n📊 {counts['create']} créés, {counts['update']} mis à jour, {counts['unchanged']} inchangés")
+        if counts['modified']:
+            print(f"   {counts['modified']} modifiés localement et conservés (--force pour les écraser)")
+        print("⏱️  " + ", ".join(f"{phase}: {seconds * 1000:.1f} ms" for phase, seconds in timings.items()))
+
+    if dry_run:
+        return
+
+    print("\n" + "="*60)
     print("✨ PROJET INSTALLÉ AVEC SUCCÈS! ✨")
     print("="*60)
-    print("\\n📋 PROCHAINES ÉTAPES:\\n")
+    print("\n📋 PROCHAINES ÉTAPES:\n")
     print("1. Installer les dépendances:")
-    print("   $ pip install -r requirements.txt\\n")
+    print("   $ pip install -r requirements.txt\n")
     print("2. Initialiser la base de données:")
-    print("   $ python scripts/seed.py\\n")
+    print("   $ python scripts/seed.py\n")
     print("3. Exécuter l'application:")
-    print("   $ python run.py\\n")
+    print("   $ python run.py\n")
     print("4. Ouvrir dans le navigateur:")
-    print("   http://localhost:5000\\n")
+    print("   http://localhost:5000\n")
     print("5. Identifiants de connexion:")
     print("   Nom d'utilisateur: admin")
-    print("   Mot de passe: password123\\n")
+    print("   Mot de passe: password123\n")
     print("="*60)
     print("✍️  FONCTIONNALITÉS DU PROJET:")
     print("="*60)
@@ -1009,11 +1107,17 @@ def create_files():
     print("✅ Design Responsive Bootstrap 5")
     print("="*60)
     print("🎉 Bonne Gestion DevOps! Créé avec ❤️ par Team Matrix")
-    print("="*60 + "\\n")
+    print("="*60 + "\n")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Installe ou met à jour les fichiers du projet (seuls les fichiers modifiés sont réécrits)")
+    parser.add_argument('targets', nargs='*', help="Répertoires cibles (défaut: répertoire courant)")
+    parser.add_argument('--dry-run', action='store_true', help="Affiche le diff des fichiers à créer ou modifier sans rien écrire")
+    parser.add_argument('--workers', type=int, default=8, help="Fichiers analysés et écrits en parallèle")
+    parser.add_argument('--force', action='store_true', help="Écrase aussi les fichiers modifiés depuis leur installation")
+    args = parser.parse_args()
     try:
-        create_files()
+        create_files(args.targets, args.dry_run, args.workers, args.force)
     except Exception as e:
-        print(f"\\n❌ Erreur: {e}")
+        print(f"\n❌ Erreur: {e}")
         sys.exit(1)
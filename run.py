@@ -3,5 +3,6 @@ from app import create_app
 app = create_app()
 
 if __name__ == '__main__':
-    # Running on port 5000
+    # Development server on port 5000 (single process, reloader).
+    # Production: python serve.py --workers N
     app.run(debug=True, port=5000, host='0.0.0.0')
@@ -0,0 +1,111 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import random
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from loadtest import InProcessClient, run, report
+
+
+def build_app(projects):
+    from config import Config
+    Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'admission.db')
+    Config.RUNNERS_AUTOSTART = False
+    from app import create_app, db
+    from app.database.models import Project, User
+
+    app = create_app()
+    with app.app_context():
+        for name in ('admin', 'script'):
+            user = User(username=name, email=f'{name}@devops.local')
+            user.set_password('password123')
+            db.session.add(user)
+        db.session.add_all(Project(name=f'Projet {i}', client_name=f'Client {i % 7}', stack='Python/Flask')
+                           for i in range(projects))
+        db.session.commit()
+    return app
+
+
+def reset(app):
+    """Empties the queue between scenarios (runners are off, nothing ever leaves it)."""
+    from app import db, admission
+    from app.database.models import Deployment
+
+    with app.app_context():
+        db.session.execute(db.delete(Deployment))
+        db.session.commit()
+    admission.queue_depth = 0
+    admission._buckets.clear()
+    admission._counters = dict.fromkeys(admission._counters, 0)
+
+
+def burst(client, projects, seconds, concurrency, honor_retry_after):
+    """Triggers from concurrency script threads for seconds; returns (status, latency ms) of each call."""
+    deadline = time.monotonic() + seconds
+    results = []
+    lock = threading.Lock()
+
+    def loop(_):
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            response = client._client().post(f'/api/deploy/{random.randint(1, projects)}')
+            with lock:
+                results.append((response.status_code, (time.perf_counter() - started) * 1000))
+            if honor_retry_after and response.status_code == 429:
+                time.sleep(min(float(response.headers['Retry-After']), max(0, deadline - time.monotonic())))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(loop, range(concurrency)))
+    return results
+
+
+def scenario(label, app, reader, writer, args):
+    from app import admission
+
+    reset(app)
+    baseline = run(reader, '/dashboard', 'identity', args.requests, 2)
+    page = {}
+
+    def read_pages():
+        page['stats'] = run(reader, '/dashboard', 'identity', args.requests, 2)
+
+    thread = threading.Thread(target=read_pages)
+    thread.start()
+    results = burst(writer, args.projects, args.seconds, args.concurrency, not args.ignore_retry_after)
+    thread.join()
+
+    print(f"\n{label}")
+    report('pages', baseline)
+    report('pages+rafale', page['stats'], baseline)
+    for status in sorted({status for status, _ in results}):
+        latencies = [ms for code, ms in results if code == status]
+        print(f"  HTTP {status}: {len(latencies):>6} déclenchements  moy {statistics.mean(latencies):7.2f} ms")
+    print(f"  compteurs: {admission.stats()}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Rafale de déclenchements: temps des pages avec et sans contrôle d'admission")
+    parser.add_argument('--projects', type=int, default=50)
+    parser.add_argument('--seconds', type=float, default=5, help="Durée de la rafale")
+    parser.add_argument('--concurrency', type=int, default=16, help="Scripts qui déclenchent en parallèle")
+    parser.add_argument('--requests', type=int, default=300, help="Pages lues pendant la rafale")
+    parser.add_argument('--ignore-retry-after', action='store_true', help="Les scripts réessaient sans attendre")
+    args = parser.parse_args()
+
+    app = build_app(args.projects)
+    from app import admission
+
+    reader = InProcessClient(app, 'admin', 'password123')
+    writer = InProcessClient(app, 'script', 'password123')
+    limits = (dict(admission.limits), admission.max_in_flight, admission.max_queue_depth)
+    # Every gate open: the burst reaches the database
+    admission.limits, admission.max_in_flight, admission.max_queue_depth = {'user': (0, 0), 'project': (0, 0)}, 0, 0
+    scenario("Sans contrôle d'admission", app, reader, writer, args)
+    admission.limits, admission.max_in_flight, admission.max_queue_depth = limits
+    scenario("Avec contrôle d'admission (configuration par défaut)", app, reader, writer, args)
@@ -0,0 +1,147 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import gzip
+import hashlib
+import json
+import re
+import shutil
+import urllib.request
+
+from app.services.assets import VENDOR_ASSETS, DIST_DIR, MANIFEST
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app', 'static')
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.map')
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+# --- VENDORING ---
+def vendor(refresh=False):
+    for name, url in VENDOR_ASSETS.items():
+        target = os.path.join(STATIC_DIR, name)
+        if os.path.exists(target) and not refresh:
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        print(f"Téléchargement: {url}")
+        with urllib.request.urlopen(url, timeout=30) as response, open(target, 'wb') as f:
+            shutil.copyfileobj(response, f)
+
+
+# --- MINIFICATION ---
+# Strings and url() are copied verbatim: only comments and whitespace outside them change
+CSS_LITERAL = r'''"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|url\(\s*[^)"'\s]*\s*\)'''
+CSS_COMMENT = re.compile(rf'({CSS_LITERAL})|/\*.*?\*/', re.S | re.I)
+# The space before ':' is a descendant combinator ('div :first-child'): only the one after it goes
+CSS_SPACE = re.compile(rf'({CSS_LITERAL})|\s*;?\s*(}})\s*|\s*([{{;,>])\s*|(:)\s+|\s+', re.I)
+
+
+def minify_css(text):
+    text = CSS_COMMENT.sub(lambda match: match.group(1) or '', text)
+    text = CSS_SPACE.sub(lambda match: match.group(1) or match.group(2) or match.group(3) or match.group(4) or ' ', text)
+    return text.strip()
+
+
+def minify(name, data):
+    # JavaScript is only precompressed: stripping its whitespace or comment lines safely needs
+    # a real tokenizer (template literals keep both)
+    if '.min.' in name:
+        return data
+    if name.endswith('.css'):
+        return minify_css(data.decode('utf-8')).encode('utf-8')
+    return data
+
+
+# --- FINGERPRINTING ---
+def fingerprint(name, data):
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+
+
+def rewrite_css_urls(name, text, manifest):
+    base = os.path.dirname(name)
+
+    def replace(match):
+        quote, ref = match.group(1), match.group(2)
+        if ref.startswith(('data:', 'http:', 'https:', '//', '#')):
+            return match.group(0)
+        path = ref.split('?', 1)[0].split('#', 1)[0]
+        target = os.path.normpath(os.path.join(base, path)).replace(os.sep, '/')
+        if target not in manifest:
+            return match.group(0)
+        relative = os.path.relpath(manifest[target], base or '.').replace(os.sep, '/')
+        return f'url({quote}{relative}{quote})'
+
+    return CSS_URL.sub(replace, text)
+
+
+def write_output(dist, hashed, data):
+    target = os.path.join(dist, hashed)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, 'wb') as f:
+        f.write(data)
+    if hashed.endswith(COMPRESSIBLE):
+        with open(target + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(target + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+
+
+def collect_sources():
+    sources = []
+    for root, dirs, files in os.walk(STATIC_DIR):
+        rel_root = os.path.relpath(root, STATIC_DIR)
+        if rel_root.split(os.sep)[0] == DIST_DIR:
+            dirs[:] = []
+            continue
+        for filename in files:
+            sources.append(os.path.normpath(os.path.join(rel_root, filename)).replace(os.sep, '/'))
+    # Stylesheets last so the files they reference already have fingerprints
+    return sorted(sources, key=lambda name: (name.endswith('.css'), name))
+
+
+def build():
+    dist = os.path.join(STATIC_DIR, DIST_DIR)
+    if os.path.isdir(dist):
+        shutil.rmtree(dist)
+    os.makedirs(dist)
+
+    manifest = {}
+    original = compressed = 0
+    for name in collect_sources():
+        with open(os.path.join(STATIC_DIR, name), 'rb') as f:
+            data = f.read()
+        original += len(data)
+        data = minify(name, data)
+        if name.endswith('.css'):
+            data = rewrite_css_urls(name, data.decode('utf-8'), manifest).encode('utf-8')
+        hashed = fingerprint(name, data)
+        write_output(dist, hashed, data)
+        manifest[name] = hashed
+        compressed += len(data)
+        print(f"✅ {name} -> {hashed}")
+
+    with open(os.path.join(dist, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    print(f"\n{len(manifest)} fichiers, {original} -> {compressed} octets après minification")
+    if brotli is None:
+        print("(brotli non installé: seules les variantes .gz ont été générées)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Vendorise, minifie et empreinte les fichiers statiques")
+    parser.add_argument('--no-vendor', action='store_true', help="Ne pas télécharger les dépendances CDN")
+    parser.add_argument('--refresh', action='store_true', help="Re-télécharger les dépendances déjà présentes")
+    args = parser.parse_args()
+
+    if not args.no_vendor:
+        vendor(refresh=args.refresh)
+    build()
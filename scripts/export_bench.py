@@ -0,0 +1,165 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import resource
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+STATUSES = ('Success', 'Success', 'Success', 'Failed', 'Stopped')
+
+
+def build_app(path):
+    from config import Config
+    Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+    Config.CACHE_TYPE = 'null'
+    Config.RUNNERS_AUTOSTART = False
+    from app import create_app
+
+    return create_app()
+
+
+def seed(path, rows, archived, projects, batch=50000):
+    """Bulk-inserts rows deployments (archived of them in the archive table), bypassing the ORM."""
+    from app import db
+    from app.database.models import Project, Deployment, DeploymentArchive, User
+
+    app = build_app(path)
+    with app.app_context():
+        user = User(username='admin', email='admin@devops.local')
+        user.set_password('password123')
+        db.session.add(user)
+        project_rows = [Project(name=f'Projet {i}', client_name=f'Client {i % 10}', stack='Python/Flask')
+                        for i in range(projects)]
+        db.session.add_all(project_rows)
+        db.session.commit()
+        owners = [(project.id, project.tenant_id, project.client_name) for project in project_rows]
+        start = datetime.utcnow() - timedelta(days=365 * 3)
+        for offset in range(0, rows, batch):
+            values = []
+            for i in range(offset, min(rows, offset + batch)):
+                project_id, tenant_id, client = owners[i % len(owners)]
+                at = start + timedelta(seconds=i * 9)
+                values.append({'id': i + 1, 'tenant_id': tenant_id, 'project_id': project_id, 'client_name': client,
+                               'user_id': user.id, 'status': STATUSES[i % len(STATUSES)], 'triggered_by': 'bench',
+                               'stack': 'Python/Flask', 'priority': 1, 'log_content': '[INFO] ok', 'timestamp': at,
+                               'started_at': at, 'ended_at': at + timedelta(seconds=40), 'duration_ms': 40000})
+            # Archived rows are the oldest ones, as the retention engine leaves them
+            split = max(0, min(len(values), archived - offset))
+            if split:
+                db.session.execute(db.insert(DeploymentArchive), [
+                    {key: value for key, value in row.items() if key not in ('stack', 'priority', 'log_content')}
+                    for row in values[:split]])
+            if split < len(values):
+                db.session.execute(db.insert(Deployment), [
+                    {key: value for key, value in row.items() if key != 'client_name'} for row in values[split:]])
+            db.session.commit()
+            print(f"  {offset + len(values)}/{rows}", end='\r', flush=True)
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+    print()
+
+
+def peak_rss_kb():
+    # ru_maxrss survives exec on Linux (the child would report the seeding parent's peak): prefer VmHWM
+    try:
+        with open('/proc/self/status') as handle:
+            return next(int(line.split()[1]) for line in handle if line.startswith('VmHWM'))
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(path, mode, fmt, gzip, batch_size, limit):
+    """Runs in a fresh process so the peak RSS is this export's and nothing else's."""
+    from app import db
+
+    app = build_app(path)
+    baseline = peak_rss_kb()
+    written = rows = 0
+    started = time.perf_counter()
+    with app.app_context():
+        if mode == 'service':
+            from app.services import export
+
+            chunks = export.stream(fmt, [], [], batch_size, gzip)
+        elif mode == 'http':
+            from flask_login import FlaskLoginClient
+
+            app.test_client_class = FlaskLoginClient
+            from app.database.models import User
+
+            client = app.test_client(user=db.session.get(User, 1))
+            response = client.get(f"/api/v1/deployments/export?format={fmt}{'&gzip=1' if gzip else ''}",
+                                  buffered=False)
+            chunks = response.response
+        else:
+            # Reference: what an export built on Query.all() costs (limited, it grows with the table)
+            from app.services import export
+            from app.database.models import Deployment
+
+            deployments = Deployment.query.order_by(Deployment.id).limit(limit).all()
+            chunks = export.encode([[(d.id, d.project_id, d.project.name, d.project.client_name, d.status,
+                                      d.triggered_by, d.user_id, d.stack, d.timestamp, d.started_at, d.ended_at,
+                                      d.duration_ms, False) for d in deployments]], fmt)
+        with open(os.devnull, 'wb') as sink:
+            for chunk in chunks:
+                sink.write(chunk)
+                written += len(chunk)
+                rows += chunk.count(b'\n') if not gzip else 0
+    elapsed = time.perf_counter() - started
+    peak = peak_rss_kb()
+    print(json.dumps({'seconds': elapsed, 'bytes': written, 'rows': rows, 'baseline_kb': baseline, 'peak_kb': peak}))
+
+
+def run_child(args, mode, fmt, gzip=False):
+    command = [sys.executable, os.path.abspath(__file__), '--db', args.db, '--measure', mode, '--format', fmt,
+               '--batch-size', str(args.batch_size), '--reference-rows', str(args.reference_rows)]
+    if gzip:
+        command.append('--gzip')
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Débit et mémoire des exports de l'historique des déploiements")
+    parser.add_argument('--rows', type=int, default=1000000, help="Déploiements générés (ex.: 10000000)")
+    parser.add_argument('--archived', type=float, default=0.2, help="Part de l'historique déjà archivée")
+    parser.add_argument('--projects', type=int, default=100)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--reference-rows', type=int, default=500000, help="Lignes chargées par la référence Query.all()")
+    parser.add_argument('--db', help="Base déjà générée (sinon une base temporaire est créée)")
+    parser.add_argument('--measure', choices=('service', 'http', 'reference'), help=argparse.SUPPRESS)
+    parser.add_argument('--format', default='csv', help=argparse.SUPPRESS)
+    parser.add_argument('--gzip', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.db, args.measure, args.format, args.gzip, args.batch_size, args.reference_rows)
+        sys.exit(0)
+
+    if not args.db:
+        args.db = os.path.join(tempfile.mkdtemp(), 'export.db')
+        started = time.perf_counter()
+        seed(args.db, args.rows, int(args.rows * args.archived), args.projects)
+        print(f"{args.rows} déploiements générés en {time.perf_counter() - started:.0f} s "
+              f"({os.path.getsize(args.db) / 1048576:.0f} Mo)")
+
+    total = None
+    for label, mode, fmt, gzip in (
+            ('service CSV', 'service', 'csv', False),
+            ('service NDJSON', 'service', 'ndjson', False),
+            ('service CSV gzip', 'service', 'csv', True),
+            ('HTTP CSV', 'http', 'csv', False),
+            ('HTTP NDJSON gzip', 'http', 'ndjson', True),
+            (f'référence Query.all() ({args.reference_rows} lignes)', 'reference', 'csv', False)):
+        result = run_child(args, mode, fmt, gzip)
+        # Compressed output is not counted: it holds as many rows as the uncompressed runs
+        rows = result['rows'] - (fmt == 'csv') if result['rows'] else total
+        total = total if mode == 'reference' else rows
+        throughput = f"{rows / result['seconds']:>9.0f} lignes/s"
+        print(f"  {label:<40} {result['seconds']:7.1f} s {throughput} {result['bytes'] / 1048576 / result['seconds']:6.1f} Mo/s"
+              f"  mémoire max {result['peak_kb'] / 1024:6.0f} Mo (dont {result['baseline_kb'] / 1024:.0f} Mo au démarrage)")
@@ -0,0 +1,216 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import http.cookiejar
+import signal
+import socket
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_PATHS = ['/dashboard', '/project/1', '/api/v1/deployments?limit=200']
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# --- CLIENTS ---
+class HttpClient:
+    """Talks to a running server; bodies are measured exactly as sent on the wire."""
+
+    def __init__(self, base_url, username, password, login_url=None):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        # The async API tier has no login page: it accepts the Flask session cookie
+        login_url = (login_url or self.base_url).rstrip('/')
+        data = urllib.parse.urlencode({'username': username, 'password': password}).encode()
+        self.opener.open(login_url + '/login', data=data).read()
+
+    def fetch(self, path, encoding, method='GET'):
+        req = urllib.request.Request(self.base_url + path, method=method, headers={'Accept-Encoding': encoding})
+        started = time.perf_counter()
+        try:
+            with self.opener.open(req) as response:
+                body = response.read()
+                status = response.status
+        except urllib.error.HTTPError as err:
+            body, status = err.read(), err.code
+        return status, len(body), time.perf_counter() - started
+
+
+class InProcessClient:
+    """Flask test client against a throwaway seeded database (no network)."""
+
+    def __init__(self, app, username, password):
+        self.app = app
+        self.local = threading.local()
+        self.username, self.password = username, password
+
+    def _client(self):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.app.test_client()
+            client.post('/login', data={'username': self.username, 'password': self.password})
+            self.local.client = client
+        return client
+
+    def fetch(self, path, encoding, method='GET'):
+        client = self._client()
+        started = time.perf_counter()
+        response = client.open(path, method=method, headers={'Accept-Encoding': encoding})
+        body = response.get_data()
+        return response.status_code, len(body), time.perf_counter() - started
+
+
+def build_inprocess_app(projects, deployments):
+    from config import Config
+    Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'loadtest.db')
+    from app import create_app, db
+    from app.database.models import Project, Deployment, User
+
+    app = create_app()
+    with app.app_context():
+        user = User(username='admin', email='admin@devops.local')
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.flush()
+        for i in range(projects):
+            project = Project(name=f'Projet {i}', client_name=f'Client {i % 7}', stack='Python/Django + PostgreSQL')
+            db.session.add(project)
+            db.session.flush()
+            for _ in range(deployments):
+                db.session.add(Deployment(project_id=project.id, user_id=user.id, status='Success',
+                                          log_content='[INFO] Building Container... Done\n' * 20, triggered_by='loadtest'))
+        db.session.commit()
+    return app
+
+
+# --- RUNNER ---
+def run(client, path, encoding, requests, concurrency, method='GET'):
+    def one(_):
+        return client.fetch(path, encoding, method)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - started
+
+    latencies = sorted(r[2] * 1000 for r in results)
+    return {
+        'ok': sum(1 for r in results if r[0] < 400),
+        'bytes': statistics.mean(r[1] for r in results),
+        'mean_ms': statistics.mean(latencies),
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0],
+        'rps': requests / wall,
+    }
+
+
+def report(label, stats, baseline=None):
+    saving = ''
+    if baseline:
+        saving = f"  ({100 * (1 - stats['bytes'] / baseline['bytes']):5.1f}% octets, " \
+                 f"{stats['mean_ms'] - baseline['mean_ms']:+.2f} ms)"
+    print(f"  {label:<10} {stats['ok']:>5} ok  {stats['bytes']:>10.0f} o/req  "
+          f"moy {stats['mean_ms']:7.2f} ms  p95 {stats['p95_ms']:7.2f} ms  {stats['rps']:8.1f} req/s{saving}")
+
+
+def compression_suite(client, args):
+    from app.services.compression import available_encodings
+    encodings = ['identity'] + [name for name in ('gzip', 'br', 'zstd') if name in available_encodings()]
+    for path in args.paths:
+        print(f"\n{path}")
+        baseline = None
+        for encoding in encodings:
+            stats = run(client, path, encoding, args.requests, args.concurrency)
+            report(encoding, stats, baseline)
+            baseline = baseline or stats
+
+
+def concurrency_suite(client, args):
+    if not args.url or not args.async_url:
+        sys.exit("La comparaison de concurrence nécessite --url (Flask) et --async-url (FastAPI)")
+    clients = {
+        'flask': client,
+        'fastapi': HttpClient(args.async_url, args.user, args.password, login_url=args.url),
+    }
+    for path in args.paths:
+        print(f"\n{path}")
+        for level in args.levels:
+            for name, target in clients.items():
+                stats = run(target, path, 'identity', max(args.requests, level * 5), level)
+                report(f"{name}@{level}", stats)
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Le serveur n'a pas démarré sur le port {port}")
+
+
+def workers_suite(args):
+    # Starts serve.py once per worker count against the configured database (run scripts/seed.py first)
+    for workers in args.workers:
+        port = args.port
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT_DIR, 'serve.py'), '--bind', f'127.0.0.1:{port}',
+             '--workers', str(workers), '--worker-class', args.worker_class],
+            cwd=ROOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_for_port(port)
+            client = HttpClient(f'http://127.0.0.1:{port}', args.user, args.password)
+            for path in args.paths:
+                report(f"{workers}w {path}", run(client, path, 'identity', args.requests, args.concurrency))
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=60)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Test de charge du Centre DevOps")
+    parser.add_argument('--url', help="Serveur à tester (sinon: application en mémoire avec base temporaire)")
+    parser.add_argument('--user', default='admin')
+    parser.add_argument('--password', default='password123')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--projects', type=int, default=60, help="Projets ensemencés (mode en mémoire)")
+    parser.add_argument('--deployments', type=int, default=20, help="Déploiements par projet (mode en mémoire)")
+    parser.add_argument('--suite', choices=['compression', 'concurrency', 'workers'], default='compression')
+    parser.add_argument('--async-url', help="API FastAPI (backend/main.py) comparée à --url par la suite concurrency")
+    parser.add_argument('--levels', type=lambda v: [int(x) for x in v.split(',')], default=[10, 50, 200],
+                        help="Connexions simultanées testées par la suite concurrency")
+    parser.add_argument('--workers', type=lambda v: [int(x) for x in v.split(',')], default=[1, 2, 4],
+                        help="Nombres de processus serve.py testés par la suite workers")
+    parser.add_argument('--worker-class', choices=['gthread', 'gevent'], default='gthread')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('paths', nargs='*')
+    args = parser.parse_args()
+    args.paths = args.paths or (['/api/v1/projects/1', '/api/v1/deployments/1'] if args.suite == 'concurrency' else DEFAULT_PATHS)
+
+    if args.suite == 'workers':
+        print(f"Débit selon le nombre de processus ({args.worker_class}, {args.concurrency} connexions)")
+        workers_suite(args)
+        sys.exit(0)
+
+    if args.url:
+        client = HttpClient(args.url, args.user, args.password)
+    else:
+        client = InProcessClient(build_inprocess_app(args.projects, args.deployments), args.user, args.password)
+
+    if args.suite == 'concurrency':
+        print("Latence sous concurrence: Flask vs API asynchrone")
+        concurrency_suite(client, args)
+    else:
+        print("Compression négociée: octets transférés et latence par encodage")
+        compression_suite(client, args)
@@ -1,6 +1,37 @@
-# Script minimal pour créer un projet (POC)
-def create_project(name, client):
-    print(f"Projet '{name}' pour le client '{client}' créé (POC)")
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+
+from app.services.scaffold import Scaffolder, ProjectSpec, template_for, SCAFFOLDS
+
+
+def create_project(name, client, stack, output=None, record=True):
+    """Génère le squelette du projet à partir du modèle de sa stack et l'enregistre."""
+    from app import create_app, db
+
+    app = create_app()
+    root = output or app.config.get('SCAFFOLD_ROOT') or os.path.join(app.instance_path, 'scaffolds')
+    with app.app_context():
+        result = Scaffolder().generate(db.session, [ProjectSpec(name, client, stack)], root, workers=1, record=record)
+    for spec, error in result['failed']:
+        print(f"❌ {error}")
+        return None
+    spec, target, project_id = result['created'][0]
+    print(f"Projet '{name}' pour le client '{client}' créé: modèle {template_for(stack)}, "
+          f"{result['files']} fichiers dans {target}" + (f" (projet #{project_id})" if project_id else ""))
+    return target, project_id
+
 
 if __name__ == "__main__":
-    create_project("Projet Test", "Client Demo")
+    parser = argparse.ArgumentParser(description="Crée un projet à partir du modèle de sa stack")
+    parser.add_argument('name')
+    parser.add_argument('client')
+    parser.add_argument('stack', help="Ex.: 'Python/Django + PostgreSQL' (modèles: "
+                                      f"{', '.join(SCAFFOLDS)}, generic)")
+    parser.add_argument('--output', help="Racine des squelettes (défaut: SCAFFOLD_ROOT ou instance/scaffolds)")
+    parser.add_argument('--no-record', action='store_true', help="Génère les fichiers sans créer le projet en base")
+    args = parser.parse_args()
+    if create_project(args.name, args.client, args.stack, args.output, not args.no_record) is None:
+        sys.exit(1)
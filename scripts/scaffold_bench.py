@@ -0,0 +1,73 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import shutil
+import tempfile
+import time
+
+from app.services.scaffold import Scaffolder, ProjectSpec
+
+STACKS = ('Python/Django + PostgreSQL', 'Flask API', 'React/NextJS', 'Spring Boot + MySQL', 'Flutter/Dart',
+          'PHP/Laravel', 'Node.js + MongoDB', 'React Native')
+
+
+def build_app():
+    from config import Config
+    Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'scaffold.db')
+    Config.RUNNERS_AUTOSTART = False
+    from app import create_app
+
+    return create_app()
+
+
+def specs(count, batch):
+    return [ProjectSpec(f'Projet {batch}-{i}', f'Client {i % 25}', STACKS[i % len(STACKS)]) for i in range(count)]
+
+
+def uncached(count, root):
+    """Reference: a fresh Jinja environment per project, so every template is parsed every time."""
+    started = time.perf_counter()
+    for spec in specs(count, 'ref'):
+        Scaffolder().write(spec, root)
+    return time.perf_counter() - started
+
+
+def measure(app, scaffolder, count, root, workers, batch):
+    from app import db
+
+    started = time.perf_counter()
+    with app.app_context():
+        result = scaffolder.generate(db.session, specs(count, batch), root, workers=workers)
+        db.session.remove()
+    wall = time.perf_counter() - started
+    assert not result['failed'], result['failed'][:3]
+    print(f"  {workers:>3} threads {count:>6} projets {result['files']:>7} fichiers  {wall:6.2f} s  "
+          f"{count / wall:8.0f} projets/s  (rendu+écriture {result['render_seconds']:5.2f} s, "
+          f"base {result['record_seconds']:5.2f} s)")
+    return wall
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Débit de génération des squelettes de projets")
+    parser.add_argument('--projects', type=int, default=500)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--keep', action='store_true', help="Conserve les squelettes générés")
+    args = parser.parse_args()
+
+    app = build_app()
+    root = tempfile.mkdtemp(prefix='scaffolds-')
+    try:
+        reference = min(args.projects, 100)
+        wall = uncached(reference, os.path.join(root, 'ref'))
+        print(f"Sans cache de modèles: {reference} projets en {wall:.2f} s ({reference / wall:.0f} projets/s)")
+        scaffolder = Scaffolder()
+        print(f"Avec cache de modèles ({args.projects} projets enregistrés en base par passe):")
+        for run, workers in enumerate(args.workers):
+            measure(app, scaffolder, args.projects, os.path.join(root, f'run-{run}'), workers, run)
+    finally:
+        if args.keep:
+            print(f"Squelettes conservés dans {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
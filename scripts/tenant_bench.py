@@ -0,0 +1,102 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from loadtest import InProcessClient, run, report
+
+TENANT_INDEXES = ('ix_deployments_tenant_id_id', 'ix_deployments_tenant_id_status', 'ix_projects_tenant_id_id')
+
+
+def build_app(small_projects, small_deployments):
+    from config import Config
+    Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'tenants.db')
+    # Measure the database, not the cache or background runners
+    Config.CACHE_TYPE = 'null'
+    Config.RUNNERS_AUTOSTART = False
+    from app import create_app, db
+    from app.database.models import Project, Deployment, User
+
+    app = create_app()
+    with app.app_context():
+        staff = User(username='admin', email='admin@devops.local')
+        staff.set_password('password123')
+        db.session.add(staff)
+        for i in range(small_projects):
+            project = Project(name=f'Petit {i}', client_name='Petit Client', stack='Python/Flask')
+            db.session.add(project)
+            for _ in range(small_deployments):
+                db.session.add(Deployment(project=project, user=staff, status='Success', triggered_by='bench',
+                                          log_content='[INFO] Building Container... Done\n' * 20))
+        db.session.add(Project(name='Gros 0', client_name='Gros Client', stack='Java/Spring'))
+        db.session.commit()
+        user = User(username='petit', email='petit@devops.local', tenant_id=Project.query.first().tenant_id)
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.commit()
+    return app
+
+
+def grow_large_tenant(app, rows, batch=20000):
+    """Bulk-inserts history for the large tenant only (bypasses the ORM for speed)."""
+    from app import db
+    from app.database.models import Project, Deployment, User
+
+    with app.app_context():
+        project = Project.query.filter_by(name='Gros 0').one()
+        user_id = User.query.filter_by(username='admin').one().id
+        start = datetime.utcnow() - timedelta(days=365)
+        for offset in range(0, rows, batch):
+            db.session.execute(db.insert(Deployment), [{
+                'tenant_id': project.tenant_id, 'project_id': project.id, 'user_id': user_id,
+                'status': 'Success' if i % 5 else 'Failed', 'triggered_by': 'bench', 'log_content': '[INFO] ok',
+                'timestamp': start + timedelta(seconds=i), 'started_at': start + timedelta(seconds=i), 'priority': 1,
+            } for i in range(offset, min(rows, offset + batch))])
+            db.session.commit()
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+
+
+def drop_tenant_indexes(app):
+    from app import db
+
+    with app.app_context():
+        for name in TENANT_INDEXES:
+            db.session.execute(db.text(f'DROP INDEX IF EXISTS {name}'))
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+
+
+def measure(label, client, paths, args):
+    print(f"\n{label}")
+    for path in paths:
+        stats = run(client, path, 'identity', args.requests, args.concurrency)
+        report(path[:40], stats)
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Isolation des clients: l'historique d'un gros client ralentit-il les pages d'un petit client ?")
+    parser.add_argument('--large-rows', type=int, default=200000, help="Déploiements insérés pour le gros client")
+    parser.add_argument('--small-projects', type=int, default=3)
+    parser.add_argument('--small-deployments', type=int, default=50, help="Déploiements par projet du petit client")
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=4)
+    args = parser.parse_args()
+
+    app = build_app(args.small_projects, args.small_deployments)
+    client = InProcessClient(app, 'petit', 'password123')
+    paths = ['/dashboard', '/project/1', '/api/v1/deployments?limit=50', '/api/v1/deployments?status=Failed&limit=50']
+
+    measure("Petit client, gros client vide", client, paths, args)
+    started = time.perf_counter()
+    grow_large_tenant(app, args.large_rows)
+    print(f"\n{args.large_rows} déploiements ajoutés au gros client en {time.perf_counter() - started:.1f} s")
+    measure("Petit client, gros client rempli (index par client)", client, paths, args)
+    drop_tenant_indexes(app)
+    measure("Petit client, gros client rempli (sans index par client)", client, paths, args)
@@ -0,0 +1,145 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import statistics
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.webhooks import project_secret, sign
+
+
+# --- PAYLOADS ---
+def delivery(project_id, index, projects, secret, main_every):
+    """One push delivery, alternating GitLab and GitHub; every main_every-th push targets main."""
+    ref = 'refs/heads/main' if main_every and (index // projects) % main_every == 0 else f'refs/heads/feature-{index % 50}'
+    sha = uuid.uuid4().hex + uuid.uuid4().hex[:8]
+    if index % 2:
+        body = json.dumps({'object_kind': 'push', 'ref': ref, 'checkout_sha': sha, 'project_id': project_id}).encode()
+        headers = {'X-Gitlab-Event': 'Push Hook', 'X-Gitlab-Event-UUID': str(uuid.uuid4()), 'X-Gitlab-Token': secret}
+    else:
+        body = json.dumps({'ref': ref, 'after': sha, 'repository': {'id': project_id}}).encode()
+        headers = {'X-GitHub-Event': 'push', 'X-GitHub-Delivery': str(uuid.uuid4()),
+                   'X-Hub-Signature-256': sign(secret, body)}
+    headers['Content-Type'] = 'application/json'
+    return body, headers
+
+
+# --- CLIENTS ---
+class InProcessSender:
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def post(self, path, body, headers):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        started = time.perf_counter()
+        response = client.post(path, data=body, headers=headers)
+        return response.status_code, time.perf_counter() - started
+
+
+class HttpSender:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def post(self, path, body, headers):
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers, method='POST')
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as err:
+            status = err.code
+        return status, time.perf_counter() - started
+
+
+def build_app(projects):
+    from config import Config
+    Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'webhooks.db')
+    # Deployments are queued, not run: only ingestion is measured
+    Config.RUNNERS_AUTOSTART = False
+    from app import create_app, db
+    from app.database.models import Project
+
+    app = create_app()
+    with app.app_context():
+        for i in range(projects):
+            db.session.add(Project(name=f'Projet {i}', client_name=f'Client {i % 7}', stack='Python/Flask'))
+        db.session.commit()
+    return app
+
+
+def send(sender, secret_key, events, projects, concurrency, main_every):
+    # Payloads are signed up front so only the server side is measured
+    payloads = []
+    for index in range(events):
+        project_id = 1 + index % projects
+        payloads.append((f'/hooks/{project_id}', *delivery(project_id, index, projects, project_secret(secret_key, project_id), main_every)))
+
+    def one(payload):
+        return sender.post(*payload)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, payloads))
+    wall = time.perf_counter() - started
+    latencies = sorted(latency * 1000 for _, latency in results)
+    return {
+        'accepted': sum(1 for status, _ in results if status == 202),
+        'refused': sum(1 for status, _ in results if status != 202),
+        'mean_ms': statistics.mean(latencies),
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1],
+        'rate': events / wall,
+        'wall': wall,
+        'started': started,
+    }
+
+
+def report(label, stats, ingestor=None):
+    line = (f"  {label:<14} {stats['accepted']:>6} acceptés {stats['refused']:>4} refusés  "
+            f"moy {stats['mean_ms']:6.2f} ms  p95 {stats['p95_ms']:6.2f} ms  {stats['rate']:8.0f} évén./s reçus")
+    if ingestor is not None:
+        ingestor.wait_idle(timeout=120)
+        done = time.perf_counter() - stats['started']
+        counters = ingestor.stats()
+        batches = counters['batches'] or 1
+        line += (f"  {counters['committed'] / done:8.0f} évén./s enregistrés  "
+                 f"{counters['committed'] / batches:6.1f} évén./lot  {counters['deployments']} déploiements")
+    print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Débit de réception des webhooks CI")
+    parser.add_argument('--url', help="Serveur à tester (sinon: application en mémoire avec base temporaire)")
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--projects', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--main-every', type=int, default=10, help="Un push sur N cible main et déclenche un déploiement")
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help="WEBHOOK_BATCH_SIZE du mode en mémoire (1 = un commit par événement)")
+    args = parser.parse_args()
+
+    from config import Config
+    if args.url:
+        report('http', send(HttpSender(args.url), Config.SECRET_KEY, args.events, args.projects, args.concurrency,
+                            args.main_every))
+        sys.exit(0)
+
+    if args.batch_size:
+        Config.WEBHOOK_BATCH_SIZE = args.batch_size
+    app = build_app(args.projects)
+    from app import webhooks
+    stats = send(InProcessSender(app), app.config['SECRET_KEY'], args.events, args.projects, args.concurrency,
+                 args.main_every)
+    report(f"lot {app.config['WEBHOOK_BATCH_SIZE']}", stats, webhooks)
+    webhooks.stop()
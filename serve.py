@@ -0,0 +1,99 @@
+import argparse
+import importlib.util
+import multiprocessing
+import os
+
+from app import create_app, db, lifecycle
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # Windows / minimal installs: only run.py's dev server is available
+    BaseApplication = None
+
+
+def default_workers():
+    return multiprocessing.cpu_count()
+
+
+def held_requests_limit(threads):
+    """Requests a gthread worker lets block (live dashboards, log long polls), each holding a thread."""
+    # The other half of the threads stays free for ordinary requests
+    return max(0, (threads - 1) // 2)
+
+
+# --- WORKER HOOKS ---
+def post_fork(server, worker):
+    # Connections opened by the master while loading the app must not be shared across processes
+    with server.app.application.app_context():
+        db.engine.dispose(close=False)
+
+
+def worker_exit(server, worker):
+    # SIGTERM: the worker has stopped accepting connections; let running deployments finish
+    if not lifecycle.drain(timeout=server.cfg.graceful_timeout):
+        worker.log.warning('Arrêt avec %s déploiement(s) encore en cours', lifecycle.in_flight)
+
+
+if BaseApplication is not None:
+    class DevOpsServer(BaseApplication):
+        """Pre-forking server: the app is imported once in the master, workers are forked from it."""
+
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+
+def build_options(args):
+    return {
+        'bind': args.bind,
+        'workers': args.workers,
+        'worker_class': args.worker_class,
+        'threads': args.threads,
+        'worker_connections': args.worker_connections,
+        'max_requests': args.max_requests,
+        'max_requests_jitter': args.max_requests_jitter,
+        'graceful_timeout': args.graceful_timeout,
+        'timeout': args.timeout,
+        'preload_app': True,
+        'post_fork': post_fork,
+        'worker_exit': worker_exit,
+        'accesslog': args.access_log,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serveur de production du Centre DevOps (multi-processus)")
+    parser.add_argument('--bind', default=os.environ.get('BIND', '0.0.0.0:5000'))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_WORKERS', default_workers())),
+                        help="Processus de travail (par défaut: un par cœur)")
+    parser.add_argument('--worker-class', choices=['gthread', 'gevent'], default=os.environ.get('WORKER_CLASS', 'gthread'))
+    parser.add_argument('--threads', type=int, default=4,
+                        help="Threads par processus (gthread); chaque tableau de bord ouvert en occupe un")
+    parser.add_argument('--worker-connections', type=int, default=1000, help="Connexions par processus (gevent)")
+    parser.add_argument('--max-requests', type=int, default=1000, help="Recycle un processus après N requêtes (0 = jamais)")
+    parser.add_argument('--max-requests-jitter', type=int, default=100)
+    parser.add_argument('--graceful-timeout', type=int, default=30, help="Délai pour terminer les déploiements en cours")
+    parser.add_argument('--timeout', type=int, default=60)
+    parser.add_argument('--access-log', default=None, help="Fichier de journal d'accès ('-' pour stdout)")
+    args = parser.parse_args()
+
+    if BaseApplication is None:
+        raise SystemExit("gunicorn n'est pas installé (pip install gunicorn); utilisez run.py pour le développement.")
+    if args.worker_class == 'gevent' and importlib.util.find_spec('gevent') is None:
+        raise SystemExit("gevent n'est pas installé (pip install gevent); utilisez --worker-class gthread.")
+
+    app = create_app()
+    if args.worker_class == 'gthread':
+        # Open dashboards and log long polls hold their thread: never let either take every thread
+        held = held_requests_limit(args.threads)
+        app.config['SSE_MAX_CLIENTS'] = min(app.config['SSE_MAX_CLIENTS'], held)
+        app.config['LOG_TAIL_MAX_WAITERS'] = min(app.config['LOG_TAIL_MAX_WAITERS'], held)
+    DevOpsServer(app, build_options(args)).run()